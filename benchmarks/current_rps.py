@@ -0,0 +1,50 @@
+"""
+Measure the time it takes to read the current RPS and failures per second of every stats
+entry, like the web UI and the console/CSV stats output do on every refresh.
+
+Usage:
+
+    python benchmarks/current_rps.py [--entries 10000] [--seconds 30] [--refreshes 20]
+"""
+import argparse
+import time
+
+import mock
+
+from locust.stats import RequestStats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument(
+        "--seconds", type=int, default=30, help="Seconds of requests to log"
+    )
+    parser.add_argument("--refreshes", type=int, default=20)
+    options = parser.parse_args()
+
+    stats = RequestStats()
+    names = ["/item/%i" % i for i in range(options.entries)]
+    start_time = time.time()
+    with mock.patch("time.time") as mocked_time:
+        for second in range(options.seconds):
+            mocked_time.return_value = start_time + second
+            for name in names:
+                stats.log_request("GET", name, 42, 1000)
+                stats.log_error("GET", name, "error")
+
+    entries = list(stats.entries.values())
+    refresh_start = time.perf_counter()
+    for _ in range(options.refreshes):
+        for entry in entries:
+            entry.current_rps
+            entry.current_fail_per_sec
+    elapsed = time.perf_counter() - refresh_start
+    print(
+        "%i entries: %.2f ms per refresh"
+        % (len(entries), elapsed / options.refreshes * 1000)
+    )
+
+
+if __name__ == "__main__":
+    main()
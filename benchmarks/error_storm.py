@@ -0,0 +1,65 @@
+"""
+Measure the time it takes to log the errors of failed requests during an "error storm", where
+every request fails with one of a few distinct errors (e.g. a target that returns HTTP 5xx),
+with and without the error key cache of RequestStats.
+
+Usage:
+
+    python benchmarks/error_storm.py [--failures 300000] [--names 20] [--errors 3]
+"""
+import argparse
+import random
+import time
+
+from requests.exceptions import HTTPError
+
+from locust.exception import CatchResponseError
+from locust.stats import RequestStats
+
+
+def measure(failures, error_key_cache_size):
+    stats = RequestStats()
+    stats.error_key_cache_size = error_key_cache_size
+    start_time = time.perf_counter()
+    for method, name, error in failures:
+        stats.log_error(method, name, error)
+    elapsed = time.perf_counter() - start_time
+    assert stats.num_failures == len(failures)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--failures", type=int, default=300000)
+    parser.add_argument("--names", type=int, default=20)
+    parser.add_argument(
+        "--errors", type=int, default=3, help="Distinct errors per request name"
+    )
+    options = parser.parse_args()
+
+    names = ["/item/%i" % i for i in range(options.names)]
+    statuses = [500, 502, 503, 504][: options.errors] or [500]
+    failures = []
+    for _ in range(options.failures):
+        name = random.choice(names)
+        status = random.choice(statuses)
+        if status == 500:
+            error = CatchResponseError("Unexpected status code: %i" % status)
+        else:
+            error = HTTPError(
+                "%i Server Error: Bad Gateway for url: http://localhost%s"
+                % (status, name)
+            )
+        failures.append(("GET", name, error))
+
+    print("%10s %16s %14s" % ("mode", "us/failure", "failures/s"))
+    for mode, cache_size in (("uncached", 0), ("cached", 1000)):
+        elapsed = measure(failures, cache_size)
+        print(
+            "%10s %16.2f %14.0f"
+            % (mode, elapsed / options.failures * 1e6, options.failures / elapsed)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Measure how long it takes a LocalRunner to hatch 1k, 10k and 100k users, how close the
+achieved hatch rate gets to the requested one, and how long it takes to stop half of the users
+and then the rest of them.
+
+Usage:
+
+    python benchmarks/spawn_rate.py [--users 1000 10000 100000] [--hatch-rates 100 1000 10000]
+"""
+import argparse
+import time
+
+import gevent
+
+from locust import User, constant, task
+from locust.env import Environment
+
+
+class IdleUser(User):
+    weight = 3
+    wait_time = constant(600)
+
+    @task
+    def idle(self):
+        pass
+
+
+class OtherIdleUser(IdleUser):
+    weight = 1
+
+
+def measure(user_count, hatch_rate):
+    environment = Environment(user_classes=[IdleUser, OtherIdleUser])
+    runner = environment.create_local_runner()
+    hatched = gevent.event.Event()
+    environment.events.hatch_complete.add_listener(lambda user_count: hatched.set())
+    start_time = time.perf_counter()
+    runner.start(user_count, hatch_rate)
+    hatched.wait()
+    elapsed = time.perf_counter() - start_time
+    assert runner.user_count == user_count
+    start_time = time.perf_counter()
+    runner.stop_users(user_count // 2)
+    runner.stop()
+    stop_elapsed = time.perf_counter() - start_time
+    assert runner.user_count == 0
+    runner.quit()
+    return elapsed, stop_elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument(
+        "--hatch-rates", type=float, nargs="+", default=[100, 1000, 10000]
+    )
+    options = parser.parse_args()
+
+    print(
+        "%8s %12s %10s %14s %10s %12s"
+        % (
+            "users",
+            "hatch rate",
+            "seconds",
+            "achieved rate",
+            "accuracy",
+            "stop seconds",
+        )
+    )
+    for user_count in options.users:
+        for hatch_rate in options.hatch_rates:
+            if user_count / hatch_rate > 60:
+                # skip the combinations that take more than a minute
+                continue
+            elapsed, stop_elapsed = measure(user_count, hatch_rate)
+            # the first user is started right away, so the last one is due after
+            # (user_count - 1) / hatch_rate seconds
+            achieved_rate = (user_count - 1) / elapsed
+            print(
+                "%8i %12g %10.2f %14.0f %9.1f%% %12.2f"
+                % (
+                    user_count,
+                    hatch_rate,
+                    elapsed,
+                    achieved_rate,
+                    achieved_rate / hatch_rate * 100,
+                    stop_elapsed,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
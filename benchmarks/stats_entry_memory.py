@@ -0,0 +1,66 @@
+"""
+Measure the memory used per StatsEntry when a test hits a lot of distinct URLs (e.g. per-ID
+URLs without a name= argument), each of them only a few times.
+
+The worker column uses the stats settings of worker nodes (use_response_times_cache=False),
+and the master column the ones of master and local runners, which also keep the rolling
+counters for the current RPS.
+
+Usage:
+
+    python benchmarks/stats_entry_memory.py [--entries 10000 100000 1000000] [--requests 3]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from locust.stats import RequestStats
+
+
+def measure(num_entries, requests_per_entry, use_response_times_cache):
+    stats = RequestStats(use_response_times_cache=use_response_times_cache)
+    names = ["/item/%i" % i for i in range(num_entries)]
+    gc.collect()
+    tracemalloc.start()
+    start_memory = tracemalloc.get_traced_memory()[0]
+    start_time = time.perf_counter()
+    for i in range(requests_per_entry):
+        for name in names:
+            stats.log_request("GET", name, 42 + i * 17, 1000)
+    elapsed = time.perf_counter() - start_time
+    gc.collect()
+    used_memory = tracemalloc.get_traced_memory()[0] - start_memory
+    tracemalloc.stop()
+    return used_memory / num_entries, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--entries", type=int, nargs="+", default=[10000, 100000, 1000000]
+    )
+    parser.add_argument("--requests", type=int, default=3, help="Requests per entry")
+    options = parser.parse_args()
+
+    print(
+        "%12s %10s %22s %22s"
+        % ("entries", "requests", "bytes/entry (worker)", "bytes/entry (master)")
+    )
+    for num_entries in options.entries:
+        per_entry, _ = measure(num_entries, options.requests, False)
+        per_entry_cached, elapsed = measure(num_entries, options.requests, True)
+        print(
+            "%12i %10i %22.0f %22.0f  (%.1fs)"
+            % (
+                num_entries,
+                num_entries * options.requests,
+                per_entry,
+                per_entry_cached,
+                elapsed,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
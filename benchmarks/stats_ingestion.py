@@ -0,0 +1,57 @@
+"""
+Measure the time it takes to log requests to RequestStats, directly and through a StatsBuffer
+(including the time it takes to flush the buffer).
+
+Usage:
+
+    python benchmarks/stats_ingestion.py [--requests 1000000] [--names 20] [--buffer-size 10000]
+"""
+import argparse
+import random
+import time
+
+from locust.stats import RequestStats
+
+
+def measure(num_requests, num_names, buffer_size):
+    stats = RequestStats(use_response_times_cache=False, buffer_size=buffer_size)
+    names = ["/item/%i" % i for i in range(num_names)]
+    requests = [
+        (random.choice(names), int(random.expovariate(1 / 50.0)), 1000)
+        for _ in range(num_requests)
+    ]
+    start_time = time.perf_counter()
+    for name, response_time, content_length in requests:
+        stats.log_request("GET", name, response_time, content_length)
+    logged = time.perf_counter()
+    stats.flush_buffer()
+    flushed = time.perf_counter()
+    assert stats.num_requests == num_requests
+    return logged - start_time, flushed - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000000)
+    parser.add_argument("--names", type=int, default=20)
+    parser.add_argument("--buffer-size", type=int, default=10000)
+    options = parser.parse_args()
+
+    print(
+        "%10s %16s %16s %14s" % ("mode", "logging (us/req)", "total (us/req)", "req/s")
+    )
+    for mode, buffer_size in (("direct", None), ("buffered", options.buffer_size)):
+        logging, total = measure(options.requests, options.names, buffer_size)
+        print(
+            "%10s %16.2f %16.2f %14.0f"
+            % (
+                mode,
+                logging / options.requests * 1e6,
+                total / options.requests * 1e6,
+                options.requests / total,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
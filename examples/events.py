@@ -48,7 +48,7 @@ def locust_init(environment, **kwargs):
 
 
 @events.request_success.add_listener
-def on_request_success(request_type, name, response_time, response_length):
+def on_request_success(request_type, name, response_time, response_length, **kw):
     """
     Event handler that get triggered on every successful request
     """
@@ -310,6 +310,13 @@ def setup_parser_arguments(parser):
         help="Store each stats entry in CSV format to _stats_history.csv file",
         env_var="LOCUST_CSV_FULL_HISTORY",
     )
+    stats_group.add_argument(
+        "--binary-history",
+        action="store_true",
+        default=False,
+        help="Write the stats history to a columnar binary store in the [CSV_PREFIX]_stats_history directory, instead of to [CSV_PREFIX]_stats_history.csv. Convert it to CSV with: locust report --convert-history [CSV_PREFIX]_stats_history",
+        env_var="LOCUST_BINARY_HISTORY",
+    )
     stats_group.add_argument(
         "--print-stats",
         action="store_true",
@@ -322,6 +329,48 @@ def setup_parser_arguments(parser):
         help="Only print the summary stats",
         env_var="LOCUST_ONLY_SUMMARY",
     )
+    stats_group.add_argument(
+        "--normalize-names",
+        action="store_true",
+        default=False,
+        help="Replace numeric IDs, UUIDs and hashes in request names with placeholders (e.g. /orders/{id}), to avoid creating a stats entry for every distinct URL. Should be set on both master and workers when running in distributed mode",
+        env_var="LOCUST_NORMALIZE_NAMES",
+    )
+    stats_group.add_argument(
+        "--max-stats-entries",
+        type=int,
+        default=None,
+        help="Max number of request stats entries. Once it's been reached, requests with new names will be logged to an entry called 'Other'",
+        env_var="LOCUST_MAX_STATS_ENTRIES",
+    )
+    stats_group.add_argument(
+        "--max-errors",
+        type=int,
+        default=None,
+        help="Max number of distinct errors to keep track of. Once it's been reached, new errors replace the least frequent ones, and get approximate counts. Should be set on both master and workers when running in distributed mode",
+        env_var="LOCUST_MAX_ERRORS",
+    )
+    stats_group.add_argument(
+        "--stats-buffer-size",
+        type=int,
+        default=None,
+        help="Log requests to a buffer with room for this many records, which is flushed to the stats every second (or when it's full), instead of updating the stats for every request. Reduces the per request overhead, which is mostly useful on worker nodes",
+        env_var="LOCUST_STATS_BUFFER_SIZE",
+    )
+    stats_group.add_argument(
+        "--aggregate-on-demand",
+        action="store_true",
+        default=False,
+        help="Calculate the Aggregated stats from the other stats entries when they're displayed or reported, instead of updating them for every request (and every worker report on the master node)",
+        env_var="LOCUST_AGGREGATE_ON_DEMAND",
+    )
+    stats_group.add_argument(
+        "--record-samples",
+        metavar="DIRECTORY",
+        default=None,
+        help="Record the response time, content length and error of every request to binary files in this directory, for analysis after the test run (see locust.samples)",
+        env_var="LOCUST_RECORD_SAMPLES",
+    )
     stats_group.add_argument(
         "--reset-stats",
         action="store_true",
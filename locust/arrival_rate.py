@@ -0,0 +1,262 @@
+"""
+Open workload model, where tasks are started at a target arrival rate.
+
+Normally a fixed number of users run their tasks in a loop, waiting between them, so when the
+system under test slows down, fewer tasks are started per second. For user classes with an
+:py:attr:`arrival_rate <locust.User.arrival_rate>`, an :class:`ArrivalRateScheduler` instead
+starts a task at the times given by the rate, regardless of how long the tasks take. Each task
+is executed by an idle user from a pool of users of the class, and a user is added to the pool
+when all of them are busy, up to :py:attr:`arrival_rate_max_users <locust.User.arrival_rate_max_users>`.
+
+Starts that are more than ARRIVAL_LATE_THRESHOLD seconds behind their scheduled time are
+counted as late, and starts for which there was no idle user (with the pool at its max size)
+are counted as missed, in the :class:`ArrivalRateStats` of the user class.
+"""
+import logging
+import math
+import sys
+import traceback
+from time import monotonic
+
+import gevent
+from gevent import GreenletExit
+from gevent.pool import Group
+
+from .exception import (
+    InterruptTaskSet,
+    LocustError,
+    RescheduleTask,
+    RescheduleTaskImmediately,
+    StopUser,
+)
+from .user.task import (
+    DefaultTaskSet,
+    LOCUST_STATE_RUNNING,
+    LOCUST_STATE_WAITING,
+    TaskSet,
+)
+
+logger = logging.getLogger(__name__)
+console_logger = logging.getLogger("locust.stats_logger")
+
+"""Number of seconds that a task can start after its scheduled time without being counted as late"""
+ARRIVAL_LATE_THRESHOLD = 0.05
+
+# max number of seconds between the checks of the arrival rate, so that a rate that changes
+# over time is followed even when tasks are started far apart
+ARRIVAL_RATE_CHECK_INTERVAL = 1.0
+
+# min number of seconds that the scheduler sleeps, at high rates all the tasks that are due are
+# started each time it wakes up
+ARRIVAL_BATCH_INTERVAL = 0.005
+
+
+def get_arrival_rate(user_class, elapsed):
+    """
+    Return the arrival rate of *user_class*, *elapsed* seconds into the test
+    """
+    rate = user_class.arrival_rate
+    if callable(rate):
+        rate = rate(elapsed)
+    return rate or 0
+
+
+class ArrivalRateStats(object):
+    """
+    Counts of the task starts of a user class with an arrival rate. num_starts is the number of
+    tasks that were started, which doesn't include the missed starts.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.num_starts = 0
+        self.num_late = 0
+        self.num_missed = 0
+        self.max_delay = 0.0
+
+    def log(self, delay, missed=False):
+        if missed:
+            self.num_missed += 1
+        else:
+            self.num_starts += 1
+            if delay > ARRIVAL_LATE_THRESHOLD:
+                self.num_late += 1
+        self.max_delay = max(self.max_delay, delay)
+
+    def extend(self, other):
+        self.num_starts += other.num_starts
+        self.num_late += other.num_late
+        self.num_missed += other.num_missed
+        self.max_delay = max(self.max_delay, other.max_delay)
+
+    def serialize(self):
+        return [self.num_starts, self.num_late, self.num_missed, self.max_delay]
+
+    @classmethod
+    def unserialize(cls, data):
+        stats = cls()
+        stats.num_starts, stats.num_late, stats.num_missed, stats.max_delay = data
+        return stats
+
+
+class ArrivalRateScheduler(object):
+    """
+    Starts the tasks of *user_class* at its arrival rate, multiplied by *share* (the part of the
+    load that this node runs), on a pool of users.
+    """
+
+    def __init__(self, environment, user_class, stats, share=1.0):
+        """
+        :param environment: The :class:`Environment <locust.env.Environment>` that the users are created in
+        :param user_class: User class with an arrival_rate
+        :param stats: :class:`ArrivalRateStats` that the task starts are counted in
+        :param share: The part of the arrival rate (and max number of users) that this scheduler runs
+        """
+        for task in user_class.tasks:
+            if hasattr(task, "tasks") and issubclass(task, TaskSet):
+                # a nested TaskSet runs until it's interrupted, which would keep the user busy
+                raise LocustError(
+                    "%s has an arrival_rate, so its tasks can't be TaskSets (%s)"
+                    % (user_class.__name__, task.__name__)
+                )
+        self.environment = environment
+        self.user_class = user_class
+        self.stats = stats
+        self.share = share
+        self.users = set()
+        self._idle_users = []
+        self.task_greenlets = Group()
+        self.greenlet = None
+
+    @property
+    def max_users(self):
+        return max(1, math.ceil(self.user_class.arrival_rate_max_users * self.share))
+
+    def rate(self, elapsed):
+        return get_arrival_rate(self.user_class, elapsed) * self.share
+
+    def start(self):
+        if self.greenlet is None:
+            self.greenlet = gevent.spawn(self._run)
+
+    def _run(self):
+        start_time = monotonic()
+        checked = start_time
+        # the scheduled time of the last start
+        previous = None
+        while True:
+            now = monotonic()
+            rate = self.rate(now - start_time)
+            if rate > 0:
+                interval = 1.0 / rate
+                if previous is None:
+                    scheduled = now
+                else:
+                    # if the rate has gone up since the last check, the tasks that are started
+                    # at the new rate begin from then
+                    scheduled = max(previous + interval, checked)
+                while scheduled <= now:
+                    self._start_task(now - scheduled)
+                    previous = scheduled
+                    scheduled += interval
+                sleep_time = min(scheduled - now, ARRIVAL_RATE_CHECK_INTERVAL)
+            else:
+                previous = None
+                sleep_time = ARRIVAL_RATE_CHECK_INTERVAL
+            checked = now
+            gevent.sleep(max(sleep_time, ARRIVAL_BATCH_INTERVAL))
+
+    def _start_task(self, delay):
+        if self._idle_users:
+            user = self._idle_users.pop()
+        elif len(self.users) < self.max_users:
+            user = self.user_class(self.environment)
+            self.users.add(user)
+        else:
+            self.stats.log(delay, missed=True)
+            return
+        self.stats.log(delay)
+        self.task_greenlets.spawn(self._execute_task, user)
+
+    def _execute_task(self, user):
+        try:
+            if user._taskset_instance is None:
+                user._taskset_instance = DefaultTaskSet(user)
+                user._state = LOCUST_STATE_RUNNING
+                user.on_start()
+            user._state = LOCUST_STATE_RUNNING
+            taskset = user._taskset_instance
+            taskset.execute_task(taskset.get_next_task())
+        except (InterruptTaskSet, RescheduleTask, RescheduleTaskImmediately):
+            pass
+        except StopUser:
+            # the user is taken out of the pool, and a new one is created when needed
+            self.users.discard(user)
+            user.on_stop()
+            return
+        except GreenletExit:
+            raise
+        except Exception as e:
+            self.environment.events.user_error.fire(
+                user_instance=user, exception=e, tb=sys.exc_info()[2]
+            )
+            if self.environment.catch_exceptions:
+                logger.error("%s\n%s", e, traceback.format_exc())
+            else:
+                # like a user whose greenlet dies from the exception, the user is taken out of
+                # the pool
+                self.users.discard(user)
+                raise
+        user._state = LOCUST_STATE_WAITING
+        self._idle_users.append(user)
+
+    def stop(self, timeout=None):
+        """
+        Stop starting tasks, wait at most *timeout* seconds for the running tasks to finish,
+        kill the ones that are still running, and call on_stop on the users
+        """
+        if self.greenlet is not None:
+            self.greenlet.kill(block=True)
+            self.greenlet = None
+        if timeout:
+            if not self.task_greenlets.join(timeout=timeout):
+                logger.info(
+                    "Not all %s tasks finished in %s seconds. Stopping them..."
+                    % (self.user_class.__name__, timeout)
+                )
+        self.task_greenlets.kill(block=True)
+        for user in self.users:
+            if user._taskset_instance is not None:
+                user.on_stop()
+        self.users = set()
+        self._idle_users = []
+
+
+def print_arrival_rate_stats(arrival_rate_stats):
+    """
+    Print the task starts of the user classes with an arrival rate, from a
+    {user class name: ArrivalRateStats} dict
+    """
+    if not arrival_rate_stats:
+        return
+    console_logger.info("Arrival rate task starts")
+    console_logger.info(
+        " %-30s %10s %10s %10s %14s"
+        % ("User class", "# starts", "# late", "# missed", "Max delay (s)")
+    )
+    console_logger.info("-" * 80)
+    for name, stats in sorted(arrival_rate_stats.items()):
+        console_logger.info(
+            " %-30s %10i %10i %10i %14.3f"
+            % (
+                name,
+                stats.num_starts,
+                stats.num_late,
+                stats.num_missed,
+                stats.max_delay,
+            )
+        )
+    console_logger.info("-" * 80)
+    console_logger.info("")
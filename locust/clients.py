@@ -18,6 +18,20 @@ from .exception import CatchResponseError, ResponseError
 absolute_http_url_regexp = re.compile(r"^https?://", re.I)
 
 
+def response_status(response, exception=None):
+    """
+    Return the status that a request is counted under in :attr:`StatsEntry.status_codes
+    <locust.stats.StatsEntry.status_codes>`: the HTTP status code of the response, or the class
+    name of the error if no response was received (e.g. for connection errors)
+    """
+    if response.status_code:
+        return response.status_code
+    error = getattr(response, "error", None) or exception
+    if error is None:
+        return None
+    return type(error).__name__
+
+
 class LocustResponse(Response):
     def raise_for_status(self):
         if hasattr(self, "error") and self.error:
@@ -122,14 +136,14 @@ class HttpSession(requests.Session):
 
         # set up pre_request hook for attaching meta data to the request object
         request_meta["method"] = method
-        request_meta["start_time"] = time.monotonic()
+        request_meta["start_time"] = time.perf_counter_ns()
 
         response = self._send_request_safe_mode(method, url, **kwargs)
 
-        # record the consumed time
+        # record the consumed time, in milliseconds with microsecond resolution
         request_meta["response_time"] = (
-            time.monotonic() - request_meta["start_time"]
-        ) * 1000
+            time.perf_counter_ns() - request_meta["start_time"]
+        ) / 1000000
 
         request_meta["name"] = (
             name
@@ -168,6 +182,7 @@ class HttpSession(requests.Session):
                     response_time=request_meta["response_time"],
                     response_length=request_meta["content_size"],
                     exception=e,
+                    status=response_status(response, e),
                 )
             else:
                 self.request_success.fire(
@@ -175,6 +190,7 @@ class HttpSession(requests.Session):
                     name=request_meta["name"],
                     response_time=request_meta["response_time"],
                     response_length=request_meta["content_size"],
+                    status=response_status(response),
                 )
             if name:
                 response.url = orig_url
@@ -252,6 +268,7 @@ class ResponseContextManager(LocustResponse):
             name=self.locust_request_meta["name"],
             response_time=self.locust_request_meta["response_time"],
             response_length=self.locust_request_meta["content_size"],
+            status=response_status(self),
         )
 
     def _report_failure(self, exc):
@@ -261,6 +278,7 @@ class ResponseContextManager(LocustResponse):
             response_time=self.locust_request_meta["response_time"],
             response_length=self.locust_request_meta["content_size"],
             exception=exc,
+            status=response_status(self, exc),
         )
 
     def success(self):
@@ -1,18 +1,20 @@
 from __future__ import absolute_import
 
+import logging
 import re
+import time
 import socket
 import json
 import json as unshadowed_json  # some methods take a named parameter called json
 from base64 import b64encode
 from urllib.parse import urlparse, urlunparse
 from ssl import SSLError
-from timeit import default_timer
 
 from http.cookiejar import CookieJar
 
 import gevent
 from gevent.timeout import Timeout
+from geventhttpclient import connectionpool
 from geventhttpclient._parser import HTTPParseError
 from geventhttpclient.useragent import (
     UserAgent,
@@ -23,10 +25,13 @@ from geventhttpclient.useragent import (
 from geventhttpclient.response import HTTPConnectionClosed
 
 from locust.user import User
+from locust.clients import response_status
 from locust.exception import LocustError, CatchResponseError, ResponseError
 from locust.env import Environment
 from locust.util.deprecation import DeprecatedFastHttpLocustClass as FastHttpLocust
 
+logger = logging.getLogger(__name__)
+
 # Monkey patch geventhttpclient.useragent.CompatRequest so that Cookiejar works with Python >= 3.3
 # More info: https://github.com/requests/requests/pull/871
 CompatRequest.unverifiable = False
@@ -98,6 +103,12 @@ class FastHttpUser(User):
     insecure: bool = True
     """Parameter passed to FastHttpSession. Default True, meaning no SSL verification."""
 
+    connection_timings: bool = False
+    """
+    Parameter passed to FastHttpSession. If True, the time spent on each phase of the requests 
+    is recorded in the stats (see :attr:`StatsEntry.phase_times <locust.stats.StatsEntry.phase_times>`).
+    """
+
     abstract = True
     """Dont register this as a User class that can be run by itself"""
 
@@ -121,6 +132,7 @@ class FastHttpUser(User):
             max_redirects=self.max_redirects,
             max_retries=self.max_retries,
             insecure=self.insecure,
+            connection_timings=self.connection_timings,
         )
 
 
@@ -135,10 +147,22 @@ class FastHttpSession(object):
     auth_header = None
 
     def __init__(
-        self, environment: Environment, base_url: str, insecure=True, **kwargs
+        self,
+        environment: Environment,
+        base_url: str,
+        insecure=True,
+        connection_timings=False,
+        **kwargs
     ):
+        """
+        :param connection_timings: If True, the time spent on connecting (including DNS resolution), 
+            the TLS handshake, waiting for the first byte of the response and downloading the 
+            response body is reported along with each request, as well as whether a new connection 
+            was opened for it.
+        """
         self.environment = environment
         self.base_url = base_url
+        self.connection_timings = connection_timings
         self.cookiejar = CookieJar()
         if insecure:
             ssl_context_factory = insecure_ssl_context_factory
@@ -244,7 +268,7 @@ class FastHttpSession(object):
         request_meta = {}
         # set up pre_request hook for attaching meta data to the request object
         request_meta["method"] = method
-        request_meta["start_time"] = default_timer()
+        request_meta["start_time"] = time.perf_counter_ns()
         request_meta["name"] = name or path
 
         headers = headers or {}
@@ -266,6 +290,9 @@ class FastHttpSession(object):
             old_redirect_response_codes = self.client.redirect_resonse_codes
             self.client.redirect_resonse_codes = []
 
+        if self.connection_timings:
+            self.client.timings = {}
+
         # send request, and catch any exceptions
         response = self._send_request_safe_mode(
             method, url, payload=data, headers=headers, **kwargs
@@ -274,6 +301,11 @@ class FastHttpSession(object):
         if not allow_redirects:
             self.client.redirect_resonse_codes = old_redirect_response_codes
 
+        timings = self.client.timings
+        if timings is not None:
+            self.client.timings = None
+            download_start = time.perf_counter()
+
         # get the length of the content, but if the argument stream is set to True, we take
         # the size from the content-length header, in order to not trigger fetching of the body
         if stream:
@@ -284,24 +316,30 @@ class FastHttpSession(object):
             try:
                 request_meta["content_size"] = len(response.content or "")
             except HTTPParseError as e:
-                request_meta["response_time"] = int(
-                    (default_timer() - request_meta["start_time"]) * 1000
-                )
+                request_meta["response_time"] = (
+                    time.perf_counter_ns() - request_meta["start_time"]
+                ) / 1000000
                 self.environment.events.request_failure.fire(
                     request_type=request_meta["method"],
                     name=request_meta["name"],
                     response_time=request_meta["response_time"],
                     response_length=0,
                     exception=e,
+                    status=response_status(response, e),
+                    connection_timings=timings or None,
                 )
                 return response
+            if timings:
+                timings["download"] = (time.perf_counter() - download_start) * 1000
 
         # Record the consumed time
         # Note: This is intentionally placed after we record the content_size above, since
         # we'll then trigger fetching of the body (unless stream=True)
-        request_meta["response_time"] = int(
-            (default_timer() - request_meta["start_time"]) * 1000
-        )
+        request_meta["response_time"] = (
+            time.perf_counter_ns() - request_meta["start_time"]
+        ) / 1000000
+
+        request_meta["connection_timings"] = timings or None
 
         if catch_response:
             response.locust_request_meta = request_meta
@@ -316,6 +354,8 @@ class FastHttpSession(object):
                     response_time=request_meta["response_time"],
                     response_length=request_meta["content_size"],
                     exception=e,
+                    status=response_status(response, e),
+                    connection_timings=request_meta["connection_timings"],
                 )
             else:
                 self.environment.events.request_success.fire(
@@ -323,6 +363,8 @@ class FastHttpSession(object):
                     name=request_meta["name"],
                     response_time=request_meta["response_time"],
                     response_length=request_meta["content_size"],
+                    status=response_status(response),
+                    connection_timings=request_meta["connection_timings"],
                 )
             return response
 
@@ -429,20 +471,94 @@ class LocustUserAgent(UserAgent):
 
     def __init__(self, **kwargs):
         super(LocustUserAgent, self).__init__(**kwargs)
+        # When set to a dict (by FastHttpSession), the milliseconds spent on the connect, tls
+        # and ttfb phases of the requests are added to it. The phases of redirected requests
+        # are added up.
+        self.timings = None
+        # {connection pool: whether its connections are timed}
+        self._timed_pools = {}
+        self._socket_acquired = None
+        self._connected = None
 
     def _urlopen(self, request):
         """Override _urlopen() in order to make it use the response_type attribute"""
         client = self.clientpool.get_client(request.url_split)
+        timings = self.timings
+        if timings is not None:
+            pool = getattr(client, "_connection_pool", None)
+            timed = self._timed_pools.get(pool)
+            if timed is None:
+                timed = self._timed_pools[pool] = self._time_connection_pool(pool)
+            if not timed:
+                timings = None
         resp = client.request(
             request.method,
             request.url_split.request_uri,
             body=request.payload,
             headers=request.headers,
         )
+        if timings is not None:
+            # the headers have been read once the response has been created
+            self._add_timing("ttfb", time.perf_counter() - self._socket_acquired)
         return self.response_type(
             resp, request=request, sent_request=resp._sent_request
         )
 
+    def _add_timing(self, phase, seconds):
+        if self.timings is not None:
+            self.timings[phase] = self.timings.get(phase, 0) + seconds * 1000
+
+    def _time_connection_pool(self, pool):
+        """
+        Wrap the methods of a connection pool that are used to get a connection, in order to
+        record the time of each phase of setting up a new connection, and when the connection
+        that the request is sent on was acquired (the start of the ttfb phase).
+
+        These are internals of geventhttpclient, so if the pool doesn't have them (e.g. with
+        another geventhttpclient version), it's left as it is and False is returned. The
+        requests on its connections are then made without connection timings.
+        """
+        if not all(
+            hasattr(pool, name)
+            for name in ("get_socket", "_create_socket", "_setup_proxy")
+        ):
+            logger.warning(
+                "The connections of %r can't be timed, so connection_timings is ignored for "
+                "its requests" % (pool,)
+            )
+            return False
+        get_socket = pool.get_socket
+        create_socket = pool._create_socket
+        setup_proxy = pool._setup_proxy
+        is_tls = isinstance(pool, getattr(connectionpool, "SSLConnectionPool", ()))
+
+        def timed_get_socket():
+            sock = get_socket()
+            self._socket_acquired = time.perf_counter()
+            return sock
+
+        def timed_create_socket():
+            # new connections are resolved, connected, (tunneled through the proxy,) and then
+            # wrapped in TLS
+            start = time.perf_counter()
+            sock = create_socket()
+            end = time.perf_counter()
+            connected = self._connected or end
+            self._add_timing("connect", connected - start)
+            if is_tls:
+                self._add_timing("tls", end - connected)
+            self._connected = None
+            return sock
+
+        def timed_setup_proxy(sock):
+            setup_proxy(sock)
+            self._connected = time.perf_counter()
+
+        pool.get_socket = timed_get_socket
+        pool._create_socket = timed_create_socket
+        pool._setup_proxy = timed_setup_proxy
+        return True
+
 
 class ResponseContextManager(FastResponse):
     """
@@ -497,6 +613,8 @@ class ResponseContextManager(FastResponse):
             name=self.locust_request_meta["name"],
             response_time=self.locust_request_meta["response_time"],
             response_length=self.locust_request_meta["content_size"],
+            status=response_status(self),
+            connection_timings=self.locust_request_meta["connection_timings"],
         )
 
     def _report_failure(self, exc):
@@ -506,6 +624,8 @@ class ResponseContextManager(FastResponse):
             response_time=self.locust_request_meta["response_time"],
             response_length=self.locust_request_meta["content_size"],
             exception=exc,
+            status=response_status(self, exc),
+            connection_timings=self.locust_request_meta["connection_timings"],
         )
 
     def success(self):
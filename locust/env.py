@@ -128,8 +128,18 @@ class Environment:
         :param master_port: Port on master node to connect to
         """
         # Create a new RequestStats with use_response_times_cache set to False to save some memory
-        # and CPU cycles, since the response_times_cache is not needed for Worker nodes
-        self.stats = RequestStats(use_response_times_cache=False)
+        # and CPU cycles, since the current response times are not needed for Worker nodes
+        self.stats = RequestStats(
+            use_response_times_cache=False,
+            histogram_class=self.stats.histogram_class,
+            name_normalizer=self.stats.name_normalizer,
+            max_entries=self.stats.max_entries,
+            buffer_size=self.stats.buffer.size
+            if self.stats.buffer is not None
+            else None,
+            aggregate_on_demand=self.stats.aggregate_on_demand,
+            max_errors=self.stats.max_errors,
+        )
         return self._create_runner(
             WorkerRunner, master_host=master_host, master_port=master_port,
         )
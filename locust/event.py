@@ -56,6 +56,10 @@ class Events:
     :param name: Path to the URL that was called (or override name if it was used in the call to the client)
     :param response_time: Response time in milliseconds
     :param response_length: Content-length of the response
+    :param status: (optional) HTTP status code of the response. Requests are counted per status 
+                   in :attr:`StatsEntry.status_codes <locust.stats.StatsEntry.status_codes>`.
+    :param connection_timings: (optional) Dict with the time in milliseconds that was spent on each 
+                               phase of the request (see :data:`locust.stats.CONNECTION_PHASES`).
     """
 
     request_failure = EventHook
@@ -70,6 +74,10 @@ class Events:
     :param response_time: Time in milliseconds until exception was thrown
     :param response_length: Content-length of the response
     :param exception: Exception instance that was thrown
+    :param status: (optional) HTTP status code of the response, or the class name of the exception 
+                   if there was no response. Defaults to the class name of *exception*.
+    :param connection_timings: (optional) Dict with the time in milliseconds that was spent on each 
+                               phase of the request (see :data:`locust.stats.CONNECTION_PHASES`).
     """
 
     user_error = EventHook
@@ -89,7 +97,8 @@ class Events:
     data to the dicts that are regularly sent to the master. It's fired regularly when a report
     is to be sent to the master server.
     
-    Note that the keys "stats" and "errors" are used by Locust and shouldn't be overridden.
+    Note that the keys "stats", "stats_total", "errors" and "stats_report" are used by Locust 
+    and shouldn't be overridden.
     
     Event arguments:
     
@@ -107,7 +116,10 @@ class Events:
     Event arguments:
     
     :param client_id: Client id of the reporting worker
-    :param data: Data dict with the data from the worker node
+    :param data: Data dict with the data from the worker node. If the worker node sends its 
+                 stats in the compact stats report format, "stats" is a list of 
+                 :class:`StatsEntry <locust.stats.StatsEntry>` instances (instead of serialized 
+                 StatsEntry dicts) and "stats_total" is a StatsEntry.
     """
 
     hatch_complete = EventHook
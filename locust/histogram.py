@@ -0,0 +1,470 @@
+import math
+from array import array
+from collections import Counter
+from collections.abc import Mapping
+from copy import copy
+
+
+def calculate_percentiles(sorted_items, total, percents):
+    """
+    Get the response times for several percentiles with a single cumulative walk.
+    Arguments:
+
+    sorted_items: An iterable of (response_time, count) tuples, sorted by response time
+    total: Total number of samples
+    percents: The percentiles we want to calculate. Specified in range: 0.0 - 1.0
+
+    Returns a list with the response time for each of the percents (in the same order).
+    """
+    order = sorted(range(len(percents)), key=percents.__getitem__)
+    result = [0] * len(percents)
+    i = 0
+    processed_count = 0
+    response_time = 0
+    for response_time, count in sorted_items:
+        processed_count += count
+        while i < len(order) and processed_count > int(total * percents[order[i]]):
+            result[order[i]] = response_time
+            i += 1
+        if i == len(order):
+            return result
+    # either there are no samples (0), or the remaining percentiles are 1.0 (max response time)
+    for index in order[i:]:
+        result[index] = response_time
+    return result
+
+
+class Histogram(object):
+    """
+    Base class for the response time histograms that are used by
+    :class:`StatsEntry <locust.stats.StatsEntry>` to store the response time distribution.
+
+    A histogram behaves like a read-only ``{response_time: count}`` dict (so that code which
+    treats ``StatsEntry.response_times`` as a dict keeps working), with additional methods for
+    recording samples, merging histograms and calculating percentiles.
+    """
+
+    __slots__ = ()
+
+    def record(self, response_time, count=1):
+        """
+        Add *count* samples of *response_time* (in milliseconds) to the histogram
+        """
+        raise NotImplementedError()
+
+    def record_many(self, response_times):
+        """
+        Add a batch of response times to the histogram. The distinct response times are counted
+        first, so that the bucket of each of them only has to be computed once per batch.
+        """
+        for response_time, count in Counter(response_times).items():
+            self.record(response_time, count)
+
+    def merge(self, other):
+        """
+        Add all the samples from another histogram (or a {response_time: count} dict)
+        to this histogram
+        """
+        for response_time, count in other.items():
+            self.record(response_time, count)
+
+    def subtract(self, other):
+        """
+        Remove all the samples of another histogram (which must have been merged into, or
+        recorded with the same values as, this histogram)
+        """
+        for response_time, count in other.items():
+            self.record(response_time, -count)
+
+    @property
+    def count(self):
+        """Total number of samples in the histogram"""
+        return sum(self.values())
+
+    def sorted_items(self):
+        """ Return the (response_time, count) items sorted by response time """
+        return sorted(self.items())
+
+    def percentile(self, percent):
+        """
+        Get the response time that a certain number of percent of the samples
+        finished within. Percent specified in range: 0.0 - 1.0
+        """
+        return self.percentiles((percent,))[0]
+
+    def percentiles(self, percents):
+        """
+        Get the response times for several percentiles with a single walk through the
+        histogram. Returns a list with a response time for each of the percents.
+        """
+        return calculate_percentiles(self.sorted_items(), self.count, percents)
+
+    def serialize(self):
+        """
+        Return the histogram as a {response_time: count} dict, which is the format used when
+        sending stats from worker nodes to the master. Recording the items of the dict into a
+        histogram of the same type will result in an identical histogram.
+        """
+        return dict(self.items())
+
+
+class SerializedHistogram(dict):
+    """
+    The {response_time: count} dict that bucketed histograms are serialized to. It also keeps
+    a copy of the serialized histogram, so that the :mod:`compact stats report format
+    <locust.rpc.stats_format>` can send the bucket counts instead of the response times.
+    """
+
+    __slots__ = ("histogram",)
+
+    def __init__(self, histogram):
+        super().__init__(histogram.items())
+        self.histogram = copy(histogram)
+
+
+class RoundedHistogram(Histogram, dict):
+    """
+    The default histogram, which is a plain {response_time: count} dict.
+
+    To avoid too much data that has to be transferred to the master node when running in
+    distributed mode, the response times are rounded to two significant digits, so that
+    147 becomes 150, 3432 becomes 3400 and 58760 becomes 59000. Response times below 10 ms
+    keep their fraction in the same way (0.347 becomes 0.35 and 4.63 becomes 4.6), so that
+    fast responses don't all end up in the 0 and 1 ms buckets.
+    """
+
+    __slots__ = ()
+
+    def record(self, response_time, count=1):
+        if response_time < 1:
+            rounded_response_time = round(response_time, 2)
+        elif response_time < 10:
+            rounded_response_time = round(response_time, 1)
+        elif response_time < 100:
+            rounded_response_time = round(response_time)
+        elif response_time < 1000:
+            rounded_response_time = round(response_time, -1)
+        elif response_time < 10000:
+            rounded_response_time = round(response_time, -2)
+        else:
+            rounded_response_time = round(response_time, -3)
+
+        # increase request count for the rounded key in response time dict
+        self[rounded_response_time] = self.get(rounded_response_time, 0) + count
+
+    def merge(self, other):
+        # keys of other RoundedHistograms are already rounded, so we can just add the counts
+        for response_time, count in other.items():
+            self[response_time] = self.get(response_time, 0) + count
+
+    def subtract(self, other):
+        for response_time, count in other.items():
+            remaining = self.get(response_time, 0) - count
+            if remaining > 0:
+                self[response_time] = remaining
+            else:
+                self.pop(response_time, None)
+
+
+class LogLinearHistogram(Histogram, Mapping):
+    """
+    Array backed histogram that uses the same log-linear bucket layout as HdrHistogram.
+
+    Response times are stored as integer multiples of *resolution* (in milliseconds).
+    Up to 2 * 10^significant_digits units each unit gets its own bucket. Above that, every
+    power of two is split into the same number of linear sub-buckets, which guarantees that
+    the value reported for a sample is within 10^-significant_digits of the recorded value.
+
+    Recording a sample is an O(1) index computation, percentiles are calculated with a
+    single cumulative scan of the counts, and histograms with the same layout are merged
+    by element-wise addition. The counts array grows on demand, so memory use depends on
+    the largest recorded response time rather than on a configured max value.
+    """
+
+    def __init__(self, significant_digits=2, resolution=0.001):
+        """
+        :param significant_digits: Number of significant decimal digits to keep (1 - 5)
+        :param resolution: Smallest distinguishable response time, in milliseconds. Defaults to
+                           0.001 (one microsecond)
+        """
+        if not 1 <= significant_digits <= 5:
+            raise ValueError("significant_digits must be between 1 and 5")
+        if resolution <= 0:
+            raise ValueError("resolution must be a positive number")
+        self.significant_digits = significant_digits
+        self.resolution = resolution
+        self._scale = 1.0 / resolution
+        sub_bucket_count_magnitude = (2 * 10 ** significant_digits - 1).bit_length()
+        self._sub_bucket_half_count_magnitude = sub_bucket_count_magnitude - 1
+        self._sub_bucket_half_count = 1 << self._sub_bucket_half_count_magnitude
+        self._sub_bucket_mask = (1 << sub_bucket_count_magnitude) - 1
+        self._count = 0
+        self.counts = array("Q")
+
+    @property
+    def layout(self):
+        """Histograms with the same layout can be merged by adding their count arrays"""
+        return (self.significant_digits, self.resolution)
+
+    @property
+    def count(self):
+        return self._count
+
+    def index_of(self, response_time):
+        """
+        Return the index of the bucket in the counts array that *response_time* belongs to
+        """
+        units = int(response_time * self._scale + 0.5)
+        if units < 0:
+            units = 0
+        bucket_index = (units | self._sub_bucket_mask).bit_length() - (
+            self._sub_bucket_half_count_magnitude + 1
+        )
+        return (
+            ((bucket_index + 1) << self._sub_bucket_half_count_magnitude)
+            + (units >> bucket_index)
+            - self._sub_bucket_half_count
+        )
+
+    def value_at(self, index):
+        """
+        Return the response time that is reported for samples in the bucket at *index*. This is
+        the middle of the bucket, which maps back to the same bucket when it's recorded.
+        """
+        bucket_index = (index >> self._sub_bucket_half_count_magnitude) - 1
+        sub_bucket_index = (
+            index & (self._sub_bucket_half_count - 1)
+        ) + self._sub_bucket_half_count
+        if bucket_index < 0:
+            sub_bucket_index -= self._sub_bucket_half_count
+            bucket_index = 0
+        units = (sub_bucket_index << bucket_index) + ((1 << bucket_index) >> 1)
+        return units / self._scale
+
+    def _grow(self, length):
+        self.counts.frombytes(bytes(self.counts.itemsize * (length - len(self.counts))))
+
+    def record(self, response_time, count=1):
+        index = self.index_of(response_time)
+        if index >= len(self.counts):
+            self._grow(index + 1)
+        self.counts[index] += count
+        self._count += count
+
+    def merge(self, other):
+        if isinstance(other, LogLinearHistogram) and other.layout == self.layout:
+            if len(other.counts) > len(self.counts):
+                self._grow(len(other.counts))
+            counts = self.counts
+            for index, count in enumerate(other.counts):
+                if count:
+                    counts[index] += count
+            self._count += other._count
+        else:
+            super().merge(other)
+
+    def subtract(self, other):
+        if isinstance(other, LogLinearHistogram) and other.layout == self.layout:
+            counts = self.counts
+            for index, count in enumerate(other.counts):
+                if count:
+                    counts[index] -= count
+            self._count -= other._count
+        else:
+            super().subtract(other)
+
+    def sorted_items(self):
+        # the buckets are already ordered by response time
+        return self.items()
+
+    def serialize(self):
+        return SerializedHistogram(self)
+
+    def items(self):
+        return [
+            (self.value_at(index), count)
+            for index, count in enumerate(self.counts)
+            if count
+        ]
+
+    def __getitem__(self, response_time):
+        index = self.index_of(response_time)
+        if index < len(self.counts) and self.counts[index]:
+            return self.counts[index]
+        raise KeyError(response_time)
+
+    def __iter__(self):
+        for index, count in enumerate(self.counts):
+            if count:
+                yield self.value_at(index)
+
+    def __len__(self):
+        return len(self.counts) - self.counts.count(0)
+
+    def __bool__(self):
+        return self._count > 0
+
+    def __copy__(self):
+        other = LogLinearHistogram(self.significant_digits, self.resolution)
+        other.counts = copy(self.counts)
+        other._count = self._count
+        return other
+
+    def __repr__(self):
+        return "<LogLinearHistogram significant_digits=%s count=%s>" % (
+            self.significant_digits,
+            self._count,
+        )
+
+
+class DDSketchHistogram(Histogram, Mapping):
+    """
+    Relative-error quantile sketch, based on `DDSketch <https://arxiv.org/abs/1908.10693>`_.
+
+    Response times are mapped to logarithmically sized buckets, so that any percentile is
+    reported within *relative_accuracy* of the actual response time (e.g. within 1% for the
+    default 0.01), whether it's a sub-millisecond or a multi-minute response time. Response
+    times that are smaller than *min_value* (including 0) are counted in a separate bucket.
+
+    The buckets are kept in a sparse dict. If there are more than *max_buckets* of them, the
+    lowest buckets are collapsed, which keeps the memory bounded at the cost of accuracy for
+    the lowest percentiles only. Sketches with the same *relative_accuracy* are merged by adding
+    the counts of their buckets.
+    """
+
+    def __init__(self, relative_accuracy=0.01, min_value=0.001, max_buckets=2048):
+        """
+        :param relative_accuracy: Max relative error of the reported percentiles (0 - 1)
+        :param min_value: Smallest response time, in milliseconds, that gets its own bucket
+        :param max_buckets: Max number of buckets, before the lowest ones are collapsed
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        if min_value <= 0:
+            raise ValueError("min_value must be a positive number")
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_buckets = max_buckets
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._multiplier = 1 / math.log(self._gamma)
+        self._count = 0
+        self.zero_count = 0
+        self.buckets = {}
+
+    @property
+    def layout(self):
+        """Sketches with the same layout can be merged by adding their bucket counts"""
+        return (self.relative_accuracy, self.min_value)
+
+    @property
+    def count(self):
+        return self._count
+
+    def index_of(self, response_time):
+        """
+        Return the index of the bucket that *response_time* belongs to, or None for the bucket
+        of response times below min_value
+        """
+        if response_time < self.min_value:
+            return None
+        return math.ceil(math.log(response_time) * self._multiplier)
+
+    def value_at(self, index):
+        """
+        Return the response time that is reported for samples in the bucket at *index*. It's
+        within relative_accuracy of every response time in the bucket, and maps back to the
+        same bucket when it's recorded.
+        """
+        if index is None:
+            return 0
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def _add(self, index, count):
+        if index is None:
+            self.zero_count += count
+        else:
+            remaining = self.buckets.get(index, 0) + count
+            if remaining > 0:
+                self.buckets[index] = remaining
+            else:
+                self.buckets.pop(index, None)
+        self._count += count
+
+    def _collapse(self):
+        # merge the lowest buckets into the lowest one that we'll keep
+        indices = sorted(self.buckets)
+        keep = indices[len(indices) - self.max_buckets]
+        for index in indices[: len(indices) - self.max_buckets]:
+            self.buckets[keep] += self.buckets.pop(index)
+
+    def record(self, response_time, count=1):
+        self._add(self.index_of(response_time), count)
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def merge(self, other):
+        if isinstance(other, DDSketchHistogram) and other.layout == self.layout:
+            self.zero_count += other.zero_count
+            self._count += other.zero_count
+            for index, count in other.buckets.items():
+                self._add(index, count)
+            if len(self.buckets) > self.max_buckets:
+                self._collapse()
+        else:
+            super().merge(other)
+
+    def subtract(self, other):
+        if isinstance(other, DDSketchHistogram) and other.layout == self.layout:
+            self.zero_count -= other.zero_count
+            self._count -= other.zero_count
+            for index, count in other.buckets.items():
+                self._add(index, -count)
+        else:
+            super().subtract(other)
+
+    def sorted_items(self):
+        return self.items()
+
+    def serialize(self):
+        return SerializedHistogram(self)
+
+    def items(self):
+        items = [
+            (self.value_at(index), self.buckets[index])
+            for index in sorted(self.buckets)
+        ]
+        if self.zero_count:
+            items.insert(0, (0, self.zero_count))
+        return items
+
+    def __getitem__(self, response_time):
+        index = self.index_of(response_time)
+        count = self.zero_count if index is None else self.buckets.get(index, 0)
+        if count:
+            return count
+        raise KeyError(response_time)
+
+    def __iter__(self):
+        for response_time, _ in self.items():
+            yield response_time
+
+    def __len__(self):
+        return len(self.buckets) + (1 if self.zero_count else 0)
+
+    def __bool__(self):
+        return self._count > 0
+
+    def __copy__(self):
+        other = DDSketchHistogram(
+            self.relative_accuracy, self.min_value, self.max_buckets
+        )
+        other.buckets = dict(self.buckets)
+        other.zero_count = self.zero_count
+        other._count = self._count
+        return other
+
+    def __repr__(self):
+        return "<DDSketchHistogram relative_accuracy=%s count=%s>" % (
+            self.relative_accuracy,
+            self._count,
+        )
@@ -0,0 +1,262 @@
+"""
+Columnar binary store for the stats history.
+
+With ``--csv``, a row with the current stats is appended to the _stats_history.csv file every
+CSV_STATS_INTERVAL_SEC (for every stats entry with ``--csv-full-history``), formatted as text.
+A :class:`StatsHistoryStore` keeps the same values in a directory with an append-only binary
+file per column (fixed width, little-endian values), which are written in batches. The stats
+entry names are only stored once, and the response times and rates as 32-bit floats. The
+``entry_id`` column refers to the stats entries listed in the ``entries.names`` file, which
+has a JSON ``[method, name]`` list per line, and ``schema.json`` describes the columns.
+
+The columns can be loaded as NumPy arrays, backed by memory maps of the column files, with
+:func:`read_stats_history`, and converted to the stats history CSV format with
+:func:`write_stats_history_csv` (or ``locust report --convert-history``). NumPy is only
+needed for reading the store.
+"""
+import array
+import json
+import math
+import os
+import sys
+import time
+from itertools import chain
+
+from .stats import (
+    PERCENTILES_TO_REPORT,
+    sort_stats,
+    stats_history_csv_header,
+    stats_history_csv_row,
+)
+from .util.dependencies import import_numpy
+
+HISTORY_VERSION = 1
+
+"""Number of stats snapshots that are kept in memory before they're written to the column files"""
+HISTORY_FLUSH_INTERVAL = 15
+
+# NumPy dtypes of the array module typecodes that the columns are stored as
+DTYPES = {"q": "<i8", "I": "<u4", "f": "<f4"}
+
+
+def percentile_column_name(percent):
+    return "response_time_percentile_%g" % percent
+
+
+def history_columns(percentiles):
+    """Return the (name, array typecode) of each column, for the given percentiles"""
+    return (
+        [
+            ("timestamp", "q"),
+            ("user_count", "I"),
+            ("entry_id", "I"),
+            ("current_rps", "f"),
+            ("current_fail_per_sec", "f"),
+        ]
+        + [(percentile_column_name(p), "f") for p in percentiles]
+        + [
+            ("num_requests", "q"),
+            ("num_failures", "q"),
+            ("median_response_time", "f"),
+            ("avg_response_time", "f"),
+            ("min_response_time", "f"),
+            ("max_response_time", "f"),
+            ("avg_content_length", "f"),
+        ]
+    )
+
+
+class StatsHistoryStore(object):
+    """
+    Appends snapshots of the current stats to a columnar binary store in *directory*.
+
+    The rows of each snapshot are buffered, and appended to the column files every
+    *flush_interval* snapshots, and when the store is closed.
+    Percentiles of entries without any requests are stored as NaN.
+    """
+
+    def __init__(self, directory, flush_interval=None):
+        """
+        :param directory: Directory that the store is written to. Created if needed, and any existing store in it is overwritten.
+        :param flush_interval: Number of snapshots to buffer (HISTORY_FLUSH_INTERVAL by default)
+        """
+        self.directory = directory
+        self.flush_interval = flush_interval or HISTORY_FLUSH_INTERVAL
+        self.percentiles = list(PERCENTILES_TO_REPORT)
+        self.columns = history_columns(self.percentiles)
+        self._rows = []
+        self._snapshots = 0
+        self._entry_ids = {}
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "schema.json"), "w") as f:
+            json.dump(
+                {
+                    "version": HISTORY_VERSION,
+                    "percentiles": self.percentiles,
+                    "columns": [[name, DTYPES[t]] for name, t in self.columns],
+                },
+                f,
+            )
+        for name, _ in self.columns:
+            open(self._column_filename(name), "wb").close()
+        self._entries_file = open(
+            os.path.join(directory, "entries.names"), "w", buffering=1
+        )
+
+    def _column_filename(self, name):
+        return os.path.join(self.directory, name + ".col")
+
+    def _entry_id(self, method, name):
+        entry_id = self._entry_ids.get((method, name))
+        if entry_id is None:
+            entry_id = self._entry_ids[(method, name)] = len(self._entry_ids)
+            self._entries_file.write(json.dumps([method, name]) + "\n")
+        return entry_id
+
+    def append(self, environment, all_entries=False):
+        """
+        Append a snapshot of the current stats of *environment*. By default only the Aggregated
+        stats entry is included, but if all_entries is set to True, a row for each entry is
+        included.
+        """
+        stats = environment.stats
+        stats.flush_buffer()
+        timestamp = int(time.time())
+        user_count = environment.runner.user_count
+        stats_entries = []
+        if all_entries:
+            stats_entries = sort_stats(stats.entries)
+        no_percentiles = [float("nan")] * len(self.percentiles)
+        for s in chain(stats_entries, [stats.total]):
+            if s.num_requests:
+                percentiles = [
+                    p or 0 for p in s.get_current_response_time_percentiles()
+                ]
+            else:
+                percentiles = no_percentiles
+            self._rows.append(
+                (
+                    timestamp,
+                    user_count,
+                    self._entry_id(s.method, s.name),
+                    s.current_rps,
+                    s.current_fail_per_sec,
+                    *percentiles,
+                    s.num_requests,
+                    s.num_failures,
+                    s.median_response_time or 0,
+                    s.avg_response_time,
+                    s.min_response_time or 0,
+                    s.max_response_time,
+                    s.avg_content_length,
+                )
+            )
+        self._snapshots += 1
+        if self._snapshots >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Append the buffered rows to the column files
+        """
+        if not self._rows:
+            return
+        for (name, typecode), values in zip(self.columns, zip(*self._rows)):
+            column = array.array(typecode, values)
+            if sys.byteorder == "big":
+                column.byteswap()
+            with open(self._column_filename(name), "ab") as f:
+                column.tofile(f)
+        self._rows = []
+        self._snapshots = 0
+
+    def close(self):
+        """
+        Write the buffered rows, and close the store
+        """
+        if self._entries_file.closed:
+            return
+        self.flush()
+        self._entries_file.close()
+
+
+def read_stats_history(directory):
+    """
+    Load a stats history store.
+
+    Returns a (columns, entries, percentiles) tuple, where *columns* is a dict with a read-only
+    NumPy array per column (in the order of :func:`history_columns`), backed by a memory map of
+    the column file, *entries* is a list of the (method, name) pairs that the entry IDs refer
+    to, and *percentiles* is the list of percentiles that the store has columns for.
+    """
+    numpy = import_numpy("reading the stats history store")
+    with open(os.path.join(directory, "schema.json")) as f:
+        schema = json.load(f)
+    if schema["version"] != HISTORY_VERSION:
+        raise ValueError("Unsupported stats history store version in %s" % directory)
+    filenames = [
+        os.path.join(directory, name + ".col") for name, _ in schema["columns"]
+    ]
+    # a store that wasn't closed may have a partially written batch, so only the rows that
+    # all of the columns have are loaded
+    num_rows = min(
+        os.path.getsize(filename) // numpy.dtype(dtype).itemsize
+        for filename, (_, dtype) in zip(filenames, schema["columns"])
+    )
+    columns = {}
+    for filename, (name, dtype) in zip(filenames, schema["columns"]):
+        if num_rows:
+            columns[name] = numpy.memmap(
+                filename, dtype=dtype, mode="r", shape=(num_rows,)
+            )
+        else:
+            columns[name] = numpy.zeros(0, dtype=dtype)
+    with open(os.path.join(directory, "entries.names")) as f:
+        entries = [tuple(json.loads(line)) for line in f]
+    return columns, entries, schema["percentiles"]
+
+
+def write_stats_history_csv(directory, f, batch_size=10000):
+    """
+    Convert a stats history store to the stats history CSV format, and write it to the file *f*
+    """
+    columns, entries, percentiles = read_stats_history(directory)
+    if percentiles != list(PERCENTILES_TO_REPORT):
+        raise ValueError(
+            "The stats history in %s has other percentiles than PERCENTILES_TO_REPORT"
+            % directory
+        )
+    percentile_names = [percentile_column_name(p) for p in percentiles]
+    f.write(stats_history_csv_header())
+    num_rows = len(columns["timestamp"])
+    for start in range(0, num_rows, batch_size):
+        batch = {
+            name: column[start : start + batch_size].tolist()
+            for name, column in columns.items()
+        }
+        rows = []
+        for i in range(len(batch["timestamp"])):
+            method, name = entries[batch["entry_id"][i]]
+            percentile_values = [batch[p][i] for p in percentile_names]
+            if percentile_values and math.isnan(percentile_values[0]):
+                # entries without any requests have NaN percentiles
+                percentile_values = None
+            rows.append(
+                stats_history_csv_row(
+                    batch["timestamp"][i],
+                    batch["user_count"][i],
+                    method,
+                    name,
+                    batch["current_rps"][i],
+                    batch["current_fail_per_sec"][i],
+                    percentile_values,
+                    batch["num_requests"][i],
+                    batch["num_failures"][i],
+                    batch["median_response_time"][i],
+                    batch["avg_response_time"][i],
+                    batch["min_response_time"][i],
+                    batch["max_response_time"][i],
+                    batch["avg_content_length"][i],
+                )
+            )
+        f.write("\n".join(rows) + "\n")
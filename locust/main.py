@@ -13,9 +13,14 @@ import locust
 
 from . import log
 from .argument_parser import parse_locustfile_option, parse_options
+from .arrival_rate import print_arrival_rate_stats
 from .env import Environment
+from .history import StatsHistoryStore
 from .log import setup_logging, greenlet_exception_logger
+from .samples import SampleRecorder
 from .stats import (
+    RequestNameNormalizer,
+    StatsBuffer,
     print_error_report,
     print_percentile_stats,
     print_stats,
@@ -113,6 +118,12 @@ def create_environment(user_classes, options, events=None):
 
 
 def main():
+    if sys.argv[1:2] == ["report"]:
+        # imported here, since the report generator requires NumPy
+        from .report import main as report_main
+
+        sys.exit(report_main(sys.argv[2:]))
+
     # find specified locustfile and make sure it exists, using a very simplified
     # command line parser that is only used to parse the -f option
     locustfile = parse_locustfile_option()
@@ -239,6 +250,24 @@ def main():
     else:
         runner = environment.create_local_runner()
 
+    if options.normalize_names:
+        runner.stats.name_normalizer = RequestNameNormalizer()
+    if options.max_stats_entries:
+        runner.stats.max_entries = options.max_stats_entries
+    if options.max_errors:
+        runner.stats.max_errors = options.max_errors
+    if options.stats_buffer_size:
+        runner.stats.buffer = StatsBuffer(runner.stats, options.stats_buffer_size)
+    if options.aggregate_on_demand:
+        runner.stats.aggregate_on_demand = True
+    if options.record_samples and not options.master:
+        # the master node doesn't make any requests
+        SampleRecorder(
+            environment,
+            options.record_samples,
+            node_id=runner.client_id if options.worker else "local",
+        )
+
     # main_greenlet is pointing to runners.greenlet by default, it will point the web greenlet later if in web mode
     main_greenlet = runner.greenlet
 
@@ -349,12 +378,17 @@ def main():
         stats_printer_greenlet = gevent.spawn(stats_printer(runner.stats))
         stats_printer_greenlet.link_exception(greenlet_exception_handler)
 
+    history_store = None
+    if options.csv_prefix and options.binary_history:
+        history_store = StatsHistoryStore(options.csv_prefix + "_stats_history")
+
     if options.csv_prefix:
         gevent.spawn(
             stats_writer,
             environment,
             options.csv_prefix,
             full_history=options.stats_history_enabled,
+            history_store=history_store,
         ).link_exception(greenlet_exception_handler)
 
     def shutdown():
@@ -388,8 +422,12 @@ def main():
                 environment,
                 options.csv_prefix,
                 full_history=options.stats_history_enabled,
+                history_store=history_store,
             )
+            if history_store is not None:
+                history_store.close()
         print_error_report(runner.stats)
+        print_arrival_rate_stats(runner.arrival_rate_stats)
         sys.exit(code)
 
     # install SIGTERM handler
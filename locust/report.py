@@ -0,0 +1,872 @@
+"""
+Offline report generator, that's run with ``locust report``.
+
+It computes stats from the samples recorded with ``--record-samples`` (see
+:mod:`locust.samples`), for any time window and any percentiles, and writes them to CSV files
+with the same columns as the CSV files that are written during a test run:
+
+* ``<prefix>_stats.csv``: the stats of each entry for the whole (or the selected part of the) run
+* ``<prefix>_stats_history.csv``: the stats of each entry, and the Aggregated stats, per window
+* ``<prefix>_failures.csv``: the number of occurrences of each error
+* ``<prefix>_failures_history.csv``: the number of occurrences of each error, per window
+* ``<prefix>_summary.csv``: a summary per entry, with the peak rates and worst window
+
+The samples are read in chunks, and the response times are counted in logarithmic buckets
+(so that the reported percentiles are within 0.1% of the exact values), which keeps memory
+use bounded by the number of entries, windows and distinct buckets rather than by the number
+of samples.
+
+It can also resample a stats history CSV file written during a test run into longer windows
+(``--history``). The requests and failures per second are then calculated for the new
+windows, while the other columns are taken from the last row of each window. And it can
+convert a stats history store written with ``--binary-history`` to the stats history CSV
+format (``--convert-history``).
+"""
+import argparse
+import csv
+import math
+import sys
+from itertools import chain
+
+from .history import write_stats_history_csv
+from .samples import MAX_RESPONSE_TIME, NO_RESPONSE_TIME, read_names, read_segment
+from .stats import PERCENTILES_TO_REPORT, format_response_time, format_status_codes
+from .util.dependencies import import_numpy
+
+np = import_numpy("locust report")
+
+"""Max relative error of the response times that the percentiles are calculated from"""
+REPORT_RELATIVE_ACCURACY = 0.001
+
+"""Number of samples that are read and processed at a time"""
+REPORT_CHUNK_SIZE = 1 << 22
+
+# max number of cells of the dense (windows x buckets) blocks that the percentiles of an
+# entry are calculated from
+BLOCK_CELLS = 1 << 22
+
+
+def percentile_column(percent):
+    return "%g%%" % (percent * 100)
+
+
+def requests_csv_columns(percentiles):
+    """Columns of the stats CSV file (see :func:`locust.stats.requests_csv`)"""
+    return (
+        [
+            "Type",
+            "Name",
+            "Request Count",
+            "Failure Count",
+            "Median Response Time",
+            "Average Response Time",
+            "Min Response Time",
+            "Max Response Time",
+            "Average Content Size",
+            "Requests/s",
+            "Failures/s",
+        ]
+        + [percentile_column(p) for p in percentiles]
+        + ["Status Codes"]
+    )
+
+
+def stats_history_csv_columns(percentiles):
+    """Columns of the stats history CSV file (see :func:`locust.stats.stats_history_csv`)"""
+    return (
+        ["Timestamp", "User Count", "Type", "Name", "Requests/s", "Failures/s"]
+        + [percentile_column(p) for p in percentiles]
+        + [
+            "Total Request Count",
+            "Total Failure Count",
+            "Total Median Response Time",
+            "Total Average Response Time",
+            "Total Min Response Time",
+            "Total Max Response Time",
+            "Total Average Content Size",
+        ]
+    )
+
+
+class LogBuckets(object):
+    """
+    Maps response times (in microseconds) to logarithmically sized buckets, where every
+    value in a bucket is within *relative_accuracy* of the value that's reported for it
+    """
+
+    def __init__(self, relative_accuracy=REPORT_RELATIVE_ACCURACY):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        # bucket 0 holds response times of 0, bucket i > 0 holds (gamma^(i-2), gamma^(i-1)]
+        self.count = int(math.ceil(math.log(MAX_RESPONSE_TIME) / self._log_gamma)) + 2
+
+    def index(self, response_times):
+        """Return the bucket indices of an array of response times"""
+        indices = np.zeros(len(response_times), dtype=np.int64)
+        positive = response_times > 0
+        indices[positive] = (
+            np.ceil(np.log(response_times[positive]) / self._log_gamma).astype(np.int64)
+            + 1
+        )
+        return indices
+
+    def value(self, indices):
+        """Return the response times (in microseconds) that are reported for bucket indices"""
+        values = 2 * self.gamma ** (indices - 1.0) / (self.gamma + 1)
+        values[indices == 0] = 0
+        return values
+
+
+class SparseCounts(object):
+    """
+    Accumulates counts per int64 key, for keys that are spread over a too large range to be
+    counted in a dense array. The counts of each chunk are collected as sorted arrays of
+    unique keys and counts, which are merged once there are enough of them.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._counts = []
+        self._size = 0
+
+    def add(self, keys, weights=None):
+        keys, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse, weights=weights, minlength=len(keys))
+        self.add_counts(keys, counts.astype(np.int64))
+
+    def add_counts(self, keys, counts):
+        """Add the counts of an array of sorted, unique keys"""
+        self._keys.append(keys)
+        self._counts.append(counts)
+        self._size += len(keys)
+        if len(self._keys) > 1 and self._size > 4 * REPORT_CHUNK_SIZE:
+            self._compact()
+
+    def _compact(self):
+        if not self._keys:
+            keys, counts = np.zeros(0, np.int64), np.zeros(0, np.int64)
+        elif len(self._keys) == 1:
+            keys, counts = self._keys[0], self._counts[0]
+        else:
+            keys, inverse = np.unique(np.concatenate(self._keys), return_inverse=True)
+            counts = np.bincount(
+                inverse, weights=np.concatenate(self._counts), minlength=len(keys)
+            ).astype(np.int64)
+        self._keys, self._counts, self._size = [keys], [counts], len(keys)
+
+    def items(self):
+        """Return the sorted keys and their counts, as two arrays"""
+        self._compact()
+        return self._keys[0], self._counts[0]
+
+
+def _sparse_percentiles(starts, ends, values, counts, percents):
+    """
+    Calculate percentiles for groups of (value, count) rows, where the rows of each group are
+    sorted by value, and group i is the rows [starts[i], ends[i]). Returns a (groups x percents)
+    array.
+    """
+    cumulative = np.concatenate([[0], np.cumsum(counts)])
+    base = cumulative[starts]
+    totals = cumulative[ends] - base
+    result = np.zeros((len(base), len(percents)))
+    for i, percent in enumerate(percents):
+        # like locust.histogram.calculate_percentiles(): the value of the first row where the
+        # cumulative count exceeds int(total * percent). Since the counts are positive, the
+        # cumulative counts of all groups are sorted, so that row can be found with a binary
+        # search.
+        thresholds = base + np.floor(totals * percent).astype(np.int64)
+        rows = np.searchsorted(cumulative, thresholds, side="right") - 1
+        rows = np.clip(rows, 0, np.maximum(np.asarray(ends) - 1, 0))
+        result[:, i] = np.where(totals > 0, values[rows], 0)
+    return result
+
+
+class SampleReport(object):
+    """
+    Calculates the stats of recorded samples, per entry and per window
+    """
+
+    def __init__(
+        self,
+        directory,
+        window=10,
+        percentiles=None,
+        start=None,
+        end=None,
+        node_id=None,
+        chunk_size=None,
+    ):
+        """
+        :param directory: Directory with the recorded samples
+        :param window: Length of the windows (in seconds)
+        :param percentiles: Percentiles to report (PERCENTILES_TO_REPORT by default)
+        :param start: Only include samples from this many seconds after the first sample
+        :param end: Only include samples until this many seconds after the first sample
+        :param node_id: Only include the samples of this node
+        :param chunk_size: Number of samples to process at a time
+        """
+        self.directory = directory
+        self.window = window
+        self.percentiles = list(percentiles or PERCENTILES_TO_REPORT)
+        self.chunk_size = chunk_size or REPORT_CHUNK_SIZE
+        self.buckets = LogBuckets()
+        self.entries, self.errors, self.statuses, nodes = read_names(directory, node_id)
+        self._nodes = [
+            (
+                np.array(entry_map, dtype=np.int64),
+                np.array(error_map, dtype=np.int64),
+                np.array(status_map, dtype=np.int64),
+                segments,
+            )
+            for _, entry_map, error_map, status_map, segments in nodes
+        ]
+        self._set_time_range(start, end)
+        self._scan()
+
+    def _set_time_range(self, start, end):
+        first, last = None, None
+        for segment in chain.from_iterable(
+            segments for _, _, _, segments in self._nodes
+        ):
+            timestamps = read_segment(segment)["timestamp"]
+            if len(timestamps):
+                first = min(first or timestamps[0], timestamps[0])
+                last = max(last or timestamps[-1], timestamps[-1])
+        if first is None:
+            raise ValueError("No recorded samples found in %s" % self.directory)
+        self.first_timestamp = int(first) + int((start or 0) * 1000000)
+        self.last_timestamp = int(last)
+        if end is not None:
+            self.last_timestamp = min(
+                self.last_timestamp, int(first) + int(end * 1000000)
+            )
+        window = int(self.window * 1000000)
+        self._window_start = self.first_timestamp - self.first_timestamp % window
+        self.num_windows = (self.last_timestamp - self._window_start) // window + 1
+
+    def _chunks(self):
+        for entry_map, error_map, status_map, segments in self._nodes:
+            for segment in segments:
+                records = read_segment(segment)
+                for i in range(0, len(records), self.chunk_size):
+                    chunk = records[i : i + self.chunk_size]
+                    timestamps = chunk["timestamp"]
+                    selected = (timestamps >= self.first_timestamp) & (
+                        timestamps <= self.last_timestamp
+                    )
+                    if not selected.all():
+                        chunk = chunk[selected]
+                    if len(chunk):
+                        yield chunk, entry_map, error_map, status_map
+
+    def _scan(self):
+        num_entries = len(self.entries)
+        groups = num_entries * self.num_windows
+        self.num_requests = np.zeros(groups, dtype=np.int64)
+        self.num_none_requests = np.zeros(groups, dtype=np.int64)
+        self.num_failures = np.zeros(groups, dtype=np.int64)
+        self.total_response_time = np.zeros(groups)
+        self.min_response_time = np.full(groups, np.inf)
+        self.max_response_time = np.zeros(groups)
+        self.total_content_length = np.zeros(groups)
+        self._histograms = SparseCounts()
+        self._error_counts = SparseCounts()
+        self._status_counts = SparseCounts()
+        window = int(self.window * 1000000)
+        for chunk, entry_map, error_map, status_map in self._chunks():
+            entry_ids = entry_map[chunk["entry_id"]]
+            group = entry_ids * self.num_windows + (
+                (chunk["timestamp"] - self._window_start) // window
+            )
+            self.num_requests += np.bincount(group, minlength=groups)
+            self.total_content_length += np.bincount(
+                group, weights=chunk["content_length"], minlength=groups
+            )
+            error_ids = error_map[chunk["error_id"]]
+            failed = error_ids > 0
+            self.num_failures += np.bincount(group[failed], minlength=groups)
+            self._error_counts.add(
+                group[failed] * (len(self.errors) + 1) + error_ids[failed]
+            )
+            # the status codes are only reported for the whole run, not per window
+            status_ids = status_map[chunk["status_id"]]
+            has_status = status_ids > 0
+            self._status_counts.add(
+                entry_ids[has_status] * (len(self.statuses) + 1)
+                + status_ids[has_status]
+            )
+
+            response_times = chunk["response_time"]
+            has_response_time = response_times != NO_RESPONSE_TIME
+            self.num_none_requests += np.bincount(
+                group[~has_response_time], minlength=groups
+            )
+            group = group[has_response_time]
+            response_times = response_times[has_response_time]
+            if not len(group):
+                continue
+            self.total_response_time += np.bincount(
+                group, weights=response_times, minlength=groups
+            )
+            # sort the samples by group and bucket, which gives us both the histogram counts
+            # and the samples of each group, for the min and max response times
+            keys = group * self.buckets.count + self.buckets.index(response_times)
+            order = np.argsort(keys)
+            keys = keys[order]
+            response_times = response_times[order]
+            starts = np.flatnonzero(np.diff(keys)) + 1
+            self._histograms.add_counts(
+                np.concatenate([keys[:1], keys[starts]]),
+                np.diff(np.concatenate([[0], starts, [len(keys)]])),
+            )
+            group = keys // self.buckets.count
+            starts = np.concatenate([[0], np.flatnonzero(np.diff(group)) + 1])
+            group = group[starts]
+            self.min_response_time[group] = np.minimum(
+                self.min_response_time[group],
+                np.minimum.reduceat(response_times, starts),
+            )
+            self.max_response_time[group] = np.maximum(
+                self.max_response_time[group],
+                np.maximum.reduceat(response_times, starts),
+            )
+
+    def window_timestamps(self):
+        """Return the start time (in seconds since the epoch) of each window"""
+        return (
+            self._window_start
+            + np.arange(self.num_windows) * int(self.window * 1000000)
+        ) // 1000000
+
+    def _percentiles(self, windows, buckets, counts, percents):
+        """
+        Calculate the percentiles per window, and the cumulative median up until each window,
+        from the (window, bucket, count) rows of the histograms of an entry, sorted by window
+        and bucket
+        """
+        num_windows = self.num_windows
+        cumulative_medians = np.zeros(num_windows)
+        if not len(counts):
+            return np.zeros((num_windows, len(percents))), cumulative_medians
+        window_indices = np.arange(num_windows)
+        window_percentiles = _sparse_percentiles(
+            np.searchsorted(windows, window_indices),
+            np.searchsorted(windows, window_indices, side="right"),
+            self.buckets.value(buckets),
+            counts,
+            percents,
+        )
+        # the cumulative median needs the histograms of all windows up until each window,
+        # which are summed up in dense (windows x buckets) blocks
+        used_buckets, columns = np.unique(buckets, return_inverse=True)
+        values = self.buckets.value(used_buckets)
+        cumulative = np.zeros(len(used_buckets), dtype=np.int64)
+        block_size = max(1, BLOCK_CELLS // len(used_buckets))
+        for first in range(0, num_windows, block_size):
+            last = min(first + block_size, num_windows)
+            rows = slice(
+                np.searchsorted(windows, first), np.searchsorted(windows, last)
+            )
+            block = np.zeros((last - first, len(used_buckets)), dtype=np.int64)
+            block[windows[rows] - first, columns[rows]] = counts[rows]
+            block = np.cumsum(block, axis=0) + cumulative
+            cumulative = block[-1]
+            # like locust.histogram.calculate_percentiles(): the value of the first bucket
+            # where the cumulative count exceeds int(total * percent)
+            block = np.cumsum(block, axis=1)
+            thresholds = block[:, -1] // 2
+            indices = np.minimum(
+                (block <= thresholds[:, None]).sum(axis=1), len(values) - 1
+            )
+            cumulative_medians[first:last] = np.where(
+                block[:, -1] > 0, values[indices], 0
+            )
+        return window_percentiles, cumulative_medians
+
+    def entry_stats(self):
+        """
+        Return a list with the stats of each entry, and the Aggregated stats last, as dicts
+        with per window arrays
+        """
+        keys, counts = self._histograms.items()
+        groups = keys // self.buckets.count
+        buckets = keys % self.buckets.count
+        entries = groups // self.num_windows
+        windows = groups % self.num_windows
+        shape = (len(self.entries), self.num_windows)
+        result = []
+        for entry_id, (method, name) in enumerate(self.entries):
+            rows = slice(
+                np.searchsorted(entries, entry_id),
+                np.searchsorted(entries, entry_id + 1),
+            )
+            result.append(
+                self._stats(
+                    method,
+                    name,
+                    [a.reshape(shape)[entry_id] for a in self._scalars()],
+                    windows[rows],
+                    buckets[rows],
+                    counts[rows],
+                )
+            )
+        aggregated_status_codes = {}
+        for entry_stats, status_codes in zip(result, self.status_counts()):
+            entry_stats["status_codes"] = status_codes
+            for status, count in status_codes.items():
+                aggregated_status_codes[status] = (
+                    aggregated_status_codes.get(status, 0) + count
+                )
+        # the Aggregated stats, from the histograms of all entries combined
+        aggregated = SparseCounts()
+        aggregated.add(windows * self.buckets.count + buckets, weights=counts)
+        keys, aggregated_counts = aggregated.items()
+        scalars = [a.reshape(shape) for a in self._scalars()]
+        result.append(
+            self._stats(
+                None,
+                "Aggregated",
+                [a.sum(axis=0) for a in scalars[:5]]
+                + [scalars[5].min(axis=0), scalars[6].max(axis=0)],
+                keys // self.buckets.count,
+                keys % self.buckets.count,
+                aggregated_counts,
+            )
+        )
+        result[-1]["status_codes"] = aggregated_status_codes
+        return result
+
+    def _scalars(self):
+        return [
+            self.num_requests,
+            self.num_none_requests,
+            self.num_failures,
+            self.total_response_time,
+            self.total_content_length,
+            self.min_response_time,
+            self.max_response_time,
+        ]
+
+    def _stats(self, method, name, scalars, windows, buckets, counts):
+        (
+            num_requests,
+            num_none_requests,
+            num_failures,
+            total_response_time,
+            total_content_length,
+            min_response_time,
+            max_response_time,
+        ) = scalars
+        window_percentiles, cumulative_medians = self._percentiles(
+            windows, buckets, counts, self.percentiles
+        )
+        # like StatsEntry.median_response_time, don't report values outside of [min, max]
+        min_response_time = np.where(np.isinf(min_response_time), 0, min_response_time)
+        window_percentiles = np.clip(
+            window_percentiles, min_response_time[:, None], max_response_time[:, None]
+        )
+        cumulative_min = np.minimum.accumulate(
+            np.where(max_response_time > 0, min_response_time, np.inf)
+        )
+        cumulative_min = np.where(np.isinf(cumulative_min), 0, cumulative_min)
+        cumulative_max = np.maximum.accumulate(max_response_time)
+        cumulative_medians = np.clip(cumulative_medians, cumulative_min, cumulative_max)
+        cumulative_requests = np.cumsum(num_requests)
+        cumulative_timed = cumulative_requests - np.cumsum(num_none_requests)
+        return {
+            "method": method,
+            "name": name,
+            "num_requests": num_requests,
+            "num_failures": num_failures,
+            "percentiles": window_percentiles / 1000,
+            "total_num_requests": cumulative_requests,
+            "total_num_failures": np.cumsum(num_failures),
+            "total_median_response_time": cumulative_medians / 1000,
+            "total_avg_response_time": np.cumsum(total_response_time)
+            / np.maximum(cumulative_timed, 1)
+            / 1000,
+            "total_min_response_time": cumulative_min / 1000,
+            "total_max_response_time": cumulative_max / 1000,
+            "total_avg_content_length": np.cumsum(total_content_length)
+            / np.maximum(cumulative_requests, 1),
+            "total_percentiles": self._total_percentiles(buckets, counts)
+            if len(counts)
+            else np.zeros(len(self.percentiles)),
+        }
+
+    def _total_percentiles(self, buckets, counts):
+        used_buckets, columns = np.unique(buckets, return_inverse=True)
+        counts = np.bincount(columns, weights=counts, minlength=len(used_buckets))
+        return (
+            _sparse_percentiles(
+                [0],
+                [len(used_buckets)],
+                self.buckets.value(used_buckets),
+                counts.astype(np.int64),
+                self.percentiles,
+            )[0]
+            / 1000
+        )
+
+    def status_counts(self):
+        """
+        Return a list with the {status: count} dict (see :attr:`StatsEntry.status_codes
+        <locust.stats.StatsEntry.status_codes>`) of each entry
+        """
+        keys, counts = self._status_counts.items()
+        result = [{} for _ in self.entries]
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            entry_id, status_id = divmod(key, len(self.statuses) + 1)
+            result[entry_id][self.statuses[status_id - 1]] = count
+        return result
+
+    def error_counts(self):
+        """
+        Return a list of (window, entry ID, error ID, count) tuples, sorted by window
+        """
+        keys, counts = self._error_counts.items()
+        groups = keys // (len(self.errors) + 1)
+        rows = np.stack(
+            [
+                groups % self.num_windows,
+                groups // self.num_windows,
+                keys % (len(self.errors) + 1),
+                counts,
+            ],
+            axis=1,
+        )
+        return rows[np.lexsort((rows[:, 2], rows[:, 1], rows[:, 0]))].tolist()
+
+    def duration(self):
+        return max((self.last_timestamp - self.first_timestamp) / 1000000, 1e-6)
+
+    def window_durations(self):
+        """Length of each window (in seconds), where the first and last may be partial"""
+        starts = np.maximum(
+            self._window_start
+            + np.arange(self.num_windows) * int(self.window * 1000000),
+            self.first_timestamp,
+        )
+        ends = np.minimum(
+            self._window_start
+            + np.arange(1, self.num_windows + 1) * int(self.window * 1000000),
+            self.last_timestamp,
+        )
+        return np.maximum(ends - starts, 1) / 1000000
+
+    def write_csv_files(self, base_filepath):
+        """Write all of the report's CSV files, named <base_filepath>_<name>.csv"""
+        stats = self.entry_stats()
+        errors = self.error_counts()
+        with open(base_filepath + "_stats.csv", "w", newline="") as f:
+            self.write_requests_csv(csv.writer(f), stats)
+        with open(base_filepath + "_stats_history.csv", "w", newline="") as f:
+            self.write_stats_history_csv(csv.writer(f), stats)
+        with open(base_filepath + "_failures.csv", "w", newline="") as f:
+            self.write_failures_csv(csv.writer(f), errors)
+        with open(base_filepath + "_failures_history.csv", "w", newline="") as f:
+            self.write_failures_history_csv(csv.writer(f), errors)
+        with open(base_filepath + "_summary.csv", "w", newline="") as f:
+            self.write_summary_csv(csv.writer(f), stats)
+
+    def write_requests_csv(self, writer, stats):
+        writer.writerow(requests_csv_columns(self.percentiles))
+        duration = self.duration()
+        entries = sorted(stats[:-1], key=lambda s: (s["name"], s["method"]))
+        for s in chain(entries, stats[-1:]):
+            num_requests = int(s["total_num_requests"][-1])
+            if num_requests:
+                percentile_row = [
+                    format_response_time(p) for p in s["total_percentiles"]
+                ]
+            else:
+                percentile_row = ["N/A"] * len(self.percentiles)
+            writer.writerow(
+                [
+                    s["method"] or "",
+                    s["name"],
+                    num_requests,
+                    int(s["total_num_failures"][-1]),
+                    float(s["total_median_response_time"][-1]),
+                    float(s["total_avg_response_time"][-1]),
+                    float(s["total_min_response_time"][-1]),
+                    float(s["total_max_response_time"][-1]),
+                    float(s["total_avg_content_length"][-1]),
+                    num_requests / duration,
+                    int(s["total_num_failures"][-1]) / duration,
+                ]
+                + percentile_row
+                + [format_status_codes(s["status_codes"])]
+            )
+
+    def write_stats_history_csv(self, writer, stats):
+        writer.writerow(stats_history_csv_columns(self.percentiles))
+        timestamps = self.window_timestamps().tolist()
+        durations = self.window_durations()
+        entries = sorted(stats[:-1], key=lambda s: (s["name"], s["method"]))
+        rows = []
+        for s in chain(entries, stats[-1:]):
+            rps = (s["num_requests"] / durations).tolist()
+            fail_per_sec = (s["num_failures"] / durations).tolist()
+            percentiles = s["percentiles"].tolist()
+            columns = [
+                s["total_num_requests"].tolist(),
+                s["total_num_failures"].tolist(),
+                s["total_median_response_time"].tolist(),
+                s["total_avg_response_time"].tolist(),
+                s["total_min_response_time"].tolist(),
+                s["total_max_response_time"].tolist(),
+                s["total_avg_content_length"].tolist(),
+            ]
+            for w, timestamp in enumerate(timestamps):
+                if not columns[0][w]:
+                    # the entry hasn't got any requests yet
+                    continue
+                if s["num_requests"][w]:
+                    percentile_row = [format_response_time(p) for p in percentiles[w]]
+                else:
+                    percentile_row = ["N/A"] * len(self.percentiles)
+                rows.append(
+                    [
+                        timestamp,
+                        "N/A",
+                        s["method"] or "",
+                        s["name"],
+                        "%.2f" % rps[w],
+                        "%.2f" % fail_per_sec[w],
+                    ]
+                    + percentile_row
+                    + [
+                        columns[0][w],
+                        columns[1][w],
+                        format_response_time(columns[2][w]),
+                        format_response_time(columns[3][w]),
+                        format_response_time(columns[4][w]),
+                        format_response_time(columns[5][w]),
+                        "%i" % columns[6][w],
+                    ]
+                )
+        # like the history written during a test run, the rows are ordered by time
+        rows.sort(key=lambda row: row[0])
+        writer.writerows(rows)
+
+    def write_failures_csv(self, writer, errors):
+        writer.writerow(["Method", "Name", "Error", "Occurrences"])
+        occurrences = {}
+        for _, entry_id, error_id, count in errors:
+            key = (entry_id, error_id)
+            occurrences[key] = occurrences.get(key, 0) + count
+        for (entry_id, error_id), count in sorted(
+            occurrences.items(), key=lambda item: -item[1]
+        ):
+            method, name = self.entries[entry_id]
+            writer.writerow([method, name, self.errors[error_id - 1], count])
+
+    def write_failures_history_csv(self, writer, errors):
+        writer.writerow(
+            ["Timestamp", "Method", "Name", "Error", "Occurrences", "Failures/s"]
+        )
+        timestamps = self.window_timestamps().tolist()
+        durations = self.window_durations().tolist()
+        for window, entry_id, error_id, count in errors:
+            method, name = self.entries[entry_id]
+            writer.writerow(
+                [
+                    timestamps[window],
+                    method,
+                    name,
+                    self.errors[error_id - 1],
+                    count,
+                    "%.2f" % (count / durations[window]),
+                ]
+            )
+
+    def write_summary_csv(self, writer, stats):
+        writer.writerow(
+            [
+                "Type",
+                "Name",
+                "Request Count",
+                "Failure Count",
+                "Failure Ratio",
+                "Peak Requests/s",
+                "Peak Failures/s",
+                "Worst Window Failure Ratio",
+                "Worst Window Median Response Time",
+                "Worst Window Timestamp",
+            ]
+        )
+        durations = self.window_durations()
+        timestamps = self.window_timestamps()
+        median = self.percentiles.index(0.5) if 0.5 in self.percentiles else None
+        entries = sorted(stats[:-1], key=lambda s: (s["name"], s["method"]))
+        for s in chain(entries, stats[-1:]):
+            num_requests = int(s["total_num_requests"][-1])
+            num_failures = int(s["total_num_failures"][-1])
+            failure_ratios = s["num_failures"] / np.maximum(s["num_requests"], 1)
+            if median is not None:
+                worst = int(np.argmax(s["percentiles"][:, median]))
+                worst_median = format_response_time(s["percentiles"][worst, median])
+            else:
+                worst = int(np.argmax(failure_ratios))
+                worst_median = "N/A"
+            writer.writerow(
+                [
+                    s["method"] or "",
+                    s["name"],
+                    num_requests,
+                    num_failures,
+                    "%.4f" % (num_failures / max(num_requests, 1)),
+                    "%.2f" % (s["num_requests"] / durations).max(),
+                    "%.2f" % (s["num_failures"] / durations).max(),
+                    "%.4f" % failure_ratios.max(),
+                    worst_median,
+                    int(timestamps[worst]),
+                ]
+            )
+
+
+def resample_stats_history(history_file, writer, window):
+    """
+    Resample the rows of a stats history CSV file into windows of *window* seconds. The
+    requests and failures per second are calculated from how much the total counts changed
+    since the previous window, while the other columns are taken from the last row of each
+    window.
+    """
+    reader = csv.reader(history_file)
+    columns = next(reader)
+    index = {column: i for i, column in enumerate(columns)}
+    rows = {}
+    for row in reader:
+        rows.setdefault((row[index["Type"]], row[index["Name"]]), []).append(row)
+    resampled = []
+    for entry_rows in rows.values():
+        timestamps = np.array([int(row[index["Timestamp"]]) for row in entry_rows])
+        requests = np.array(
+            [int(row[index["Total Request Count"]]) for row in entry_rows]
+        )
+        failures = np.array(
+            [int(row[index["Total Failure Count"]]) for row in entry_rows]
+        )
+        windows = timestamps // window
+        # the last row of each window, and the row that the previous window ended with
+        last = np.flatnonzero(np.append(windows[1:] != windows[:-1], True))
+        previous = np.concatenate([[0], last[:-1]])
+        durations = np.maximum(timestamps[last] - timestamps[previous], 1)
+        rps = (requests[last] - requests[previous]) / durations
+        fail_per_sec = (failures[last] - failures[previous]) / durations
+        for i, row in enumerate(last.tolist()):
+            row = list(entry_rows[row])
+            row[index["Timestamp"]] = str(windows[last[i]] * window)
+            row[index["Requests/s"]] = "%.2f" % rps[i]
+            row[index["Failures/s"]] = "%.2f" % fail_per_sec[i]
+            resampled.append(row)
+    resampled.sort(key=lambda row: int(row[index["Timestamp"]]))
+    writer.writerow(columns)
+    writer.writerows(resampled)
+
+
+def parse_percentiles(value):
+    return [float(p) for p in value.split(",")]
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(
+        prog="locust report",
+        description="Generate CSV reports from samples recorded with --record-samples, "
+        "or resample a stats history CSV file",
+    )
+    parser.add_argument(
+        "samples",
+        nargs="?",
+        metavar="DIRECTORY",
+        help="Directory with samples recorded with --record-samples",
+    )
+    parser.add_argument(
+        "--history",
+        metavar="FILE",
+        help="Resample a stats history CSV file, instead of reporting on recorded samples",
+    )
+    parser.add_argument(
+        "--convert-history",
+        metavar="DIRECTORY",
+        help="Convert a stats history store written with --binary-history to [CSV]_stats_history.csv",
+    )
+    parser.add_argument(
+        "--csv",
+        dest="csv_prefix",
+        default="report",
+        help="Prefix of the CSV files that the report is written to. Defaults to 'report'",
+    )
+    parser.add_argument(
+        "--window",
+        type=float,
+        default=10,
+        help="Length (in seconds) of the windows that the history is reported in. Defaults to 10",
+    )
+    parser.add_argument(
+        "--percentiles",
+        type=parse_percentiles,
+        default=None,
+        help="Comma separated percentiles to report, e.g. 0.5,0.9,0.99. Defaults to the same as during a test run",
+    )
+    parser.add_argument(
+        "--start",
+        type=float,
+        default=None,
+        help="Only include samples from this many seconds after the first sample",
+    )
+    parser.add_argument(
+        "--end",
+        type=float,
+        default=None,
+        help="Only include samples until this many seconds after the first sample",
+    )
+    parser.add_argument(
+        "--node", default=None, help="Only include the samples recorded by this node"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=None,
+        help="Number of samples to process at a time",
+    )
+    return parser
+
+
+def main(args=None):
+    parser = create_parser()
+    options = parser.parse_args(args)
+    if options.history:
+        with open(options.history, newline="") as history_file:
+            with open(
+                options.csv_prefix + "_stats_history.csv", "w", newline=""
+            ) as output:
+                resample_stats_history(
+                    history_file, csv.writer(output), int(options.window)
+                )
+        return 0
+    if options.convert_history:
+        with open(options.csv_prefix + "_stats_history.csv", "w") as output:
+            write_stats_history_csv(options.convert_history, output)
+        return 0
+    if not options.samples:
+        parser.error(
+            "either a samples directory, --history or --convert-history is required"
+        )
+    try:
+        report = SampleReport(
+            options.samples,
+            window=options.window,
+            percentiles=options.percentiles,
+            start=options.start,
+            end=options.end,
+            node_id=options.node,
+            chunk_size=options.chunk_size,
+        )
+    except ValueError as e:
+        sys.stderr.write("%s\n" % e)
+        return 1
+    report.write_csv_files(options.csv_prefix)
+    return 0
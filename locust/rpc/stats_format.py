@@ -0,0 +1,418 @@
+"""
+Compact binary format for the stats reports that worker nodes send to the master.
+
+The regular reports contain a ``StatsEntry.serialize()`` dict for every stats entry, with the
+same string keys, names and methods in every report. When both the master and the worker
+support it, the worker instead sends a single ``stats_report`` item, with a msgpack encoded
+(and for larger reports, zlib compressed) payload where:
+
+* each (name, method) pair is assigned an integer ID the first time it's reported, and only
+  the IDs are sent in later reports
+* stats entries are encoded as positional lists instead of dicts. The counters are the
+  deltas since the previous report, since the worker resets its stats after each report.
+* histograms are encoded as sparse arrays of bucket keys (delta encoded) and counts. For
+  LogLinearHistogram and DDSketchHistogram the keys are the bucket indices, and for other
+  histograms the response times (as integers, scaled by a number of decimals if needed).
+  The per second counts are encoded as a base timestamp with arrays of deltas and counts
+* the status codes of each stats entry (see :attr:`StatsEntry.status_codes
+  <locust.stats.StatsEntry.status_codes>`) are encoded as a flat list of statuses and counts
+* the new and reused connection counts and the histograms of the connection phases of each
+  stats entry (see :attr:`StatsEntry.phase_times <locust.stats.StatsEntry.phase_times>`) are
+  sent along with the entry, and each error includes its error margin (see
+  :class:`StatsErrors <locust.stats.StatsErrors>`)
+
+The format is negotiated when the worker connects: the worker sends the version of the format
+that it supports in its ``client_ready`` message, and if the master supports the same version
+it sends it back along with the ``hatch`` messages. Workers and masters that don't support the
+format keep using the regular reports.
+"""
+import zlib
+from array import array
+from itertools import accumulate
+
+import msgpack
+
+from ..histogram import (
+    DDSketchHistogram,
+    LogLinearHistogram,
+    RoundedHistogram,
+    SerializedHistogram,
+)
+from ..stats import CONNECTION_PHASES, StatsEntry
+
+"""Version of the stats report format"""
+STATS_REPORT_VERSION = 1
+
+"""Reports with a larger payload (in bytes) are zlib compressed"""
+STATS_REPORT_COMPRESSION_THRESHOLD = 4096
+
+# histogram layouts. The layouts of float values and bucketed histograms are lists that start
+# with the kind of histogram, followed by its parameters: the number of decimals that the float
+# values are sent with (as delta encoded integers), or the parameters of the histogram.
+INTEGER_VALUES = 0
+FLOAT_VALUES = 1
+LOG_LINEAR_BUCKETS = 2
+DDSKETCH_BUCKETS = 3
+
+# float values with more decimals than this are rounded (to nanoseconds, for milliseconds)
+FLOAT_VALUES_MAX_DECIMALS = 6
+
+
+def _delta_encode(values):
+    return [value - previous for previous, value in zip([0] + values, values)]
+
+
+def _delta_decode(deltas):
+    return list(accumulate(deltas))
+
+
+def _float_decimals(keys):
+    # the number of decimals that all the keys can be sent with as integers, without changing
+    # them (RoundedHistogram keys have at most two decimals)
+    for decimals in range(1, FLOAT_VALUES_MAX_DECIMALS):
+        if all(round(key, decimals) == key for key in keys):
+            return decimals
+    return FLOAT_VALUES_MAX_DECIMALS
+
+
+def encode_histogram(histogram):
+    """
+    Encode a histogram (or {response_time: count} dict) as a [layout, keys, counts] list
+    """
+    if not histogram:
+        return None
+    if isinstance(histogram, SerializedHistogram):
+        # a histogram from a serialized stats entry, that we can send the buckets of
+        histogram = histogram.histogram
+    if isinstance(histogram, LogLinearHistogram):
+        indices = [index for index, count in enumerate(histogram.counts) if count]
+        return [
+            [LOG_LINEAR_BUCKETS, histogram.significant_digits, histogram.resolution],
+            _delta_encode(indices),
+            [histogram.counts[index] for index in indices],
+        ]
+    if isinstance(histogram, DDSketchHistogram):
+        indices = sorted(histogram.buckets)
+        return [
+            [
+                DDSKETCH_BUCKETS,
+                histogram.relative_accuracy,
+                histogram.min_value,
+                histogram.zero_count,
+            ],
+            _delta_encode(indices),
+            [histogram.buckets[index] for index in indices],
+        ]
+    items = sorted(histogram.items())
+    keys = [key for key, _ in items]
+    counts = [count for _, count in items]
+    if all(key == int(key) for key in keys):
+        return [INTEGER_VALUES, _delta_encode([int(key) for key in keys]), counts]
+    decimals = _float_decimals(keys)
+    scale = 10 ** decimals
+    return [
+        [FLOAT_VALUES, decimals],
+        _delta_encode([round(key * scale) for key in keys]),
+        counts,
+    ]
+
+
+def decode_histogram(data):
+    """
+    Decode a histogram that was encoded with :func:`encode_histogram`
+    """
+    layout, keys, counts = data
+    if layout == INTEGER_VALUES:
+        keys = _delta_decode(keys)
+    elif layout[0] == FLOAT_VALUES:
+        scale = 10 ** layout[1]
+        keys = [key / scale for key in _delta_decode(keys)]
+    elif layout[0] == LOG_LINEAR_BUCKETS:
+        histogram = LogLinearHistogram(layout[1], layout[2])
+        indices = _delta_decode(keys)
+        histogram.counts = array(
+            "Q", bytes(histogram.counts.itemsize * (indices[-1] + 1))
+        )
+        for index, count in zip(indices, counts):
+            histogram.counts[index] = count
+        histogram._count = sum(counts)
+        return histogram
+    elif layout[0] == DDSKETCH_BUCKETS:
+        histogram = DDSketchHistogram(layout[1], layout[2])
+        histogram.buckets = dict(zip(_delta_decode(keys), counts))
+        histogram.zero_count = layout[3]
+        histogram._count = sum(counts) + layout[3]
+        return histogram
+    else:
+        raise ValueError("Unknown histogram layout: %r" % (layout,))
+    # like in StatsEntry.unserialize(), the response times are recorded into the buckets of
+    # the histogram of the entry that this entry is merged into
+    return RoundedHistogram(zip(keys, counts))
+
+
+def encode_time_series(counts):
+    """
+    Encode a {timestamp: count} dict (or TieredTimeSeries) as a [base, deltas, counts] list
+    """
+    if not counts:
+        return None
+    timestamps = sorted(counts)
+    deltas = _delta_encode(timestamps)
+    return [deltas[0], deltas[1:], [counts[t] for t in timestamps]]
+
+
+def decode_time_series(data):
+    base, deltas, counts = data
+    return dict(zip(_delta_decode([base] + deltas), counts))
+
+
+def encode_status_codes(status_codes):
+    """
+    Encode a {status: count} dict as a flat [status, count, status, count, ...] list
+    """
+    if not status_codes:
+        return None
+    return [value for item in status_codes.items() for value in item]
+
+
+def decode_status_codes(data):
+    return dict(zip(data[::2], data[1::2]))
+
+
+def encode_connections(data):
+    """
+    Encode the connection counts and phase times of a serialized stats entry as a
+    [num_new_connections, num_reused_connections, [histogram of each CONNECTION_PHASES]] list
+    """
+    phase_times = data.get("phase_times") or {}
+    if not (
+        data.get("num_new_connections")
+        or data.get("num_reused_connections")
+        or phase_times
+    ):
+        return None
+    return [
+        data["num_new_connections"],
+        data["num_reused_connections"],
+        [encode_histogram(phase_times.get(phase)) for phase in CONNECTION_PHASES],
+    ]
+
+
+def decode_connections(data):
+    num_new_connections, num_reused_connections, histograms = data
+    phase_times = {
+        phase: decode_histogram(histogram)
+        for phase, histogram in zip(CONNECTION_PHASES, histograms)
+        if histogram is not None
+    }
+    return num_new_connections, num_reused_connections, phase_times
+
+
+class StatsReportEncoder(object):
+    """
+    Encodes the stats reports of a worker node. An instance should be used for as long as the
+    master keeps the entry IDs that have been sent, i.e. until the worker sends a new
+    ``client_ready`` message.
+
+    The IDs that are assigned while encoding a report are only known to the master once the
+    report has been sent, so they're pending until :meth:`commit` is called after sending it,
+    and are forgotten by :meth:`rollback` (or the next :meth:`encode`) if sending fails.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._pending_ids = {}
+        self._resend_definitions = False
+
+    def _entry_id(self, name, method, definitions):
+        key = (name, method)
+        entry_id = self._ids.get(key)
+        if entry_id is None:
+            entry_id = self._pending_ids.get(key)
+            if entry_id is None:
+                entry_id = self._pending_ids[key] = len(self._ids) + len(
+                    self._pending_ids
+                )
+                definitions.extend((entry_id, name, method))
+        return entry_id
+
+    def commit(self):
+        """
+        Called when the last encoded report has been sent, which makes the master aware of
+        the entry IDs that were defined in it
+        """
+        self._ids.update(self._pending_ids)
+        self._pending_ids = {}
+        self._resend_definitions = False
+
+    def rollback(self):
+        """
+        Called when the last encoded report couldn't be sent, so that the entry IDs that were
+        defined in it are defined again in the next report
+        """
+        self._pending_ids = {}
+
+    def resend_definitions(self):
+        """
+        Include the definitions of all entry IDs in the next report, e.g. when the master
+        got a report with an ID that it doesn't know
+        """
+        self._resend_definitions = True
+
+    def _encode_entry(self, entry_id, data):
+        return [
+            entry_id,
+            data["num_requests"],
+            data["num_none_requests"],
+            data["num_failures"],
+            data["total_response_time"],
+            data["max_response_time"],
+            data["min_response_time"],
+            data["total_content_length"],
+            data["start_time"],
+            data["last_request_timestamp"],
+            encode_histogram(data["response_times"]),
+            encode_time_series(data["num_reqs_per_sec"]),
+            encode_time_series(data["num_fail_per_sec"]),
+            encode_status_codes(data.get("status_codes")),
+            encode_connections(data),
+        ]
+
+    def encode(self, data):
+        """
+        Replace the "stats", "stats_total" and "errors" items of a report data dict
+        (see :func:`setup_distributed_stats_event_listeners <locust.stats.setup_distributed_stats_event_listeners>`)
+        with a "stats_report" item
+        """
+        self.rollback()
+        definitions = []
+        if self._resend_definitions:
+            for (name, method), entry_id in self._ids.items():
+                definitions.extend((entry_id, name, method))
+        entries = [
+            self._encode_entry(
+                self._entry_id(entry["name"], entry["method"], definitions), entry
+            )
+            for entry in data.pop("stats")
+        ]
+        total = self._encode_entry(None, data.pop("stats_total"))
+        errors = []
+        for key, error in data.pop("errors").items():
+            errors.extend(
+                (
+                    bytes.fromhex(key),
+                    self._entry_id(error["name"], error["method"], definitions),
+                    error["error"],
+                    error["occurrences"],
+                    error.get("error_margin", 0),
+                )
+            )
+        payload = msgpack.dumps([definitions, entries, total, errors])
+        compressed = len(payload) > STATS_REPORT_COMPRESSION_THRESHOLD
+        if compressed:
+            payload = zlib.compress(payload, 1)
+        data["stats_report"] = [STATS_REPORT_VERSION, compressed, payload]
+        return data
+
+
+class StatsReportDecoder(object):
+    """
+    Decodes the stats reports from a worker node, into StatsEntry instances and the regular
+    errors dict. There should be one instance per connected worker.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        # the IDs in the last decoded report that there were no definitions for
+        self.unknown_ids = set()
+
+    def _decode_entry(self, data):
+        (
+            entry_id,
+            num_requests,
+            num_none_requests,
+            num_failures,
+            total_response_time,
+            max_response_time,
+            min_response_time,
+            total_content_length,
+            start_time,
+            last_request_timestamp,
+            response_times,
+            num_reqs_per_sec,
+            num_fail_per_sec,
+            status_codes,
+            connections,
+        ) = data
+        if entry_id is None:
+            name, method = "Aggregated", None
+        elif entry_id in self._entries:
+            name, method = self._entries[entry_id]
+        else:
+            self.unknown_ids.add(entry_id)
+            return None
+        entry = StatsEntry(None, name, method)
+        entry.num_requests = num_requests
+        entry.num_none_requests = num_none_requests
+        entry.num_failures = num_failures
+        entry.total_response_time = total_response_time
+        entry.max_response_time = max_response_time
+        entry.min_response_time = min_response_time
+        entry.total_content_length = total_content_length
+        entry.start_time = start_time
+        entry.last_request_timestamp = last_request_timestamp
+        if response_times is not None:
+            entry.response_times = decode_histogram(response_times)
+        # the decoded entries are only used to extend other entries, so the per second counts
+        # can be kept in plain dicts
+        if num_reqs_per_sec is not None:
+            entry._num_reqs_per_sec = decode_time_series(num_reqs_per_sec)
+        if num_fail_per_sec is not None:
+            entry._num_fail_per_sec = decode_time_series(num_fail_per_sec)
+        if status_codes is not None:
+            entry._status_codes = decode_status_codes(status_codes)
+        if connections is not None:
+            (
+                entry.num_new_connections,
+                entry.num_reused_connections,
+                entry._phase_times,
+            ) = decode_connections(connections)
+        return entry
+
+    def decode(self, data):
+        """
+        Replace the "stats_report" item of a report data dict with "stats" (a list of
+        StatsEntry instances), "stats_total" (a StatsEntry) and "errors" items. The entries and
+        errors with an ID that isn't known (since the report that defined it was lost) are left
+        out, and the IDs are added to :attr:`unknown_ids`.
+        """
+        version, compressed, payload = data.pop("stats_report")
+        if version != STATS_REPORT_VERSION:
+            raise ValueError(
+                "Got a stats report with version %r, expected %r"
+                % (version, STATS_REPORT_VERSION)
+            )
+        if compressed:
+            payload = zlib.decompress(payload)
+        definitions, entries, total, errors = msgpack.loads(payload, raw=False)
+        for i in range(0, len(definitions), 3):
+            self._entries[definitions[i]] = (definitions[i + 1], definitions[i + 2])
+        self.unknown_ids = set()
+        data["stats"] = [
+            entry for entry in map(self._decode_entry, entries) if entry is not None
+        ]
+        data["stats_total"] = self._decode_entry(total)
+        data["errors"] = {}
+        for i in range(0, len(errors), 5):
+            if errors[i + 1] not in self._entries:
+                self.unknown_ids.add(errors[i + 1])
+                continue
+            name, method = self._entries[errors[i + 1]]
+            data["errors"][errors[i].hex()] = {
+                "method": method,
+                "name": name,
+                "error": errors[i + 2],
+                "occurrences": errors[i + 3],
+                "error_margin": errors[i + 4],
+            }
+        return data
@@ -5,15 +5,22 @@ import socket
 import sys
 import traceback
 import warnings
+from itertools import islice
 from uuid import uuid4
-from time import time
+from time import monotonic, time
 
 import gevent
 import psutil
 from gevent.pool import Group
 
+from .arrival_rate import ArrivalRateScheduler, ArrivalRateStats
 from .log import greenlet_exception_logger
 from .rpc import Message, rpc
+from .rpc.stats_format import (
+    STATS_REPORT_VERSION,
+    StatsReportDecoder,
+    StatsReportEncoder,
+)
 from .stats import RequestStats, setup_distributed_stats_event_listeners
 
 from .exception import RPCError
@@ -35,11 +42,91 @@ CPU_MONITOR_INTERVAL = 5.0
 HEARTBEAT_INTERVAL = 1
 HEARTBEAT_LIVENESS = 3
 FALLBACK_INTERVAL = 5
+# min number of seconds between the batches of users that are started when hatching, at high
+# hatch rates all the users that are due are started in each batch
+HATCH_BATCH_INTERVAL = 0.01
+# number of users that are killed at once when stopping users, before waiting for them to die
+USER_STOP_BATCH_SIZE = 1000
+# number of seconds that the master waits before redistributing the users when workers join or
+# go missing during a test, so that workers joining at the same time cause a single rebalancing
+REBALANCE_INTERVAL = 1
 
 
 greenlet_exception_handler = greenlet_exception_logger(logger)
 
 
+def distribute_users(user_classes, user_count):
+    """
+    Apportion *user_count* users over *user_classes* according to their weights, using the
+    largest remainder method, and return a {user_class: count} dict (in the order of
+    user_classes). Each class gets the whole part of its share, and the users that are left are
+    given to the classes with the largest remainders, with ties going to the class that comes
+    first. Only integer arithmetic is used (for integer weights), so every node comes up with
+    the same counts.
+    """
+    weight_sum = sum(user_class.weight for user_class in user_classes)
+    if not weight_sum:
+        return {}
+    counts = {}
+    remainders = []
+    for index, user_class in enumerate(user_classes):
+        counts[user_class], remainder = divmod(
+            user_count * user_class.weight, weight_sum
+        )
+        remainders.append((-remainder, index, user_class))
+    left = user_count - sum(counts.values())
+    for _, _, user_class in sorted(remainders)[:left]:
+        counts[user_class] += 1
+    return {user_class: int(count) for user_class, count in counts.items()}
+
+
+def user_count_delta(current, target):
+    """
+    Return the {user_class: count} changes needed to get from the *current* to the *target*
+    per class user counts, where a positive count is the number of users to start, and a
+    negative count the number of users to stop. Classes that don't change are left out.
+    """
+    delta = {}
+    for user_class in list(target) + [c for c in current if c not in target]:
+        change = target.get(user_class, 0) - current.get(user_class, 0)
+        if change:
+            delta[user_class] = change
+    return delta
+
+
+def split_user_counts(user_counts, num_parts):
+    """
+    Split the {user_class: count} dict *user_counts* into *num_parts* dicts, whose totals differ
+    by at most one user (the first parts get the extra users), and where the users of each
+    class are spread as evenly as possible. This is the same as dealing out the users, one
+    class after the other, in turns, but it takes O(classes * parts) time.
+    """
+
+    def dealt(position, i):
+        # the number of positions before *position* that are dealt to part i
+        return (position - i + num_parts - 1) // num_parts
+
+    parts = [{} for _ in range(num_parts)]
+    start = 0
+    for user_class, count in user_counts.items():
+        for i, part in enumerate(parts):
+            part[user_class] = dealt(start + count, i) - dealt(start, i)
+        start += count
+    return parts
+
+
+def weighted_order(counts):
+    """
+    Return the keys of a {user_class: count} dict in random order, as many times as their
+    counts. This is a random permutation of all the picks, which is the same as picking each
+    key with a probability proportional to its remaining count, but the order is precomputed
+    in O(total count) time, so that each pick takes O(1) time regardless of the number of keys.
+    """
+    order = [key for key, count in counts.items() for _ in range(max(count, 0))]
+    random.shuffle(order)
+    return order
+
+
 class Runner(object):
     """
     Orchestrates the load test by starting and stopping the users.
@@ -54,6 +141,15 @@ class Runner(object):
     def __init__(self, environment):
         self.environment = environment
         self.user_greenlets = Group()
+        # {user_class: {user: None}} index of the running users (dicts are used as ordered sets),
+        # so that users of a class can be picked without going through all the users
+        self.users_by_class = {}
+        # {user_class: ArrivalRateScheduler} of the user classes with an arrival_rate, and
+        # {user class name: ArrivalRateStats} of their task starts
+        self.arrival_rate_schedulers = {}
+        self.arrival_rate_stats = {}
+        # the part of the arrival rates that this node runs
+        self.arrival_rate_share = 1.0
         self.greenlet = Group()
         self.state = STATE_INIT
         self.hatching_greenlet = None
@@ -66,14 +162,45 @@ class Runner(object):
 
         # set up event listeners for recording requests
         def on_request_success(
-            request_type, name, response_time, response_length, **kwargs
+            request_type,
+            name,
+            response_time,
+            response_length,
+            status=None,
+            connection_timings=None,
+            **kwargs,
         ):
-            self.stats.log_request(request_type, name, response_time, response_length)
+            self.stats.log_request(
+                request_type,
+                name,
+                response_time,
+                response_length,
+                status,
+                connection_timings,
+            )
 
         def on_request_failure(
-            request_type, name, response_time, response_length, exception, **kwargs
+            request_type,
+            name,
+            response_time,
+            response_length,
+            exception,
+            status=None,
+            connection_timings=None,
+            **kwargs,
         ):
-            self.stats.log_request(request_type, name, response_time, response_length)
+            if status is None and isinstance(exception, Exception):
+                # failures reported by clients that don't report a status are counted per
+                # exception class
+                status = type(exception).__name__
+            self.stats.log_request(
+                request_type,
+                name,
+                response_time,
+                response_length,
+                status,
+                connection_timings,
+            )
             self.stats.log_error(request_type, name, exception)
 
         self.environment.events.request_success.add_listener(on_request_success)
@@ -122,47 +249,94 @@ class Runner(object):
             return True
         return False
 
+    @property
+    def user_classes_count(self):
+        """
+        :returns: Number of currently running users of each user class, as a {user_class: count} dict
+        """
+        return {
+            user_class: len(users)
+            for user_class, users in self.users_by_class.items()
+            if users
+        }
+
+    @property
+    def arrival_rate_user_classes(self):
+        """
+        :returns: The user classes with an arrival_rate, whose tasks are started at a rate instead of by hatched users
+        """
+        return [c for c in self.user_classes if c.arrival_rate is not None]
+
+    def distribute_users(self, user_count):
+        """
+        Distributes user_count users over the user classes (without an arrival_rate) according
+        to their weights, and returns a {user_class: count} dict (see :func:`distribute_users`)
+        """
+        return distribute_users(
+            [c for c in self.user_classes if c.arrival_rate is None], user_count
+        )
+
+    def start_arrival_rate_schedulers(self):
+        """
+        Start scheduling the tasks of the user classes with an arrival_rate, or update the part
+        of the rate that the running schedulers run
+        """
+        for user_class in self.arrival_rate_user_classes:
+            scheduler = self.arrival_rate_schedulers.get(user_class)
+            if scheduler is not None:
+                scheduler.share = self.arrival_rate_share
+                continue
+            if self.environment.host is not None:
+                user_class.host = self.environment.host
+            stats = self.arrival_rate_stats.get(user_class.__name__)
+            if stats is None:
+                stats = self.arrival_rate_stats[
+                    user_class.__name__
+                ] = ArrivalRateStats()
+            scheduler = self.arrival_rate_schedulers[user_class] = ArrivalRateScheduler(
+                self.environment, user_class, stats, self.arrival_rate_share
+            )
+            logger.info(
+                "Starting %s tasks at their arrival rate (%s of it)"
+                % (user_class.__name__, "{:.0%}".format(self.arrival_rate_share))
+            )
+            scheduler.start()
+
+    def stop_arrival_rate_schedulers(self):
+        schedulers = list(self.arrival_rate_schedulers.values())
+        self.arrival_rate_schedulers = {}
+        gevent.joinall(
+            [
+                gevent.spawn(scheduler.stop, self.environment.stop_timeout)
+                for scheduler in schedulers
+            ]
+        )
+
     def weight_users(self, amount):
         """
         Distributes the amount of users for each WebLocust-class according to it's weight
         returns a list "bucket" with the weighted users
+
+        Use :meth:`distribute_users`, which returns the number of users of each class, instead.
         """
         bucket = []
-        weight_sum = sum([user.weight for user in self.user_classes])
-        residuals = {}
-        for user in self.user_classes:
-            if self.environment.host is not None:
-                user.host = self.environment.host
-
-            # create users depending on weight
-            percent = user.weight / float(weight_sum)
-            num_users = int(round(amount * percent))
-            bucket.extend([user for x in range(num_users)])
-            # used to keep track of the amount of rounding was done if we need
-            # to add/remove some instances from bucket
-            residuals[user] = amount * percent - round(amount * percent)
-        if len(bucket) < amount:
-            # We got too few User classes in the bucket, so we need to create a few extra users,
-            # and we do this by iterating over each of the User classes - starting with the one
-            # where the residual from the rounding was the largest - and creating one of each until
-            # we get the correct amount
-            for user in [
-                l
-                for l, r in sorted(residuals.items(), key=lambda x: x[1], reverse=True)
-            ][: amount - len(bucket)]:
-                bucket.append(user)
-        elif len(bucket) > amount:
-            # We've got too many users due to rounding errors so we need to remove some
-            for user in [l for l, r in sorted(residuals.items(), key=lambda x: x[1])][
-                : len(bucket) - amount
-            ]:
-                bucket.remove(user)
-
+        for user_class, count in self.distribute_users(amount).items():
+            bucket.extend([user_class] * count)
         return bucket
 
     def spawn_users(self, spawn_count, hatch_rate, wait=False):
-        bucket = self.weight_users(spawn_count)
-        spawn_count = len(bucket)
+        """
+        Start spawn_count users, which is either a number of users that's distributed over the
+        user classes by weight, or a {user_class: count} dict
+        """
+        if isinstance(spawn_count, dict):
+            user_counts = {c: n for c, n in spawn_count.items() if n > 0}
+        else:
+            user_counts = self.distribute_users(spawn_count)
+        spawn_count = sum(user_counts.values())
+        if self.environment.host is not None:
+            for user_class in user_counts:
+                user_class.host = self.environment.host
         if self.state == STATE_INIT or self.state == STATE_STOPPED:
             self.state = STATE_HATCHING
 
@@ -171,78 +345,111 @@ class Runner(object):
             "Hatching and swarming %i users at the rate %g users/s (%i users already running)..."
             % (spawn_count, hatch_rate, existing_count)
         )
-        occurrence_count = dict([(l.__name__, 0) for l in self.user_classes])
+        occurrence_count = dict([(l.__name__, 0) for l in user_counts])
 
         def hatch():
-            sleep_time = 1.0 / hatch_rate
-            while True:
-                if not bucket:
-                    logger.info(
-                        "All users hatched: %s (%i already running)"
-                        % (
-                            ", ".join(
-                                [
-                                    "%s: %d" % (name, count)
-                                    for name, count in occurrence_count.items()
-                                ]
-                            ),
-                            existing_count,
+            spawn_order = iter(weighted_order(user_counts))
+            start_time = monotonic()
+            hatched = 0
+            while hatched < spawn_count:
+                # start all the users that are due at the hatch rate, so that the rate doesn't
+                # depend on how precisely we can sleep between them
+                due = min(spawn_count, int((monotonic() - start_time) * hatch_rate) + 1)
+                for user_class in islice(spawn_order, due - hatched):
+                    occurrence_count[user_class.__name__] += 1
+                    self.start_user(user_class)
+                hatched = due
+                logger.debug("%i users hatched" % len(self.user_greenlets))
+                if hatched < spawn_count:
+                    gevent.sleep(
+                        max(
+                            start_time + hatched / hatch_rate - monotonic(),
+                            HATCH_BATCH_INTERVAL,
                         )
                     )
-                    self.environment.events.hatch_complete.fire(
-                        user_count=len(self.user_greenlets)
-                    )
-                    return
 
-                user_class = bucket.pop(random.randint(0, len(bucket) - 1))
-                occurrence_count[user_class.__name__] += 1
-                new_user = user_class(self.environment)
-                new_user.start(self.user_greenlets)
-                if len(self.user_greenlets) % 10 == 0:
-                    logger.debug("%i users hatched" % len(self.user_greenlets))
-                if bucket:
-                    gevent.sleep(sleep_time)
+            logger.info(
+                "All users hatched: %s (%i already running)"
+                % (
+                    ", ".join(
+                        [
+                            "%s: %d" % (name, count)
+                            for name, count in occurrence_count.items()
+                        ]
+                    ),
+                    existing_count,
+                )
+            )
+            self.environment.events.hatch_complete.fire(
+                user_count=len(self.user_greenlets)
+            )
 
         hatch()
         if wait:
             self.user_greenlets.join()
             logger.info("All users stopped\n")
 
+    def start_user(self, user_class):
+        """
+        Create a user of *user_class*, and start its greenlet in self.user_greenlets
+        """
+        user = user_class(self.environment)
+        user_greenlet = user.start(self.user_greenlets)
+        users = self.users_by_class.get(user_class)
+        if users is None:
+            users = self.users_by_class[user_class] = {}
+        users[user] = None
+        # gevent clears the greenlet's args when it has finished, so the user is bound here
+        user_greenlet.rawlink(lambda _: users.pop(user, None))
+        return user
+
     def stop_users(self, user_count):
         """
-        Stop a stop_count of weighted users from the Group() object in self.users
-        """
-        bucket = self.weight_users(user_count)
-        user_count = len(bucket)
-        logger.info("Stopping %i users" % user_count)
-        to_stop = []
-        for g in self.user_greenlets:
-            for l in bucket:
-                user = g.args[0]
-                if l == type(user):
-                    to_stop.append(user)
-                    bucket.remove(l)
-                    break
+        Stop user_count users, which is either a number of users that's distributed over the
+        user classes by weight, or a {user_class: count} dict. The users of each class are
+        picked from the index of running users.
+        """
+        if isinstance(user_count, dict):
+            user_counts = user_count
+        else:
+            user_counts = self.distribute_users(user_count)
+        to_stop = self._oldest_users(user_counts)
+        logger.info("Stopping %i users" % len(to_stop))
         self.stop_user_instances(to_stop)
         self.environment.events.hatch_complete.fire(user_count=self.user_count)
 
+    def _oldest_users(self, user_counts):
+        users = []
+        for user_class, count in user_counts.items():
+            users.extend(islice(self.users_by_class.get(user_class, ()), count))
+        return users
+
     def stop_user_instances(self, users):
-        if self.environment.stop_timeout:
-            stopping = Group()
-            for user in users:
-                if not user.stop(self.user_greenlets, force=False):
+        """
+        Stop the given users. The users that can be stopped right away (all of them if there's no
+        stop_timeout) are killed in batches of USER_STOP_BATCH_SIZE users, and the others are
+        waited for at the same time, for at most stop_timeout seconds.
+        """
+        force = not self.environment.stop_timeout
+        stopping = Group()
+        for start in range(0, len(users), USER_STOP_BATCH_SIZE):
+            killed = []
+            for user in users[start : start + USER_STOP_BATCH_SIZE]:
+                if user.stop(self.user_greenlets, force=force, block=False):
+                    killed.append(user._greenlet)
+                else:
                     # User.stop() returns False if the greenlet was not stopped, so we'll need
                     # to add it's greenlet to our stopping Group so we can wait for it to finish it's task
                     stopping.add(user._greenlet)
+            # the greenlet that's stopping the users may be one of the killed users
+            gevent.joinall([g for g in killed if g is not gevent.getcurrent()])
+        if len(stopping):
             if not stopping.join(timeout=self.environment.stop_timeout):
                 logger.info(
                     "Not all users finished their tasks & terminated in %s seconds. Stopping them..."
                     % self.environment.stop_timeout
                 )
             stopping.kill(block=True)
-        else:
-            for user in users:
-                user.stop(self.user_greenlets, force=True)
 
     def monitor_cpu(self):
         process = psutil.Process()
@@ -255,7 +462,7 @@ class Runner(object):
                 self.cpu_warning_emitted = True
             gevent.sleep(CPU_MONITOR_INTERVAL)
 
-    def start(self, user_count, hatch_rate, wait=False):
+    def start(self, user_count, hatch_rate, wait=False, user_classes_count=None):
         """
         Start running a load test
         
@@ -264,30 +471,40 @@ class Runner(object):
         :param wait: If True calls to this method will block until all users are spawned.
                      If False (the default), a greenlet that spawns the users will be 
                      started and the call to this method will return immediately.
+        :param user_classes_count: Number of users of each user class, as a {user_class: count}
+                                   dict. By default the users are distributed over the user
+                                   classes by weight.
         """
+        if user_classes_count is None:
+            user_classes_count = self.distribute_users(user_count)
         if self.state != STATE_RUNNING and self.state != STATE_HATCHING:
             self.stats.clear_all()
             self.exceptions = {}
+            self.arrival_rate_stats = {}
             self.cpu_warning_emitted = False
             self.worker_cpu_warning_emitted = False
             self.target_user_count = user_count
+        self.start_arrival_rate_schedulers()
 
         # Dynamically changing the user count
         if self.state != STATE_INIT and self.state != STATE_STOPPED:
             self.state = STATE_HATCHING
-            if self.user_count > user_count:
-                # Stop some users
-                stop_count = self.user_count - user_count
-                self.stop_users(stop_count)
-            elif self.user_count < user_count:
-                # Spawn some users
-                spawn_count = user_count - self.user_count
-                self.spawn_users(spawn_count=spawn_count, hatch_rate=hatch_rate)
+            # only the users that make up the difference to the current users of each class are
+            # stopped and started, which also corrects the class mix if it has drifted
+            delta = user_count_delta(self.user_classes_count, user_classes_count)
+            to_stop = {c: -n for c, n in delta.items() if n < 0}
+            to_start = {c: n for c, n in delta.items() if n > 0}
+            if to_start:
+                if to_stop:
+                    self.stop_user_instances(self._oldest_users(to_stop))
+                self.spawn_users(spawn_count=to_start, hatch_rate=hatch_rate)
+            elif to_stop:
+                self.stop_users(to_stop)
             else:
                 self.environment.events.hatch_complete.fire(user_count=self.user_count)
         else:
             self.hatch_rate = hatch_rate
-            self.spawn_users(user_count, hatch_rate=hatch_rate, wait=wait)
+            self.spawn_users(user_classes_count, hatch_rate=hatch_rate, wait=wait)
 
     def start_stepload(self, user_count, hatch_rate, step_user_count, step_duration):
         if user_count < step_user_count:
@@ -338,7 +555,10 @@ class Runner(object):
         # if we are currently hatching users we need to kill the hatching greenlet first
         if self.hatching_greenlet and not self.hatching_greenlet.ready():
             self.hatching_greenlet.kill(block=True)
-        self.stop_user_instances([g.args[0] for g in self.user_greenlets])
+        self.stop_user_instances(
+            [user for users in self.users_by_class.values() for user in users]
+        )
+        self.stop_arrival_rate_schedulers()
         self.state = STATE_STOPPED
         self.cpu_log_warning()
 
@@ -377,12 +597,8 @@ class LocalRunner(Runner):
 
         self.environment.events.user_error.add_listener(on_user_error)
 
-    def start(self, user_count, hatch_rate, wait=False):
+    def start(self, user_count, hatch_rate, wait=False, user_classes_count=None):
         self.target_user_count = user_count
-        if hatch_rate > 100:
-            logger.warning(
-                "Your selected hatch rate is very high (>100), and this is known to sometimes cause issues. Do you really need to ramp up that fast?"
-            )
 
         if self.state != STATE_RUNNING and self.state != STATE_HATCHING:
             # if we're not already running we'll fire the test_start event
@@ -392,7 +608,12 @@ class LocalRunner(Runner):
             # kill existing hatching_greenlet before we start a new one
             self.hatching_greenlet.kill(block=True)
         self.hatching_greenlet = self.greenlet.spawn(
-            lambda: super(LocalRunner, self).start(user_count, hatch_rate, wait=wait)
+            lambda: super(LocalRunner, self).start(
+                user_count,
+                hatch_rate,
+                wait=wait,
+                user_classes_count=user_classes_count,
+            )
         )
         self.hatching_greenlet.link_exception(greenlet_exception_handler)
 
@@ -417,6 +638,10 @@ class WorkerNode(object):
         self.heartbeat = heartbeat_liveness
         self.cpu_usage = 0
         self.cpu_warning_emitted = False
+        # set if the worker sends its stats reports in the compact stats report format
+        self.stats_report_decoder = None
+        # the (num_users, user_classes_count) of the last hatch job that was sent to the worker
+        self.hatch_job = None
 
 
 class MasterRunner(DistributedRunner):
@@ -437,6 +662,7 @@ class MasterRunner(DistributedRunner):
         """
         super().__init__(environment)
         self.worker_cpu_warning_emitted = False
+        self.rebalancing_greenlet = None
         self.master_bind_host = master_bind_host
         self.master_bind_port = master_bind_port
 
@@ -490,6 +716,12 @@ class MasterRunner(DistributedRunner):
 
         # listener that gathers info on how many users the worker has spawned
         def on_worker_report(client_id, data):
+            for name, stats_data in data.get("arrival_rate_stats", {}).items():
+                stats = self.arrival_rate_stats.get(name)
+                if stats is None:
+                    stats = self.arrival_rate_stats[name] = ArrivalRateStats()
+                stats.extend(ArrivalRateStats.unserialize(stats_data))
+
             if client_id not in self.clients:
                 logger.info("Discarded report from unrecognized worker %s", client_id)
                 return
@@ -519,11 +751,14 @@ class MasterRunner(DistributedRunner):
 
     def start(self, user_count, hatch_rate):
         self.target_user_count = user_count
-        num_workers = (
-            len(self.clients.ready)
-            + len(self.clients.running)
-            + len(self.clients.hatching)
-        )
+        # the workers are kept in the order they connected in, so that the users of each worker
+        # only change when the number of workers does
+        workers = [
+            c
+            for c in self.clients.values()
+            if c.state in (STATE_INIT, STATE_HATCHING, STATE_RUNNING)
+        ]
+        num_workers = len(workers)
         if not num_workers:
             logger.warning(
                 "You are running in distributed mode but have no worker servers connected. "
@@ -535,42 +770,91 @@ class MasterRunner(DistributedRunner):
         worker_num_users = user_count // (num_workers or 1)
         worker_hatch_rate = float(hatch_rate) / (num_workers or 1)
         remaining = user_count % num_workers
+        # the users of each class are split over the workers, so that the total class mix is
+        # exactly what it would be in a single process (if the master has the user classes)
+        workers_user_classes_count = split_user_counts(
+            self.distribute_users(user_count), num_workers
+        )
 
         logger.info(
             "Sending hatch jobs of %d users and %.2f hatch rate to %d ready clients"
             % (worker_num_users, worker_hatch_rate, num_workers)
         )
 
-        if worker_hatch_rate > 100:
-            logger.warning(
-                "Your selected hatch rate is very high (>100/worker), and this is known to sometimes cause issues. Do you really need to ramp up that fast?"
-            )
-
         if self.state != STATE_RUNNING and self.state != STATE_HATCHING:
             self.stats.clear_all()
             self.exceptions = {}
+            self.arrival_rate_stats = {}
             self.environment.events.test_start.fire(environment=self.environment)
 
-        for client in self.clients.ready + self.clients.running + self.clients.hatching:
+        num_sent = 0
+        for client, user_classes_count in zip(workers, workers_user_classes_count):
             data = {
                 "hatch_rate": worker_hatch_rate,
                 "num_users": worker_num_users,
                 "host": self.environment.host,
                 "stop_timeout": self.environment.stop_timeout,
+                # the arrival rates of the user classes are split evenly over the workers
+                "arrival_rate_share": 1.0 / num_workers,
             }
+            if user_classes_count:
+                data["user_classes_count"] = {
+                    user_class.__name__: count
+                    for user_class, count in user_classes_count.items()
+                }
+            if client.stats_report_decoder is not None:
+                data["stats_report_version"] = STATS_REPORT_VERSION
 
             if remaining > 0:
                 data["num_users"] += 1
                 remaining -= 1
 
+            # only the workers whose users or hatch rate change get a new hatch job
+            hatch_job = (
+                data["num_users"],
+                data["hatch_rate"],
+                data.get("user_classes_count"),
+                data["arrival_rate_share"],
+            )
+            if hatch_job == client.hatch_job:
+                continue
+            client.hatch_job = hatch_job
             self.server.send_to_client(Message("hatch", data, client.id))
+            num_sent += 1
+
+        logger.debug(
+            "Sent hatch jobs to %d clients, the users of %d clients didn't change"
+            % (num_sent, num_workers - num_sent)
+        )
+        if num_sent:
+            self.state = STATE_HATCHING
 
-        self.state = STATE_HATCHING
+    def rebalance(self):
+        """
+        Redistribute the users over the connected workers after REBALANCE_INTERVAL seconds (if
+        a test is running), so that all the workers that join or go missing in the meantime
+        are handled at once. Only the workers whose number of users changes get a hatch job.
+        """
+        if self.rebalancing_greenlet is not None:
+            return
+
+        def rebalance():
+            gevent.sleep(REBALANCE_INTERVAL)
+            self.rebalancing_greenlet = None
+            if (
+                self.state == STATE_RUNNING or self.state == STATE_HATCHING
+            ) and self.worker_count:
+                logger.info("Rebalancing the users over %i workers" % self.worker_count)
+                self.start(self.target_user_count, self.hatch_rate)
+
+        self.rebalancing_greenlet = self.greenlet.spawn(rebalance)
+        self.rebalancing_greenlet.link_exception(greenlet_exception_handler)
 
     def stop(self):
         if self.state not in [STATE_INIT, STATE_STOPPED, STATE_STOPPING]:
             self.state = STATE_STOPPING
             for client in self.clients.all:
+                client.hatch_job = None
                 self.server.send_to_client(Message("stop", None, client.id))
             self.environment.events.test_stop.fire(environment=self.environment)
 
@@ -608,10 +892,13 @@ class MasterRunner(DistributedRunner):
                     )
                     client.state = STATE_MISSING
                     client.user_count = 0
-                    if self.worker_count - len(self.clients.missing) <= 0:
+                    if self.worker_count <= 0:
                         logger.info("The last worker went missing, stopping test.")
                         self.stop()
                         self.check_stopped()
+                    else:
+                        # the users of the missing worker are started on the other workers
+                        self.rebalance()
                 else:
                     client.heartbeat -= 1
 
@@ -640,6 +927,11 @@ class MasterRunner(DistributedRunner):
             if msg.type == "client_ready":
                 id = msg.node_id
                 self.clients[id] = WorkerNode(id, heartbeat_liveness=HEARTBEAT_LIVENESS)
+                if (
+                    msg.data
+                    and msg.data.get("stats_report_version") == STATS_REPORT_VERSION
+                ):
+                    self.clients[id].stats_report_decoder = StatsReportDecoder()
                 logger.info(
                     "Client %r reported as ready. Currently %i clients ready to swarm."
                     % (
@@ -653,7 +945,7 @@ class MasterRunner(DistributedRunner):
                 )
                 if self.state == STATE_RUNNING or self.state == STATE_HATCHING:
                     # balance the load distribution when new client joins
-                    self.start(self.target_user_count, self.hatch_rate)
+                    self.rebalance()
                 ## emit a warning if the worker's clock seem to be out of sync with our clock
                 # if abs(time() - msg.data["time"]) > 5.0:
                 #    warnings.warn("The worker node's clock seem to be out of sync. For the statistics to be correct the different locust servers need to have synchronized clocks.")
@@ -664,6 +956,12 @@ class MasterRunner(DistributedRunner):
                 if msg.node_id in self.clients:
                     c = self.clients[msg.node_id]
                     c.heartbeat = HEARTBEAT_LIVENESS
+                    if c.state == STATE_MISSING and msg.data["state"] != STATE_MISSING:
+                        logger.info("Worker %s is back from missing" % msg.node_id)
+                        # its users may have been started on the other workers, so it gets a
+                        # new hatch job
+                        c.hatch_job = None
+                        self.rebalance()
                     c.state = msg.data["state"]
                     c.cpu_usage = msg.data["current_cpu_usage"]
                     if not c.cpu_warning_emitted and c.cpu_usage > 90:
@@ -678,6 +976,32 @@ class MasterRunner(DistributedRunner):
                             % (msg.node_id)
                         )
             elif msg.type == "stats":
+                if "stats_report" in msg.data:
+                    client = self.clients.get(msg.node_id)
+                    if client is None or client.stats_report_decoder is None:
+                        logger.info(
+                            "Discarded stats report from unrecognized worker %s",
+                            msg.node_id,
+                        )
+                        continue
+                    decoder = client.stats_report_decoder
+                    try:
+                        decoder.decode(msg.data)
+                    except (KeyError, ValueError) as e:
+                        logger.warning(
+                            "Discarded stats report from worker %s that couldn't be decoded: %r"
+                            % (msg.node_id, e)
+                        )
+                        continue
+                    if decoder.unknown_ids:
+                        # a report that defined these IDs was lost
+                        logger.warning(
+                            "Discarded the stats of %i unknown entry IDs from worker %s, asking it to resend the entry definitions"
+                            % (len(decoder.unknown_ids), msg.node_id)
+                        )
+                        self.server.send_to_client(
+                            Message("resend_stats_definitions", None, msg.node_id)
+                        )
                 self.environment.events.worker_report.fire(
                     client_id=msg.node_id, data=msg.data
                 )
@@ -696,7 +1020,7 @@ class MasterRunner(DistributedRunner):
                         "Client %r quit. Currently %i clients connected."
                         % (msg.node_id, len(self.clients.ready))
                     )
-                    if self.worker_count - len(self.clients.missing) <= 0:
+                    if self.worker_count <= 0:
                         logger.info("The last worker quit, stopping test.")
                         self.stop()
                         if (
@@ -704,6 +1028,8 @@ class MasterRunner(DistributedRunner):
                             and self.environment.parsed_options.headless
                         ):
                             self.quit()
+                    elif self.state == STATE_RUNNING or self.state == STATE_HATCHING:
+                        self.rebalance()
             elif msg.type == "exception":
                 self.log_exception(msg.node_id, msg.data["msg"], msg.data["traceback"])
 
@@ -740,7 +1066,8 @@ class WorkerRunner(DistributedRunner):
         self.client = rpc.Client(master_host, master_port, self.client_id)
         self.greenlet.spawn(self.heartbeat).link_exception(greenlet_exception_handler)
         self.greenlet.spawn(self.worker).link_exception(greenlet_exception_handler)
-        self.client.send(Message("client_ready", None, self.client_id))
+        self.stats_report_encoder = None
+        self._send_client_ready()
         self.worker_state = STATE_INIT
         self.greenlet.spawn(self.stats_reporter).link_exception(
             greenlet_exception_handler
@@ -758,6 +1085,13 @@ class WorkerRunner(DistributedRunner):
         # register listener that adds the current number of spawned users to the report that is sent to the master node
         def on_report_to_master(client_id, data):
             data["user_count"] = self.user_count
+            if self.arrival_rate_stats:
+                data["arrival_rate_stats"] = {
+                    name: stats.serialize()
+                    for name, stats in self.arrival_rate_stats.items()
+                }
+                for stats in self.arrival_rate_stats.values():
+                    stats.reset()
 
         self.environment.events.report_to_master.add_listener(on_report_to_master)
 
@@ -780,6 +1114,39 @@ class WorkerRunner(DistributedRunner):
 
         self.environment.events.user_error.add_listener(on_user_error)
 
+    def _send_client_ready(self):
+        # the master forgets the entry IDs of the compact stats reports when it gets a
+        # client_ready message, so we'll start over with a new encoder once we're hatched
+        self.stats_report_encoder = None
+        self.client.send(
+            Message(
+                "client_ready",
+                {"stats_report_version": STATS_REPORT_VERSION},
+                self.client_id,
+            )
+        )
+
+    def _user_classes_count(self, user_classes_count):
+        """
+        Map the user class names of a hatch message's {name: count} dict to the user classes
+        """
+        if user_classes_count is None:
+            return None
+        user_classes = {
+            user_class.__name__: user_class for user_class in self.user_classes
+        }
+        unknown = set(user_classes_count) - set(user_classes)
+        if unknown:
+            logger.warning(
+                "Got hatch job with user classes that this worker doesn't have: %s"
+                % ", ".join(sorted(unknown))
+            )
+        return {
+            user_classes[name]: count
+            for name, count in user_classes_count.items()
+            if name in user_classes
+        }
+
     def heartbeat(self):
         while True:
             try:
@@ -824,20 +1191,33 @@ class WorkerRunner(DistributedRunner):
                 self.target_user_count = job["num_users"]
                 self.environment.host = job["host"]
                 self.environment.stop_timeout = job["stop_timeout"]
+                self.arrival_rate_share = job.get("arrival_rate_share", 1.0)
+                if (
+                    job.get("stats_report_version") == STATS_REPORT_VERSION
+                    and self.stats_report_encoder is None
+                ):
+                    self.stats_report_encoder = StatsReportEncoder()
                 if self.hatching_greenlet:
                     # kill existing hatching greenlet before we launch new one
                     self.hatching_greenlet.kill(block=True)
                 self.hatching_greenlet = self.greenlet.spawn(
                     lambda: self.start(
-                        user_count=job["num_users"], hatch_rate=job["hatch_rate"]
+                        user_count=job["num_users"],
+                        hatch_rate=job["hatch_rate"],
+                        user_classes_count=self._user_classes_count(
+                            job.get("user_classes_count")
+                        ),
                     )
                 )
                 self.hatching_greenlet.link_exception(greenlet_exception_handler)
             elif msg.type == "stop":
                 self.stop()
                 self.client.send(Message("client_stopped", None, self.client_id))
-                self.client.send(Message("client_ready", None, self.client_id))
+                self._send_client_ready()
                 self.worker_state = STATE_INIT
+            elif msg.type == "resend_stats_definitions":
+                if self.stats_report_encoder is not None:
+                    self.stats_report_encoder.resend_definitions()
             elif msg.type == "quit":
                 logger.info("Got quit message from master, shutting down...")
                 self.stop()
@@ -860,4 +1240,15 @@ class WorkerRunner(DistributedRunner):
         self.environment.events.report_to_master.fire(
             client_id=self.client_id, data=data
         )
-        self.client.send(Message("stats", data, self.client_id))
+        encoder = self.stats_report_encoder
+        if encoder is None:
+            self.client.send(Message("stats", data, self.client_id))
+            return
+        encoder.encode(data)
+        try:
+            self.client.send(Message("stats", data, self.client_id))
+        except RPCError:
+            # the master never got the entry IDs that were defined in the report
+            encoder.rollback()
+            raise
+        encoder.commit()
@@ -0,0 +1,370 @@
+"""
+Recording of the raw request samples, for analysis after a test run.
+
+The request stats only keep histograms of the (rounded) response times, so exact response
+times and per request timelines are lost. A :class:`SampleRecorder` listens to the
+request_success and request_failure events and appends a fixed width binary record for every
+request to memory mapped segment files, which can be loaded as NumPy arrays with
+:func:`read_segment` and :func:`read_samples` once the test has finished.
+
+Each node writes its own segment files to the recording directory, named
+``<node_id>-<segment number>.samples``, along with a ``<node_id>.names`` file with the
+names of the stats entries, errors and statuses that the records refer to by ID. The names file
+has a JSON list per line, ``["entry", method, name]``, ``["error", error]`` or
+``["status", status]``, in the order that the IDs were assigned.
+
+NumPy is only needed for reading the samples.
+"""
+import glob
+import json
+import mmap
+import os
+import struct
+import time
+
+from .stats import StatsError
+from .util.dependencies import import_numpy
+
+"""Number of records that each segment file has room for (32 bytes per record)"""
+SAMPLE_SEGMENT_RECORDS = 1 << 20
+
+SEGMENT_MAGIC = b"LCSM"
+SEGMENT_VERSION = 1
+
+# segment header: magic, version, record size, capacity (in records)
+SEGMENT_HEADER = struct.Struct("<4sHHQ16x")
+
+# record: timestamp (microseconds since the epoch), entry ID, response time (microseconds),
+# content length, error ID (0 for successful requests), status ID (0 for requests without a status)
+SAMPLE_RECORD = struct.Struct("<qIIQII")
+
+"""Response time that's recorded for requests with a None response time"""
+NO_RESPONSE_TIME = 0xFFFFFFFF
+
+MAX_RESPONSE_TIME = NO_RESPONSE_TIME - 1
+
+
+class SampleRecorder(object):
+    """
+    Appends a record for every request to memory mapped segment files in *directory*.
+
+    Each segment file is created with room for *segment_records* records and mapped into
+    memory, so recording a request only packs its values into the mapping. When a segment is
+    full, the next one is created. If *max_segments* is set, the oldest segment is removed when
+    a new one is created, which turns the segments into a ring that keeps the latest requests.
+    """
+
+    def __init__(
+        self,
+        environment,
+        directory,
+        node_id="local",
+        segment_records=None,
+        max_segments=None,
+    ):
+        """
+        :param environment: The :class:`Environment <locust.env.Environment>` whose requests should be recorded
+        :param directory: Directory that the segment files are written to. Created if needed.
+        :param node_id: Name of this node, that's used as a prefix for the files
+        :param segment_records: Number of records per segment file (SAMPLE_SEGMENT_RECORDS by default)
+        :param max_segments: Max number of segment files to keep
+        """
+        self.directory = directory
+        self.node_id = node_id
+        self.segment_records = segment_records or SAMPLE_SEGMENT_RECORDS
+        self.max_segments = max_segments
+        self.num_records = 0
+        self._entry_ids = {}
+        self._error_ids = {}
+        self._status_ids = {}
+        self._segment_number = -1
+        self._segments = []
+        self._file = None
+        self._mmap = None
+        self._index = self.segment_records
+        os.makedirs(directory, exist_ok=True)
+        # new names are rare compared to requests, so they're written right away, which
+        # keeps the names file complete even if the process is killed
+        self._names_file = open(self.names_filename, "w", buffering=1)
+
+        environment.events.request_success.add_listener(self._on_request_success)
+        environment.events.request_failure.add_listener(self._on_request_failure)
+        environment.events.quitting.add_listener(self._on_quitting)
+        self._environment = environment
+
+    @property
+    def names_filename(self):
+        return os.path.join(self.directory, "%s.names" % self.node_id)
+
+    def _segment_filename(self, number):
+        return os.path.join(self.directory, "%s-%06d.samples" % (self.node_id, number))
+
+    def _on_request_success(
+        self, request_type, name, response_time, response_length, status=None, **kwargs
+    ):
+        self.record(request_type, name, response_time, response_length, status=status)
+
+    def _on_request_failure(
+        self,
+        request_type,
+        name,
+        response_time,
+        response_length,
+        exception,
+        status=None,
+        **kwargs
+    ):
+        if status is None and isinstance(exception, Exception):
+            # like in the stats, failures without a status are counted per exception class
+            status = type(exception).__name__
+        self.record(
+            request_type, name, response_time, response_length, exception, status
+        )
+
+    def _on_quitting(self, **kwargs):
+        self.close()
+
+    def record(
+        self, method, name, response_time, content_length, error=None, status=None
+    ):
+        """
+        Append a record for a request. *status* is the status that's counted in the
+        :attr:`status_codes <locust.stats.StatsEntry.status_codes>` of the stats entry, if any.
+        """
+        entry_id = self._entry_ids.get((name, method))
+        if entry_id is None:
+            entry_id = self._entry_ids[(name, method)] = len(self._entry_ids)
+            self._write_name(["entry", method, name])
+        if error is None:
+            error_id = 0
+        else:
+            error_id = self._error_id(error)
+        if status is None:
+            status_id = 0
+        else:
+            status_id = self._status_id(status)
+        if response_time is None:
+            response_time = NO_RESPONSE_TIME
+        else:
+            response_time = min(int(response_time * 1000 + 0.5), MAX_RESPONSE_TIME)
+        if self._index == self.segment_records:
+            self._next_segment()
+        SAMPLE_RECORD.pack_into(
+            self._mmap,
+            SEGMENT_HEADER.size + self._index * SAMPLE_RECORD.size,
+            int(time.time() * 1000000),
+            entry_id,
+            response_time,
+            content_length or 0,
+            error_id,
+            status_id,
+        )
+        self._index += 1
+        self.num_records += 1
+
+    def _error_id(self, error):
+        key = StatsError.parse_error(error)
+        error_id = self._error_ids.get(key)
+        if error_id is None:
+            error_id = self._error_ids[key] = len(self._error_ids) + 1
+            self._write_name(["error", key])
+        return error_id
+
+    def _status_id(self, status):
+        status_id = self._status_ids.get(status)
+        if status_id is None:
+            status_id = self._status_ids[status] = len(self._status_ids) + 1
+            self._write_name(["status", status])
+        return status_id
+
+    def _write_name(self, name):
+        self._names_file.write(json.dumps(name) + "\n")
+
+    def _close_segment(self):
+        if self._mmap is None:
+            return
+        self._mmap.flush()
+        self._mmap.close()
+        # cut off the part of the segment that hasn't been written to
+        self._file.truncate(SEGMENT_HEADER.size + self._index * SAMPLE_RECORD.size)
+        self._file.close()
+        self._mmap = None
+        self._file = None
+
+    def _next_segment(self):
+        self._close_segment()
+        self._segment_number += 1
+        filename = self._segment_filename(self._segment_number)
+        size = SEGMENT_HEADER.size + self.segment_records * SAMPLE_RECORD.size
+        self._file = open(filename, "w+b")
+        self._file.truncate(size)
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        SEGMENT_HEADER.pack_into(
+            self._mmap,
+            0,
+            SEGMENT_MAGIC,
+            SEGMENT_VERSION,
+            SAMPLE_RECORD.size,
+            self.segment_records,
+        )
+        self._index = 0
+        self._segments.append(filename)
+        if self.max_segments is not None and len(self._segments) > self.max_segments:
+            os.remove(self._segments.pop(0))
+
+    def flush(self):
+        """
+        Flush the records of the current segment to disk
+        """
+        if self._mmap is not None:
+            self._mmap.flush()
+
+    def close(self):
+        """
+        Stop recording, and write the remaining records to disk
+        """
+        if self._names_file.closed:
+            return
+        events = self._environment.events
+        events.request_success.remove_listener(self._on_request_success)
+        events.request_failure.remove_listener(self._on_request_failure)
+        events.quitting.remove_listener(self._on_quitting)
+        self._close_segment()
+        self._names_file.close()
+
+
+def sample_dtype():
+    """
+    Return the NumPy dtype of the records. The fields are *timestamp* (microseconds since the
+    epoch), *entry_id*, *response_time* (microseconds, NO_RESPONSE_TIME for requests without
+    one), *content_length*, *error_id* (0 for successful requests) and *status_id* (0 for
+    requests without a status).
+    """
+    numpy = import_numpy("reading recorded samples")
+    return numpy.dtype(
+        {
+            "names": [
+                "timestamp",
+                "entry_id",
+                "response_time",
+                "content_length",
+                "error_id",
+                "status_id",
+            ],
+            "formats": ["<i8", "<u4", "<u4", "<u8", "<u4", "<u4"],
+            "offsets": [0, 8, 12, 16, 24, 28],
+            "itemsize": SAMPLE_RECORD.size,
+        }
+    )
+
+
+def read_segment(filename):
+    """
+    Load the records of a segment file as a read-only NumPy structured array, that's backed
+    by a memory map of the file.
+    """
+    numpy = import_numpy("reading recorded samples")
+    with open(filename, "rb") as f:
+        header = f.read(SEGMENT_HEADER.size)
+    magic, version, record_size, capacity = SEGMENT_HEADER.unpack(header)
+    if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+        raise ValueError("%s is not a segment file of recorded samples" % filename)
+    count = min(
+        (os.path.getsize(filename) - SEGMENT_HEADER.size) // record_size, capacity
+    )
+    if not count:
+        return numpy.zeros(0, dtype=sample_dtype())
+    records = numpy.memmap(
+        filename,
+        dtype=sample_dtype(),
+        mode="r",
+        offset=SEGMENT_HEADER.size,
+        shape=(count,),
+    )
+    # a segment that wasn't closed (e.g. if the process was killed) still has its unwritten,
+    # zeroed out records at the end
+    unwritten = numpy.flatnonzero(records["timestamp"] == 0)
+    if len(unwritten):
+        records = records[: unwritten[0]]
+    return records
+
+
+def read_names(directory, node_id=None):
+    """
+    Read the names files of the nodes that recorded samples in *directory* (all nodes, or only
+    the node *node_id*), and unify the entry, error and status IDs of the nodes.
+
+    Returns an (entries, errors, statuses, nodes) tuple, where *entries* is a list of the
+    (method, name) pairs that the unified entry IDs refer to, *errors* and *statuses* are lists
+    of the errors and statuses that the unified error and status IDs refer to (ID 1 is the
+    first one in the list), and *nodes* is a list of (node_id, entry_map, error_map, status_map,
+    segment filenames) tuples, where the maps are lists of the unified ID for each of the
+    node's IDs.
+    """
+    entries = []
+    entry_ids = {}
+    errors = []
+    error_ids = {}
+    statuses = []
+    status_ids = {}
+    nodes = []
+    names_files = sorted(
+        glob.glob(os.path.join(directory, "%s.names" % (node_id or "*")))
+    )
+    for names_filename in names_files:
+        node = os.path.basename(names_filename)[: -len(".names")]
+        entry_map = []
+        error_map = [0]
+        status_map = [0]
+        with open(names_filename) as f:
+            for line in f:
+                name = json.loads(line)
+                if name[0] == "entry":
+                    key = (name[1], name[2])
+                    if key not in entry_ids:
+                        entry_ids[key] = len(entries)
+                        entries.append(key)
+                    entry_map.append(entry_ids[key])
+                elif name[0] == "status":
+                    if name[1] not in status_ids:
+                        statuses.append(name[1])
+                        status_ids[name[1]] = len(statuses)
+                    status_map.append(status_ids[name[1]])
+                else:
+                    if name[1] not in error_ids:
+                        errors.append(name[1])
+                        error_ids[name[1]] = len(errors)
+                    error_map.append(error_ids[name[1]])
+        segments = sorted(
+            glob.glob(os.path.join(directory, glob.escape(node) + "-*.samples"))
+        )
+        nodes.append((node, entry_map, error_map, status_map, segments))
+    return entries, errors, statuses, nodes
+
+
+def read_samples(directory, node_id=None):
+    """
+    Load the samples recorded in *directory* (by all nodes, or only the node *node_id*).
+
+    Returns a (records, entries, errors, statuses) tuple, where *records* is a NumPy structured
+    array (see :func:`sample_dtype`) with the records of all segments, and *entries*, *errors*
+    and *statuses* are the lists of names that the IDs refer to (see :func:`read_names`). The
+    IDs are unified over the nodes.
+    """
+    numpy = import_numpy("reading recorded samples")
+    entries, errors, statuses, nodes = read_names(directory, node_id)
+    arrays = []
+    for _, entry_map, error_map, status_map, segments in nodes:
+        entry_map = numpy.array(entry_map, dtype="<u4")
+        error_map = numpy.array(error_map, dtype="<u4")
+        status_map = numpy.array(status_map, dtype="<u4")
+        for segment in segments:
+            records = numpy.array(read_segment(segment))
+            if len(records):
+                records["entry_id"] = entry_map[records["entry_id"]]
+                records["error_id"] = error_map[records["error_id"]]
+                records["status_id"] = status_map[records["status_id"]]
+                arrays.append(records)
+    if not arrays:
+        return numpy.zeros(0, dtype=sample_dtype()), entries, errors, statuses
+    return numpy.concatenate(arrays), entries, errors, statuses
@@ -90,6 +90,17 @@ $('#edit_form').submit(function(event) {
     );
 });
 
+// Response times below 10 ms are shown with two decimals, longer ones as whole milliseconds
+function formatResponseTime(value) {
+    return value < 10 && value != Math.round(value) ? value.toFixed(2) : Math.round(value);
+}
+
+function formatStatusCodes(statusCodes) {
+    return $.map(statusCodes || {}, function(count, status) {
+        return status + ": " + count;
+    }).join(", ");
+}
+
 var sortBy = function(field, reverse, primer){
     reverse = (reverse) ? -1 : 1;
     return function(a,b){
@@ -1,13 +1,18 @@
 import csv
 import hashlib
+import os
+import re
 import time
-from collections import namedtuple, OrderedDict
+from collections import Counter, OrderedDict
 from copy import copy
+from heapq import heapify, heappop, heappush, heapreplace
 from itertools import chain
 
 import gevent
 
 from .exception import StopUser
+from .histogram import RoundedHistogram
+from .timeseries import RollingCounter, SlidingWindow, TieredTimeSeries
 
 import logging
 
@@ -29,10 +34,53 @@ response time percentile
 """
 CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW = 10
 
+"""
+Default histogram class used to store the response time distribution of each stats entry.
+Can be set to any :class:`Histogram <locust.histogram.Histogram>` subclass (or a callable that 
+returns a Histogram instance), e.g. :class:`LogLinearHistogram <locust.histogram.LogLinearHistogram>` or 
+:class:`DDSketchHistogram <locust.histogram.DDSketchHistogram>` for percentiles with a fixed relative error.
+Should be set to the same value on the master and worker nodes.
+"""
+DEFAULT_HISTOGRAM_CLASS = RoundedHistogram
+
+# The current RPS and failures per second are calculated over the seconds between
+# CURRENT_RPS_START_OFFSET and CURRENT_RPS_END_OFFSET seconds before the last request,
+# to not include seconds for which worker nodes may not have reported their stats yet
+CURRENT_RPS_START_OFFSET = 12
+CURRENT_RPS_END_OFFSET = 2
+
+"""
+Tiers used for the per second request and failure counts (StatsEntry.num_reqs_per_sec and 
+StatsEntry.num_fail_per_sec), as a list of (resolution in seconds, max number of buckets) tuples.
+By default we keep per second counts for the last 2 minutes, 10 second counts for the 30 minutes 
+before that, and minute counts (with halved resolution each time the last tier is full) for 
+older requests, which keeps the memory usage flat during long running tests.
+"""
+TIMESERIES_TIERS = ((1, 120), (10, 180), (60, 240))
+
+"""
+Name of the stats entry that requests are logged to when RequestStats.max_entries has been reached
+"""
+OTHER_ENTRY_NAME = "Other"
 
-CachedResponseTimes = namedtuple(
-    "CachedResponseTimes", ["response_times", "num_requests"]
-)
+"""
+Default interval - in seconds - for how frequently the records of a StatsBuffer are logged to its 
+RequestStats
+"""
+STATS_BUFFER_FLUSH_INTERVAL = 1.0
+
+"""
+Max number of error keys that RequestStats keeps in its LRU cache, to avoid calculating the key 
+(see StatsError.create_key) every time the same error occurs
+"""
+ERROR_KEY_CACHE_SIZE = 1000
+
+"""
+Phases of a request that clients can report the time of (see StatsEntry.phase_times): setting up 
+a new connection (including DNS resolution), the TLS handshake of a new connection, waiting for the 
+first byte of the response once the request could be sent, and downloading the response body
+"""
+CONNECTION_PHASES = ("connect", "tls", "ttfb", "download")
 
 PERCENTILES_TO_REPORT = [
     0.50,
@@ -91,28 +139,150 @@ def diff_response_time_dicts(latest, old):
     return new
 
 
+class RequestNameNormalizer(object):
+    """
+    Replaces the dynamic parts of request names, like numeric IDs, UUIDs and hashes, with
+    placeholders. This way requests to e.g. /orders/81723 and /orders/81724 are both logged
+    as /orders/{id}, instead of creating a new stats entry for every ID.
+
+    The normalized names are memoized, so the regular expressions are only run once for each
+    distinct request name.
+    """
+
+    DEFAULT_RULES = [
+        (
+            r"(?<=[/=,])[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}(?=[/?&#;.,]|$)",
+            "{uuid}",
+        ),
+        # hashes have at least one a-f letter, so that long numeric IDs are matched as IDs
+        (r"(?<=[/=,])(?=\d*[a-fA-F])[0-9a-fA-F]{16,}(?=[/?&#;.,]|$)", "{hash}"),
+        (r"(?<=[/=,])\d+(?=[/?&#;.,]|$)", "{id}"),
+    ]
+    """
+    List of (regular expression, replacement) tuples that are applied by default. They match
+    UUIDs, hex encoded hashes and numbers that make up a whole path segment or query parameter value.
+    """
+
+    def __init__(self, patterns=None, use_default_rules=True, cache_size=10000):
+        """
+        :param patterns: List of (regular expression, replacement) tuples, that are applied (in order)
+                         before the default rules
+        :param use_default_rules: If False, only the given patterns are applied
+        :param cache_size: Max number of memoized request names. The cache is cleared when it's full.
+        """
+        rules = list(patterns or [])
+        if use_default_rules:
+            rules += self.DEFAULT_RULES
+        self.rules = [
+            (re.compile(pattern), replacement) for pattern, replacement in rules
+        ]
+        self.cache_size = cache_size
+        self._cache = {}
+
+    def normalize(self, name):
+        """
+        Return the normalized version of a request name
+        """
+        try:
+            return self._cache[name]
+        except KeyError:
+            pass
+        normalized = name
+        for regex, replacement in self.rules:
+            normalized = regex.sub(replacement, normalized)
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[name] = normalized
+        return normalized
+
+
 class RequestStats(object):
     """
     Class that holds the request statistics.
     """
 
-    def __init__(self, use_response_times_cache=True):
+    def __init__(
+        self,
+        use_response_times_cache=True,
+        histogram_class=None,
+        name_normalizer=None,
+        max_entries=None,
+        buffer_size=None,
+        aggregate_on_demand=False,
+        max_errors=None,
+    ):
         """
         :param use_response_times_cache: The value of use_response_times_cache will be set for each StatsEntry()
                                          when they are created. Settings it to False saves some memory and CPU 
-                                         cycles which we can do on Worker nodes where the response_times_cache 
-                                         is not needed.
+                                         cycles which we can do on Worker nodes where the current response times 
+                                         are not needed.
+        :param histogram_class: Histogram class (or factory) used for the response times of each StatsEntry().
+                                Defaults to DEFAULT_HISTOGRAM_CLASS.
+        :param name_normalizer: If set, a :class:`RequestNameNormalizer` that's used to normalize the names 
+                                of the logged requests and errors.
+        :param max_entries: If set, the max number of stats entries. Once it's been reached, requests with 
+                            a new name are logged to an entry named OTHER_ENTRY_NAME.
+        :param buffer_size: If set, requests and errors are logged to a :class:`StatsBuffer` with room for 
+                            this many records, which is flushed to the stats entries in bulk.
+        :param aggregate_on_demand: If True, the Aggregated entry (:attr:`total`) isn't updated for every 
+                                    request, but merged from the other entries when it's used. The merged 
+                                    entry is cached until stats are logged, reset or reported.
+        :param max_errors: If set, the max number of distinct errors that are kept track of (see 
+                           :class:`StatsErrors`).
         """
         self.use_response_times_cache = use_response_times_cache
+        self.histogram_class = histogram_class or DEFAULT_HISTOGRAM_CLASS
+        self.name_normalizer = name_normalizer
+        self.max_entries = max_entries
+        self.buffer = StatsBuffer(self, buffer_size) if buffer_size else None
+        self.aggregate_on_demand = aggregate_on_demand
         self.entries = {}
-        self.errors = {}
-        self.total = StatsEntry(
+        self._max_errors = max_errors
+        self.errors = StatsErrors(max_errors)
+        self.error_key_cache_size = ERROR_KEY_CACHE_SIZE
+        self._error_keys = OrderedDict()
+        # incremented whenever the entries change, and compared with the version of the
+        # stats that the Aggregated entry was last merged from
+        self._version = 0
+        self._total_version = None
+        self._total = self._create_total()
+
+    def _create_total(self):
+        return StatsEntry(
             self,
             "Aggregated",
             None,
             use_response_times_cache=self.use_response_times_cache,
         )
 
+    @property
+    def total(self):
+        """
+        The Aggregated :class:`StatsEntry`, with the stats of all requests
+        """
+        if self.aggregate_on_demand and self._total_version != self._version:
+            self._aggregate_total()
+        return self._total
+
+    def _aggregate_total(self):
+        previous = self._total
+        total = self._create_total()
+        total.start_time = previous.start_time
+        for entry in self.entries.values():
+            total.extend(entry)
+        window = previous._window
+        if window is not None and total._response_times:
+            # the entries don't keep track of when their response times were logged, so the ones
+            # that have been logged since the last merge are added to the slot of the last request
+            response_times = copy(total._response_times)
+            if previous._response_times:
+                response_times.subtract(previous._response_times)
+            if response_times:
+                window.add(int(total.last_request_timestamp), response_times)
+        total._window = window
+        self._total = total
+        self._total_version = self._version
+
     @property
     def num_requests(self):
         return self.total.num_requests
@@ -133,21 +303,108 @@ class RequestStats(object):
     def start_time(self):
         return self.total.start_time
 
-    def log_request(self, method, name, response_time, content_length):
-        self.total.log(response_time, content_length)
-        self.get(name, method).log(response_time, content_length)
+    def log_request(
+        self,
+        method,
+        name,
+        response_time,
+        content_length,
+        status=None,
+        connection_timings=None,
+    ):
+        """
+        Log a request. If *status* is set (the HTTP status code of the response, or the class
+        name of the exception for requests that didn't get a response), it's counted in the
+        :attr:`status_codes <StatsEntry.status_codes>` of the entry. *connection_timings* is
+        an optional {phase: milliseconds} dict with the time of the CONNECTION_PHASES of the
+        request (see :meth:`StatsEntry.log_connection_timings`).
+        """
+        if self.buffer is not None:
+            self.buffer.log_request(
+                method, name, response_time, content_length, status, connection_timings
+            )
+            return
+        if self.name_normalizer is not None or self.max_entries is not None:
+            name = self._resolve_name(name, method)
+        self._version += 1
+        if not self.aggregate_on_demand:
+            self._total.log(response_time, content_length, status, connection_timings)
+        self.get(name, method).log(
+            response_time, content_length, status, connection_timings
+        )
 
     def log_error(self, method, name, error):
-        self.total.log_error(error)
+        if self.buffer is not None:
+            self.buffer.log_error(method, name, error)
+            return
+        if self.name_normalizer is not None or self.max_entries is not None:
+            name = self._resolve_name(name, method)
+        self._version += 1
+        if not self.aggregate_on_demand:
+            self._total.log_error(error)
         self.get(name, method).log_error(error)
+        self._store_error(method, name, error)
+
+    @property
+    def max_errors(self):
+        return self._max_errors
 
+    @max_errors.setter
+    def max_errors(self, max_errors):
+        self._max_errors = max_errors
+        self.errors.max_errors = max_errors
+
+    def _store_error(self, method, name, error):
         # store error in errors dict
-        key = StatsError.create_key(method, name, error)
+        key = self._error_key(method, name, error)
         entry = self.errors.get(key)
         if not entry:
-            entry = StatsError(method, name, error)
-            self.errors[key] = entry
-        entry.occurred()
+            entry = self.errors.add(key, method, name, error)
+        else:
+            entry.occurred()
+
+    def _error_key(self, method, name, error):
+        """
+        Return the key of an error in the errors dict. The keys are cached by the type and the
+        arguments of the error, for errors whose repr() only depends on those.
+        """
+        if isinstance(error, BaseException):
+            if type(error).__repr__ is not BaseException.__repr__:
+                return StatsError.create_key(method, name, error)
+            cache_key = (method, name, type(error), error.args)
+        elif isinstance(error, str):
+            cache_key = (method, name, str, error)
+        else:
+            return StatsError.create_key(method, name, error)
+        try:
+            key = self._error_keys[cache_key]
+        except KeyError:
+            pass
+        except TypeError:
+            # the error has unhashable arguments
+            return StatsError.create_key(method, name, error)
+        else:
+            self._error_keys.move_to_end(cache_key)
+            return key
+        key = StatsError.create_key(method, name, error)
+        self._error_keys[cache_key] = key
+        if len(self._error_keys) > self.error_key_cache_size:
+            self._error_keys.popitem(last=False)
+        return key
+
+    def _resolve_name(self, name, method):
+        """
+        Return the name of the stats entry that a request should be logged to
+        """
+        if self.name_normalizer is not None:
+            name = self.name_normalizer.normalize(name)
+        if (
+            self.max_entries is not None
+            and len(self.entries) >= self.max_entries
+            and (name, method) not in self.entries
+        ):
+            name = OTHER_ENTRY_NAME
+        return name
 
     def get(self, name, method):
         """
@@ -164,12 +421,23 @@ class RequestStats(object):
             self.entries[(name, method)] = entry
         return entry
 
+    def flush_buffer(self):
+        """
+        Log the records of the stats buffer (if there is one) to the stats entries. Called before
+        the stats are reported, so that the reports include all the requests made so far.
+        """
+        if self.buffer is not None:
+            self.buffer.flush()
+
     def reset_all(self):
         """
         Go through all stats entries and reset them to zero
         """
-        self.total.reset()
-        self.errors = {}
+        if self.buffer is not None:
+            self.buffer.clear()
+        self._version += 1
+        self._total.reset()
+        self.errors = StatsErrors(self.max_errors)
         for r in self.entries.values():
             r.reset()
 
@@ -177,16 +445,15 @@ class RequestStats(object):
         """
         Remove all stats entries and errors
         """
-        self.total = StatsEntry(
-            self,
-            "Aggregated",
-            None,
-            use_response_times_cache=self.use_response_times_cache,
-        )
+        if self.buffer is not None:
+            self.buffer.clear()
+        self._version += 1
+        self._total = self._create_total()
         self.entries = {}
-        self.errors = {}
+        self.errors = StatsErrors(self.max_errors)
 
     def serialize_stats(self):
+        self._version += 1
         return [
             self.entries[key].get_stripped_report()
             for key in self.entries.keys()
@@ -200,74 +467,166 @@ class RequestStats(object):
         return dict([(k, e.to_dict()) for k, e in self.errors.items()])
 
 
-class StatsEntry(object):
+class StatsBuffer(object):
     """
-    Represents a single stats entry (name and method)
-    """
-
-    name = None
-    """ Name (URL) of this stats entry """
+    Preallocated buffer of request and error records, that are logged to a :class:`RequestStats`
+    instance in bulk, once every STATS_BUFFER_FLUSH_INTERVAL seconds or when the buffer is full.
 
-    method = None
-    """ Method (GET, POST, PUT, etc.) """
-
-    num_requests = None
-    """ The number of requests made """
+    Logging a request to the buffer only stores a record with the time of the request, which takes
+    most of the per request overhead of the stats off the greenlets that make the requests. When the
+    buffer is flushed, the records are grouped by stats entry and each entry is updated once per batch,
+    with the same result as if the requests had been logged one by one.
+    """
 
-    num_none_requests = None
-    """ The number of requests made with a None response time (typically async requests) """
+    def __init__(self, stats, size=10000, flush_interval=None):
+        """
+        :param stats: The :class:`RequestStats` instance that the records are logged to
+        :param size: Max number of buffered requests (or errors), before the buffer is flushed
+        :param flush_interval: Max number of seconds that a record is buffered. Defaults to
+                               STATS_BUFFER_FLUSH_INTERVAL.
+        """
+        self.stats = stats
+        self.size = size
+        self.flush_interval = (
+            STATS_BUFFER_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        )
+        self._records = [None] * size
+        self._count = 0
+        self._errors = []
+        self._flush_greenlet = None
 
-    num_failures = None
-    """ Number of failed request """
+    def __len__(self):
+        return self._count + len(self._errors)
 
-    total_response_time = None
-    """ Total sum of the response times """
+    def log_request(
+        self,
+        method,
+        name,
+        response_time,
+        content_length,
+        status=None,
+        connection_timings=None,
+    ):
+        count = self._count
+        self._records[count] = (
+            name,
+            method,
+            response_time,
+            content_length,
+            time.time(),
+            status,
+            connection_timings,
+        )
+        self._count = count + 1
+        if self._count >= self.size:
+            self.flush()
+        elif self._flush_greenlet is None:
+            self._schedule_flush()
 
-    min_response_time = None
-    """ Minimum response time """
+    def log_error(self, method, name, error):
+        self._errors.append((name, method, error, time.time()))
+        if len(self._errors) >= self.size:
+            self.flush()
+        elif self._flush_greenlet is None:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        self._flush_greenlet = gevent.spawn_later(
+            self.flush_interval, self._flush_later
+        )
 
-    max_response_time = None
-    """ Maximum response time """
+    def _flush_later(self):
+        self._flush_greenlet = None
+        self.flush()
 
-    num_reqs_per_sec = None
-    """ A {second => request_count} dict that holds the number of requests made per second """
+    def clear(self):
+        """
+        Discard all the buffered records
+        """
+        self._count = 0
+        self._errors = []
 
-    num_fail_per_sec = None
-    """ A (second => failure_count) dict that hold the number of failures per second """
+    def flush(self):
+        """
+        Log all the buffered records to the stats entries
+        """
+        records = self._records[: self._count]
+        errors = self._errors
+        self.clear()
+        stats = self.stats
+        stats._version += 1
+        resolve_names = (
+            stats.name_normalizer is not None or stats.max_entries is not None
+        )
 
-    response_times = None
-    """
-    A {response_time => count} dict that holds the response time distribution of all
-    the requests.
-    
-    The keys (the response time in ms) are rounded to store 1, 2, ... 9, 10, 20. .. 90, 
-    100, 200 .. 900, 1000, 2000 ... 9000, in order to save memory.
-    
-    This dict is used to calculate the median and percentile response times.
-    """
+        if records:
+            # group the records by stats entry, in the order that the entries were first hit
+            groups = {}
+            for record in records:
+                key = record[:2]
+                group = groups.get(key)
+                if group is None:
+                    groups[key] = [record]
+                else:
+                    group.append(record)
+            for (name, method), group in groups.items():
+                if resolve_names:
+                    name = stats._resolve_name(name, method)
+                stats.get(name, method)._log_batch(group)
+            if not stats.aggregate_on_demand:
+                stats._total._log_batch(records)
+
+        if errors:
+            timestamps = {}
+            for name, method, error, t in errors:
+                if resolve_names:
+                    name = stats._resolve_name(name, method)
+                timestamps.setdefault((name, method), []).append(t)
+                stats._store_error(method, name, error)
+            for (name, method), group in timestamps.items():
+                stats.get(name, method)._log_errors(group)
+            if not stats.aggregate_on_demand:
+                stats._total._log_errors([error[3] for error in errors])
 
-    use_response_times_cache = False
-    """
-    If set to True, the copy of the response_time dict will be stored in response_times_cache 
-    every second, and kept for 20 seconds (by default, will be CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW + 10). 
-    We can use this dict to calculate the *current*  median response time, as well as other response 
-    time percentiles.
-    """
 
-    response_times_cache = None
+class StatsEntry(object):
     """
-    If use_response_times_cache is set to True, this will be a {timestamp => CachedResponseTimes()} 
-    OrderedDict that holds a copy of the response_times dict for each of the last 20 seconds.
+    Represents a single stats entry (name and method)
     """
 
-    total_content_length = None
-    """ The sum of the content length of all the requests for this entry """
-
-    start_time = None
-    """ Time of the first request for this entry """
-
-    last_request_timestamp = None
-    """ Time of the last request for this entry """
+    # Stats entries are created for every (name, method) pair, so we use __slots__ and create
+    # the histogram and time series lazily, to keep entries that are only hit a few times small
+    __slots__ = {
+        "stats": "The :class:`RequestStats` instance that this entry belongs to",
+        "name": "Name (URL) of this stats entry",
+        "method": "Method (GET, POST, PUT, etc.)",
+        "num_requests": "The number of requests made",
+        "num_none_requests": "The number of requests made with a None response time (typically async requests)",
+        "num_failures": "Number of failed request",
+        "total_response_time": "Total sum of the response times",
+        "min_response_time": "Minimum response time",
+        "max_response_time": "Maximum response time",
+        "use_response_times_cache": """
+            If set to True, the response times of the last CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW 
+            seconds are kept in per-second slots of a sliding window, once the *current* median 
+            response time or other response time percentiles have been requested.
+            """,
+        "total_content_length": "The sum of the content length of all the requests for this entry",
+        "start_time": "Time of the first request for this entry",
+        "last_request_timestamp": "Time of the last request for this entry",
+        "num_new_connections": "Number of requests that were reported to have opened a new connection",
+        "num_reused_connections": "Number of requests that were reported to have reused a connection",
+        "_response_times": None,
+        "_num_reqs_per_sec": None,
+        "_num_fail_per_sec": None,
+        "_current_reqs": None,
+        "_current_fails": None,
+        "_window": None,
+        "_version": None,
+        "_percentiles_cache": None,
+        "_status_codes": None,
+        "_phase_times": None,
+    }
 
     def __init__(self, stats, name, method, use_response_times_cache=False):
         self.stats = stats
@@ -282,40 +641,149 @@ class StatsEntry(object):
         self.num_none_requests = 0
         self.num_failures = 0
         self.total_response_time = 0
-        self.response_times = {}
+        self._response_times = None
+        self._version = 0
+        self._percentiles_cache = None
         self.min_response_time = None
         self.max_response_time = 0
         self.last_request_timestamp = None
-        self.num_reqs_per_sec = {}
-        self.num_fail_per_sec = {}
+        self._num_reqs_per_sec = None
+        self._num_fail_per_sec = None
+        self._current_reqs = None
+        self._current_fails = None
         self.total_content_length = 0
+        self._window = None
+        self._status_codes = None
+        self.num_new_connections = 0
+        self.num_reused_connections = 0
+        self._phase_times = None
+
+    @property
+    def response_times(self):
+        """
+        A :class:`Histogram <locust.histogram.Histogram>` that holds the response time distribution 
+        of all the requests. It can be used as a {response_time => count} dict.
+        
+        With the default RoundedHistogram the keys (the response time in ms) are rounded to store 
+        1, 2, ... 9, 10, 20. .. 90, 100, 200 .. 900, 1000, 2000 ... 9000, in order to save memory.
+        
+        This histogram is used to calculate the median and percentile response times.
+        """
+        if self._response_times is None:
+            self._response_times = self._create_histogram()
+        return self._response_times
+
+    @response_times.setter
+    def response_times(self, response_times):
+        self._response_times = response_times
+
+    @property
+    def num_reqs_per_sec(self):
+        """
+        A :class:`TieredTimeSeries <locust.timeseries.TieredTimeSeries>` that holds the number of 
+        requests made per second. It can be used as a {second => request_count} dict, where older 
+        seconds are downsampled into coarser buckets (see TIMESERIES_TIERS).
+        """
+        if self._num_reqs_per_sec is None:
+            self._num_reqs_per_sec = TieredTimeSeries(TIMESERIES_TIERS)
+            self._current_reqs = self._create_rolling_counter()
+        return self._num_reqs_per_sec
+
+    @property
+    def num_fail_per_sec(self):
+        """
+        A :class:`TieredTimeSeries <locust.timeseries.TieredTimeSeries>` that holds the number of 
+        failures per second. It can be used as a {second => failure_count} dict.
+        """
+        if self._num_fail_per_sec is None:
+            self._num_fail_per_sec = TieredTimeSeries(TIMESERIES_TIERS)
+            self._current_fails = self._create_rolling_counter()
+        return self._num_fail_per_sec
+
+    def _create_rolling_counter(self):
+        # Only the entries that keep the current response times (i.e. not the ones on worker
+        # nodes) have their current RPS read often enough for a rolling counter to pay off.
+        # Otherwise it's calculated from the per second counts when it's read.
         if self.use_response_times_cache:
-            self.response_times_cache = OrderedDict()
-            self._cache_response_times(int(time.time()))
+            return RollingCounter(CURRENT_RPS_START_OFFSET, CURRENT_RPS_END_OFFSET)
+        return None
+
+    @property
+    def window(self):
+        """
+        A :class:`SlidingWindow <locust.timeseries.SlidingWindow>` that holds the response times of 
+        the last CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW seconds, or None. It's created the first time 
+        the current response time percentiles are requested (if use_response_times_cache is True).
+        """
+        return self._window
+
+    @property
+    def status_codes(self):
+        """
+        A {status: count} dict with the number of requests per HTTP status code (an int), or
+        per exception class name (a string) for requests that didn't get a response. Requests
+        that were logged without a status aren't counted.
+        """
+        if self._status_codes is None:
+            self._status_codes = {}
+        return self._status_codes
 
-    def log(self, response_time, content_length):
+    @property
+    def phase_times(self):
+        """
+        A {phase: histogram} dict with the distribution of the time (in milliseconds) that was
+        spent on each of the CONNECTION_PHASES, for the requests that were logged with connection
+        timings. Only has the phases that have been reported.
+        """
+        if self._phase_times is None:
+            self._phase_times = {}
+        return self._phase_times
+
+    def get_phase_time_percentile(self, phase, percent):
+        """
+        Get the time that a certain number of percent of the requests spent on *phase* (one of
+        CONNECTION_PHASES) within, or None if no time has been reported for the phase.
+        """
+        histogram = self.phase_times.get(phase)
+        if not histogram:
+            return None
+        return histogram.percentile(percent)
+
+    def log(self, response_time, content_length, status=None, connection_timings=None):
         # get the time
         current_time = time.time()
-        t = int(current_time)
-
-        if (
-            self.use_response_times_cache
-            and self.last_request_timestamp
-            and t > int(self.last_request_timestamp)
-        ):
-            # see if we shall make a copy of the respone_times dict and store in the cache
-            self._cache_response_times(t - 1)
 
         self.num_requests += 1
         self._log_time_of_request(current_time)
         self._log_response_time(response_time)
+        if self._window is not None and response_time is not None:
+            self._window.log(int(current_time), response_time)
 
         # increase total content-length
         self.total_content_length += content_length
 
+        if status is not None:
+            self.log_status(status)
+        if connection_timings is not None:
+            self.log_connection_timings(connection_timings)
+
+    def log_status(self, status, count=1):
+        """
+        Add *count* requests with the given status to :attr:`status_codes`
+        """
+        status_codes = self._status_codes
+        if status_codes is None:
+            status_codes = self._status_codes = {}
+        status_codes[status] = status_codes.get(status, 0) + count
+
     def _log_time_of_request(self, current_time):
         t = int(current_time)
-        self.num_reqs_per_sec[t] = self.num_reqs_per_sec.setdefault(t, 0) + 1
+        num_reqs_per_sec = self._num_reqs_per_sec
+        if num_reqs_per_sec is None:
+            num_reqs_per_sec = self.num_reqs_per_sec
+        num_reqs_per_sec.add(t)
+        if self._current_reqs is not None:
+            self._current_reqs.add(t)
         self.last_request_timestamp = current_time
 
     def _log_response_time(self, response_time):
@@ -331,26 +799,104 @@ class StatsEntry(object):
         self.min_response_time = min(self.min_response_time, response_time)
         self.max_response_time = max(self.max_response_time, response_time)
 
-        # to avoid to much data that has to be transfered to the master node when
-        # running in distributed mode, we save the response time rounded in a dict
-        # so that 147 becomes 150, 3432 becomes 3400 and 58760 becomes 59000
-        if response_time < 100:
-            rounded_response_time = round(response_time)
-        elif response_time < 1000:
-            rounded_response_time = round(response_time, -1)
-        elif response_time < 10000:
-            rounded_response_time = round(response_time, -2)
+        self.response_times.record(response_time)
+        self._version += 1
+
+    def log_connection_timings(self, timings):
+        """
+        Log the {phase: milliseconds} times of the CONNECTION_PHASES of a request. Requests
+        with a connect time are counted as new connections, others as reused connections.
+        """
+        if "connect" in timings:
+            self.num_new_connections += 1
         else:
-            rounded_response_time = round(response_time, -3)
+            self.num_reused_connections += 1
+        phase_times = self.phase_times
+        for phase, t in timings.items():
+            histogram = phase_times.get(phase)
+            if histogram is None:
+                histogram = phase_times[phase] = self._create_histogram()
+            histogram.record(t)
+
+    def _log_batch(self, records):
+        """
+        Log a batch of (name, method, response_time, content_length, timestamp, status,
+        connection_timings) records, in the order that the requests were made. Used by
+        :class:`StatsBuffer`.
+        """
+        # entries that are created when the buffer is flushed should start at the first request
+        self.start_time = min(self.start_time, records[0][4])
+        self.num_requests += len(records)
+        self.total_content_length += sum([record[3] for record in records])
+        num_reqs_per_sec = self.num_reqs_per_sec
+        current_reqs = self._current_reqs
+        for t, count in Counter([int(record[4]) for record in records]).items():
+            num_reqs_per_sec.add(t, count)
+            if current_reqs is not None:
+                current_reqs.add(t, count)
+        # several groups of records may be logged to the same entry (e.g. OTHER_ENTRY_NAME)
+        if (
+            self.last_request_timestamp is None
+            or records[-1][4] > self.last_request_timestamp
+        ):
+            self.last_request_timestamp = records[-1][4]
+        statuses = [record[5] for record in records if record[5] is not None]
+        if statuses:
+            for status, count in Counter(statuses).items():
+                self.log_status(status, count)
+        for record in records:
+            if record[6] is not None:
+                self.log_connection_timings(record[6])
+
+        response_times = [record[2] for record in records if record[2] is not None]
+        self.num_none_requests += len(records) - len(response_times)
+        if not response_times:
+            return
+        self.total_response_time += sum(response_times)
+        min_response_time = min(response_times)
+        if self.min_response_time is None or min_response_time < self.min_response_time:
+            self.min_response_time = min_response_time
+        self.max_response_time = max(self.max_response_time, max(response_times))
+        self.response_times.record_many(response_times)
+        self._version += 1
+
+        if self._window is not None:
+            per_second = {}
+            for record in records:
+                if record[2] is not None:
+                    per_second.setdefault(int(record[4]), []).append(record[2])
+            for t, response_times in per_second.items():
+                histogram = self._create_histogram()
+                histogram.record_many(response_times)
+                self._window.add(t, histogram)
+
+    @property
+    def _histogram_class(self):
+        if self.stats is not None:
+            return self.stats.histogram_class
+        return DEFAULT_HISTOGRAM_CLASS
 
-        # increase request count for the rounded key in response time dict
-        self.response_times.setdefault(rounded_response_time, 0)
-        self.response_times[rounded_response_time] += 1
+    def _create_histogram(self):
+        return self._histogram_class()
 
     def log_error(self, error):
         self.num_failures += 1
         t = int(time.time())
-        self.num_fail_per_sec[t] = self.num_fail_per_sec.setdefault(t, 0) + 1
+        self.num_fail_per_sec.add(t)
+        if self._current_fails is not None:
+            self._current_fails.add(t)
+
+    def _log_errors(self, timestamps):
+        """
+        Log the failures of a batch of requests, made at the given timestamps
+        """
+        self.num_failures += len(timestamps)
+        num_fail_per_sec = self.num_fail_per_sec
+        current_fails = self._current_fails
+        for t, count in Counter([int(t) for t in timestamps]).items():
+            num_fail_per_sec.add(t, count)
+            if current_fails is not None:
+                current_fails.add(t, count)
 
     @property
     def fail_ratio(self):
@@ -373,7 +919,7 @@ class StatsEntry(object):
 
     @property
     def median_response_time(self):
-        if not self.response_times:
+        if not self._response_times:
             return 0
         median = (
             median_from_dict(
@@ -395,31 +941,39 @@ class StatsEntry(object):
 
     @property
     def current_rps(self):
-        if self.stats.last_request_timestamp is None:
-            return 0
-        slice_start_time = max(
-            int(self.stats.last_request_timestamp) - 12, int(self.stats.start_time or 0)
-        )
-
-        reqs = [
-            self.num_reqs_per_sec.get(t, 0)
-            for t in range(slice_start_time, int(self.stats.last_request_timestamp) - 2)
-        ]
-        return avg(reqs)
+        return self._current_per_sec(self._current_reqs, self._num_reqs_per_sec)
 
     @property
     def current_fail_per_sec(self):
-        if self.stats.last_request_timestamp is None:
+        return self._current_per_sec(self._current_fails, self._num_fail_per_sec)
+
+    def _current_per_sec(self, counter, series):
+        # average count per second in the seconds [last request - CURRENT_RPS_START_OFFSET,
+        # last request - CURRENT_RPS_END_OFFSET), but not before the start of the test. The
+        # rolling counters keep a running sum of that window, so this is O(1) for entries
+        # that have one.
+        last_request_timestamp = self.stats.last_request_timestamp
+        if last_request_timestamp is None:
             return 0
-        slice_start_time = max(
-            int(self.stats.last_request_timestamp) - 12, int(self.stats.start_time or 0)
+        last_request_time = int(last_request_timestamp)
+        start_time = int(self.stats.start_time or 0)
+        seconds = (last_request_time - CURRENT_RPS_END_OFFSET) - max(
+            last_request_time - CURRENT_RPS_START_OFFSET, start_time
+        )
+        if series is None or seconds <= 0:
+            return 0.0
+        if counter is not None:
+            return counter.window_total(last_request_time, start_time) / seconds
+        first = max(last_request_time - CURRENT_RPS_START_OFFSET, start_time)
+        return (
+            sum(
+                [
+                    series.get(t, 0)
+                    for t in range(first, last_request_time - CURRENT_RPS_END_OFFSET)
+                ]
+            )
+            / seconds
         )
-
-        reqs = [
-            self.num_fail_per_sec.get(t, 0)
-            for t in range(slice_start_time, int(self.stats.last_request_timestamp) - 2)
-        ]
-        return avg(reqs)
 
     @property
     def total_rps(self):
@@ -455,10 +1009,6 @@ class StatsEntry(object):
         Extend the data from the current StatsEntry with the stats from another
         StatsEntry instance. 
         """
-        # save the old last_request_timestamp, to see if we should store a new copy
-        # of the response times in the response times cache
-        old_last_request_timestamp = self.last_request_timestamp
-
         if (
             self.last_request_timestamp is not None
             and other.last_request_timestamp is not None
@@ -485,34 +1035,39 @@ class StatsEntry(object):
         self.total_content_length = (
             self.total_content_length + other.total_content_length
         )
-
-        for key in other.response_times:
-            self.response_times[key] = (
-                self.response_times.get(key, 0) + other.response_times[key]
-            )
-        for key in other.num_reqs_per_sec:
-            self.num_reqs_per_sec[key] = (
-                self.num_reqs_per_sec.get(key, 0) + other.num_reqs_per_sec[key]
-            )
-        for key in other.num_fail_per_sec:
-            self.num_fail_per_sec[key] = (
-                self.num_fail_per_sec.get(key, 0) + other.num_fail_per_sec[key]
-            )
-
-        if self.use_response_times_cache:
-            # If we've entered a new second, we'll cache the response times. Note that there
-            # might still be reports from other worker nodes - that contains requests for the same
-            # time periods - that hasn't been received/accounted for yet. This will cause the cache to
-            # lag behind a second or two, but since StatsEntry.current_response_time_percentile()
-            # (which is what the response times cache is used for) uses an approximation of the
-            # last 10 seconds anyway, it should be fine to ignore this.
-            last_time = (
-                self.last_request_timestamp and int(self.last_request_timestamp) or None
-            )
-            if last_time and last_time > (
-                old_last_request_timestamp and int(old_last_request_timestamp) or 0
-            ):
-                self._cache_response_times(last_time)
+        if other._status_codes:
+            for status, count in other._status_codes.items():
+                self.log_status(status, count)
+        self.num_new_connections += other.num_new_connections
+        self.num_reused_connections += other.num_reused_connections
+        if other._phase_times:
+            phase_times = self.phase_times
+            for phase, histogram in other._phase_times.items():
+                if phase not in phase_times:
+                    phase_times[phase] = self._create_histogram()
+                phase_times[phase].merge(histogram)
+
+        if other._response_times:
+            self.response_times.merge(other._response_times)
+            self._version += 1
+        if other._num_reqs_per_sec:
+            self.num_reqs_per_sec.merge(other._num_reqs_per_sec)
+            if self._current_reqs is not None:
+                self._current_reqs.merge(other._num_reqs_per_sec)
+        if other._num_fail_per_sec:
+            self.num_fail_per_sec.merge(other._num_fail_per_sec)
+            if self._current_fails is not None:
+                self._current_fails.merge(other._num_fail_per_sec)
+        if (
+            self._window is not None
+            and other._response_times
+            and other.last_request_timestamp is not None
+        ):
+            # The reported response times aren't split up per second, so we'll put all of them
+            # in the slot of the last request. Since the reports are sent every few seconds, the
+            # window will lag behind a bit, which is fine since the *current* response time
+            # percentiles are an approximation of the last 10 seconds anyway.
+            self._window.add(int(other.last_request_timestamp), other._response_times)
 
     def serialize(self):
         return {
@@ -527,9 +1082,24 @@ class StatsEntry(object):
             "max_response_time": self.max_response_time,
             "min_response_time": self.min_response_time,
             "total_content_length": self.total_content_length,
-            "response_times": self.response_times,
-            "num_reqs_per_sec": self.num_reqs_per_sec,
-            "num_fail_per_sec": self.num_fail_per_sec,
+            "response_times": self._response_times.serialize()
+            if self._response_times
+            else {},
+            "num_reqs_per_sec": self._num_reqs_per_sec.serialize()
+            if self._num_reqs_per_sec
+            else {},
+            "num_fail_per_sec": self._num_fail_per_sec.serialize()
+            if self._num_fail_per_sec
+            else {},
+            "status_codes": dict(self._status_codes) if self._status_codes else {},
+            "num_new_connections": self.num_new_connections,
+            "num_reused_connections": self.num_reused_connections,
+            "phase_times": {
+                phase: histogram.serialize()
+                for phase, histogram in self._phase_times.items()
+            }
+            if self._phase_times
+            else {},
         }
 
     @classmethod
@@ -545,11 +1115,30 @@ class StatsEntry(object):
             "max_response_time",
             "min_response_time",
             "total_content_length",
-            "response_times",
-            "num_reqs_per_sec",
-            "num_fail_per_sec",
         ]:
             setattr(obj, key, data[key])
+        if data["num_reqs_per_sec"]:
+            obj.num_reqs_per_sec.merge(data["num_reqs_per_sec"])
+            if obj._current_reqs is not None:
+                obj._current_reqs.merge(data["num_reqs_per_sec"])
+        if data["num_fail_per_sec"]:
+            obj.num_fail_per_sec.merge(data["num_fail_per_sec"])
+            if obj._current_fails is not None:
+                obj._current_fails.merge(data["num_fail_per_sec"])
+        # reports from workers running older versions don't have the status codes
+        if data.get("status_codes"):
+            obj._status_codes = dict(data["status_codes"])
+        obj.num_new_connections = data.get("num_new_connections", 0)
+        obj.num_reused_connections = data.get("num_reused_connections", 0)
+        if data.get("phase_times"):
+            obj._phase_times = {
+                phase: RoundedHistogram(times)
+                for phase, times in data["phase_times"].items()
+            }
+        # The serialized response times is a {response_time: count} dict. We keep the keys as is,
+        # and leave it to the histogram of the StatsEntry that this entry is merged into to
+        # record them into its own buckets.
+        obj.response_times = RoundedHistogram(data["response_times"])
         return obj
 
     def get_stripped_report(self):
@@ -573,15 +1162,15 @@ class StatsEntry(object):
             rps = self.total_rps
             fail_per_sec = self.total_fail_per_sec
         return (
-            " %-" + str(STATS_NAME_WIDTH) + "s %7d %12s %7d %7d %7d  | %7d %7.2f %7.2f"
+            " %-" + str(STATS_NAME_WIDTH) + "s %7d %12s %7s %7s %7s  | %7s %7.2f %7.2f"
         ) % (
             (self.method and self.method + " " or "") + self.name,
             self.num_requests,
             "%d(%.2f%%)" % (self.num_failures, self.fail_ratio * 100),
-            self.avg_response_time,
-            self.min_response_time or 0,
-            self.max_response_time,
-            self.median_response_time or 0,
+            format_response_time(self.avg_response_time),
+            format_response_time(self.min_response_time or 0),
+            format_response_time(self.max_response_time),
+            format_response_time(self.median_response_time or 0),
             rps or 0,
             fail_per_sec or 0,
         )
@@ -596,9 +1185,33 @@ class StatsEntry(object):
         
         Percent specified in range: 0.0 - 1.0
         """
-        return calculate_response_time_percentile(
-            self.response_times, self.num_requests, percent
-        )
+        if percent in PERCENTILES_TO_REPORT:
+            return self.get_response_time_percentiles()[
+                PERCENTILES_TO_REPORT.index(percent)
+            ]
+        return self.response_times.percentile(percent)
+
+    def get_response_time_percentiles(self, percents=None):
+        """
+        Get the response times for a list of percentiles (PERCENTILES_TO_REPORT by default),
+        calculated with a single walk through the response times. Returns a tuple with one
+        response time per percentile.
+
+        The result is cached until new response times are recorded, so that the console, CSV
+        and web UI reports for the same point in time share the work.
+        """
+        percents = tuple(PERCENTILES_TO_REPORT if percents is None else percents)
+        cache = self._percentiles_cache
+        if (
+            cache is not None
+            and cache[0] == self._version
+            and cache[1] is self.response_times
+            and cache[2] == percents
+        ):
+            return cache[3]
+        result = tuple(self.response_times.percentiles(percents))
+        self._percentiles_cache = (self._version, self.response_times, percents, result)
+        return result
 
     def get_current_response_time_percentile(self, percent):
         """
@@ -606,44 +1219,39 @@ class StatsEntry(object):
         window of (approximately) the last 10 seconds (specified by CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW) 
         when calculating this.
         """
+        return self.get_current_response_time_percentiles((percent,))[0]
+
+    def get_current_response_time_percentiles(self, percents=None):
+        """
+        Calculate the *current* response times for a list of percentiles (PERCENTILES_TO_REPORT 
+        by default) with a single walk through the response times of the sliding window. 
+        Returns a list with one response time per percentile.
+        """
+        if percents is None:
+            percents = PERCENTILES_TO_REPORT
         if not self.use_response_times_cache:
             raise ValueError(
                 "StatsEntry.use_response_times_cache must be set to True if we should be able to calculate the _current_ response time percentile"
             )
-        # First, we want to determine which of the cached response_times dicts we should
-        # use to get response_times for approximately 10 seconds ago.
-        t = int(time.time())
-        # Since we can't be sure that the cache contains an entry for every second.
-        # We'll construct a list of timestamps which we consider acceptable keys to be used
-        # when trying to fetch the cached response_times. We construct this list in such a way
-        # that it's ordered by preference by starting to add t-10, then t-11, t-9, t-12, t-8,
-        # and so on
-        acceptable_timestamps = []
-        acceptable_timestamps.append(t - CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW)
-        for i in range(1, 9):
-            acceptable_timestamps.append(
-                t - CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW - i
-            )
-            acceptable_timestamps.append(
-                t - CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW + i
-            )
-
-        cached = None
-        for ts in acceptable_timestamps:
-            if ts in self.response_times_cache:
-                cached = self.response_times_cache[ts]
-                break
-
-        if cached:
-            # If we fond an acceptable cached response times, we'll calculate a new response
-            # times dict of the last 10 seconds (approximately) by diffing it with the current
-            # total response times. Then we'll use that to calculate a response time percentile
-            # for that timeframe
-            return calculate_response_time_percentile(
-                diff_response_time_dicts(self.response_times, cached.response_times),
-                self.num_requests - cached.num_requests,
-                percent,
+        if self._window is None:
+            # Most entries never have their current response time percentiles requested, so we
+            # only start keeping track of them once they are. If the entry was started (or reset)
+            # within the last window period, all of its response times belong in the window.
+            # Otherwise we can't tell which of them are recent, so the window starts out empty.
+            self._window = SlidingWindow(
+                CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW, self._histogram_class
             )
+            if (
+                self._response_times
+                and self.start_time
+                >= time.time() - CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW
+            ):
+                self._window.add(
+                    int(self.last_request_timestamp or time.time()),
+                    self._response_times,
+                )
+        self._window.advance(int(time.time()))
+        return self._window.histogram.percentiles(percents)
 
     def percentile(
         self,
@@ -651,53 +1259,46 @@ class StatsEntry(object):
         + str(STATS_TYPE_WIDTH)
         + "s %-"
         + str(STATS_NAME_WIDTH)
-        + "s %8d %6d %6d %6d %6d %6d %6d %6d %6d %6d %6d %6d",
+        + "s %8d %6s %6s %6s %6s %6s %6s %6s %6s %6s %6s %6s",
     ):
         if not self.num_requests:
             raise ValueError(
                 "Can't calculate percentile on url with no successful requests"
             )
 
+        percentiles = dict(
+            zip(
+                PERCENTILES_TO_REPORT,
+                map(format_response_time, self.get_response_time_percentiles()),
+            )
+        )
         return tpl % (
             self.method,
             self.name,
             self.num_requests,
-            self.get_response_time_percentile(0.5),
-            self.get_response_time_percentile(0.66),
-            self.get_response_time_percentile(0.75),
-            self.get_response_time_percentile(0.80),
-            self.get_response_time_percentile(0.90),
-            self.get_response_time_percentile(0.95),
-            self.get_response_time_percentile(0.98),
-            self.get_response_time_percentile(0.99),
-            self.get_response_time_percentile(0.999),
-            self.get_response_time_percentile(0.9999),
-            self.get_response_time_percentile(1.00),
+            percentiles[0.5],
+            percentiles[0.66],
+            percentiles[0.75],
+            percentiles[0.80],
+            percentiles[0.90],
+            percentiles[0.95],
+            percentiles[0.98],
+            percentiles[0.99],
+            percentiles[0.999],
+            percentiles[0.9999],
+            percentiles[1.00],
         )
 
-    def _cache_response_times(self, t):
-        self.response_times_cache[t] = CachedResponseTimes(
-            response_times=copy(self.response_times), num_requests=self.num_requests,
-        )
-
-        # We'll use a cache size of CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW + 10 since - in the extreme case -
-        # we might still use response times (from the cache) for t-CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW-10
-        # to calculate the current response time percentile, if we're missing cached values for the subsequent
-        # 20 seconds
-        cache_size = CURRENT_RESPONSE_TIME_PERCENTILE_WINDOW + 10
-
-        if len(self.response_times_cache) > cache_size:
-            # only keep the latest 20 response_times dicts
-            for i in range(len(self.response_times_cache) - cache_size):
-                self.response_times_cache.popitem(last=False)
-
 
 class StatsError(object):
-    def __init__(self, method, name, error, occurrences=0):
+    def __init__(self, method, name, error, occurrences=0, error_margin=0):
         self.method = method
         self.name = name
         self.error = error
         self.occurrences = occurrences
+        # max number of the occurrences that may belong to other errors, that this error
+        # replaced when the number of errors was limited (see StatsErrors)
+        self.error_margin = error_margin
 
     @classmethod
     def parse_error(cls, error):
@@ -730,11 +1331,82 @@ class StatsError(object):
             "name": self.name,
             "error": StatsError.parse_error(self.error),
             "occurrences": self.occurrences,
+            "error_margin": self.error_margin,
         }
 
     @classmethod
     def from_dict(cls, data):
-        return cls(data["method"], data["name"], data["error"], data["occurrences"])
+        return cls(
+            data["method"],
+            data["name"],
+            data["error"],
+            data["occurrences"],
+            data.get("error_margin", 0),
+        )
+
+
+class StatsErrors(dict):
+    """
+    The :class:`StatsError` instances of a :class:`RequestStats`, by error key.
+
+    If *max_errors* is set, at most that many distinct errors are kept, using the Space-Saving
+    algorithm: once the limit has been reached, a new error replaces the error with the fewest
+    occurrences and takes over its count, which is recorded as the new error's error_margin.
+    The occurrences of an error are then at most error_margin more than its real number of
+    occurrences, errors that were kept from their first occurrence have exact counts, and any
+    error that makes up more than 1/max_errors of all the errors is guaranteed to be kept.
+    """
+
+    def __init__(self, max_errors=None):
+        super().__init__()
+        self.max_errors = max_errors
+        # (occurrences, key) of the errors. Occurrences only grow, so instead of updating the
+        # heap for every occurrence, outdated items are fixed when they reach the top.
+        self._heap = []
+
+    def add(self, key, method, name, error, occurrences=1, error_margin=0):
+        """
+        Add occurrences of an error, which replaces the least frequent error if the max number
+        of errors has been reached. Returns the StatsError.
+        """
+        entry = self.get(key)
+        if entry is not None:
+            entry.occurrences += occurrences
+            entry.error_margin += error_margin
+            return entry
+        if self.max_errors is not None and len(self) >= self.max_errors:
+            replaced = self._pop_least_frequent()
+            occurrences += replaced.occurrences
+            error_margin += replaced.occurrences
+        entry = self[key] = StatsError(method, name, error, occurrences, error_margin)
+        if self.max_errors is not None:
+            heappush(self._heap, (occurrences, key))
+        return entry
+
+    def _pop_least_frequent(self):
+        heap = self._heap
+        if len(heap) != len(self):
+            # errors have been added or removed without add(), or before max_errors was set
+            heap[:] = [(e.occurrences, key) for key, e in self.items()]
+            heapify(heap)
+        while True:
+            occurrences, key = heap[0]
+            entry = self.get(key)
+            if entry is None:
+                heappop(heap)
+            elif entry.occurrences == occurrences:
+                heappop(heap)
+                return self.pop(key)
+            else:
+                heapreplace(heap, (entry.occurrences, key))
+
+    def top(self, count=None):
+        """
+        Return the errors sorted by their number of occurrences (most frequent first), or the
+        *count* most frequent errors
+        """
+        errors = sorted(self.values(), key=lambda e: e.occurrences, reverse=True)
+        return errors if count is None else errors[:count]
 
 
 def avg(values):
@@ -753,36 +1425,80 @@ def median_from_dict(total, count):
         pos -= count[k]
 
 
+def format_status_codes(status_codes):
+    """
+    Format a {status: count} dict (see :attr:`StatsEntry.status_codes`) as a string like
+    "200:95 503:4 ConnectionError:1", with the HTTP status codes first
+    """
+    if not status_codes:
+        return ""
+    return " ".join(
+        "%s:%d" % item
+        for item in sorted(
+            status_codes.items(), key=lambda item: (isinstance(item[0], str), item[0])
+        )
+    )
+
+
+def format_response_time(response_time):
+    """
+    Format a response time (in milliseconds) for the console and CSV output. Response times
+    below 10 ms that aren't whole milliseconds are shown with two decimals, and longer ones
+    as whole milliseconds.
+    """
+    if response_time < 10 and response_time != int(response_time):
+        return "%.2f" % response_time
+    return "%d" % response_time
+
+
 def setup_distributed_stats_event_listeners(events, stats):
     def on_report_to_master(client_id, data):
-        data["stats"] = stats.serialize_stats()
+        stats.flush_buffer()
+        # the Aggregated entry is reported first, since it may be merged from the other entries
         data["stats_total"] = stats.total.get_stripped_report()
+        data["stats"] = stats.serialize_stats()
         data["errors"] = stats.serialize_errors()
-        stats.errors = {}
+        stats.errors = StatsErrors(stats.max_errors)
 
     def on_worker_report(client_id, data):
         for stats_data in data["stats"]:
-            entry = StatsEntry.unserialize(stats_data)
+            # reports in the compact stats report format are decoded into StatsEntry instances
+            if isinstance(stats_data, StatsEntry):
+                entry = stats_data
+            else:
+                entry = StatsEntry.unserialize(stats_data)
+            if stats.name_normalizer is not None or stats.max_entries is not None:
+                entry.name = stats._resolve_name(entry.name, entry.method)
             request_key = (entry.name, entry.method)
             if not request_key in stats.entries:
                 stats.entries[request_key] = StatsEntry(
                     stats, entry.name, entry.method, use_response_times_cache=True
                 )
             stats.entries[request_key].extend(entry)
+        stats._version += 1
 
         for error_key, error in data["errors"].items():
-            if error_key not in stats.errors:
-                stats.errors[error_key] = StatsError.from_dict(error)
-            else:
-                stats.errors[error_key].occurrences += error["occurrences"]
+            stats.errors.add(
+                error_key,
+                error["method"],
+                error["name"],
+                error["error"],
+                error["occurrences"],
+                error.get("error_margin", 0),
+            )
 
-        stats.total.extend(StatsEntry.unserialize(data["stats_total"]))
+        if not stats.aggregate_on_demand:
+            total = data["stats_total"]
+            if not isinstance(total, StatsEntry):
+                total = StatsEntry.unserialize(total)
+            stats.total.extend(total)
 
     events.report_to_master.add_listener(on_report_to_master)
     events.worker_report.add_listener(on_worker_report)
 
 
 def print_stats(stats, current=True):
+    stats.flush_buffer()
     console_logger.info(
         (" %-" + str(STATS_NAME_WIDTH) + "s %7s %12s %7s %7s %7s  | %7s %7s %7s")
         % (
@@ -807,6 +1523,7 @@ def print_stats(stats, current=True):
 
 
 def print_percentile_stats(stats):
+    stats.flush_buffer()
     console_logger.info("Percentage of the requests completed within given times")
     console_logger.info(
         (
@@ -846,13 +1563,18 @@ def print_percentile_stats(stats):
 
 
 def print_error_report(stats):
+    stats.flush_buffer()
     if not len(stats.errors):
         return
     console_logger.info("Error report")
     console_logger.info(" %-18s %-100s" % ("# occurrences", "Error"))
     console_logger.info("-" * (80 + STATS_NAME_WIDTH))
-    for error in stats.errors.values():
-        console_logger.info(" %-18i %-100s" % (error.occurrences, error.to_name()))
+    for error in stats.errors.top():
+        occurrences = "%i" % error.occurrences
+        if error.error_margin:
+            # the count may include occurrences of errors that this error replaced
+            occurrences = "~" + occurrences
+        console_logger.info(" %-18s %-100s" % (occurrences, error.to_name()))
     console_logger.info("-" * (80 + STATS_NAME_WIDTH))
     console_logger.info("")
 
@@ -866,35 +1588,110 @@ def stats_printer(stats):
     return stats_printer_func
 
 
-def stats_writer(environment, base_filepath, full_history=False):
-    """Writes the csv files for the locust run."""
-    with open(base_filepath + "_stats_history.csv", "w") as f:
-        f.write(stats_history_csv_header())
+def stats_writer(environment, base_filepath, full_history=False, history_store=None):
+    """
+    Writes the csv files for the locust run. If *history_store* is set, the stats history
+    is appended to that :class:`StatsHistoryStore <locust.history.StatsHistoryStore>`
+    instead of the _stats_history.csv file.
+    """
+    if history_store is None:
+        with open(base_filepath + "_stats_history.csv", "w") as f:
+            f.write(stats_history_csv_header())
+    writer = StatsCSVFileWriter(environment, base_filepath, full_history, history_store)
     while True:
-        write_csv_files(environment, base_filepath, full_history)
+        writer.write()
         gevent.sleep(CSV_STATS_INTERVAL_SEC)
 
 
-def write_csv_files(environment, base_filepath, full_history=False):
+def write_csv_files(environment, base_filepath, full_history=False, history_store=None):
     """Writes the requests, distribution, and failures csvs."""
-    with open(base_filepath + "_stats.csv", "w") as f:
-        csv_writer = csv.writer(f)
-        requests_csv(environment.stats, csv_writer)
+    StatsCSVFileWriter(environment, base_filepath, full_history, history_store).write()
+
+
+class StatsCSVFileWriter(object):
+    """
+    Writes the _stats.csv, _stats_history.csv and _failures.csv files of a test run.
+
+    Meant to be called repeatedly: the rows of stats entries that haven't changed since the
+    last write are reused, so their percentiles aren't recalculated. The Requests/s and
+    Failures/s columns of every row depend on the time of the last request of any entry though,
+    so _stats.csv is rewritten whenever a request has been logged since the last write, and
+    only skipped for intervals without any requests. _failures.csv is only rewritten when
+    its rows have changed. Both are written to a temporary file that's then renamed, so that
+    they're never read while half written.
+    """
+
+    def __init__(
+        self, environment, base_filepath, full_history=False, history_store=None
+    ):
+        self.environment = environment
+        self.base_filepath = base_filepath
+        self.full_history = full_history
+        self.history_store = history_store
+        self._row_cache = {}
+        self._stats_version = None
+        self._failure_rows = None
+
+    def write(self):
+        stats = self.environment.stats
+        stats.flush_buffer()
+        # the stats version is incremented for every change to the stats, including the
+        # last request timestamp that the requests/s columns of all rows are calculated from,
+        # so the file is only skipped when no requests have been logged since the last write
+        if stats._version != self._stats_version:
+            with _atomic_open(self.base_filepath + "_stats.csv") as f:
+                requests_csv(stats, csv.writer(f), self._row_cache)
+            self._stats_version = stats._version
+
+        if self.history_store is not None:
+            self.history_store.append(self.environment, self.full_history)
+        else:
+            with open(self.base_filepath + "_stats_history.csv", "a") as f:
+                f.write(stats_history_csv(self.environment, self.full_history) + "\n")
 
-    with open(base_filepath + "_stats_history.csv", "a") as f:
-        f.write(stats_history_csv(environment, full_history) + "\n")
+        failure_rows = failures_csv_rows(stats)
+        if failure_rows != self._failure_rows:
+            with _atomic_open(self.base_filepath + "_failures.csv") as f:
+                csv_writer = csv.writer(f)
+                csv_writer.writerow(FAILURES_CSV_HEADER)
+                csv_writer.writerows(failure_rows)
+            self._failure_rows = failure_rows
 
-    with open(base_filepath + "_failures.csv", "w") as f:
-        csv_writer = csv.writer(f)
-        failures_csv(environment.stats, csv_writer)
+
+class _atomic_open(object):
+    """
+    Context manager that opens a temporary file for writing, which replaces *filename* once
+    it has been written and closed
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.temp_filename = filename + ".tmp"
+
+    def __enter__(self):
+        self.file = open(self.temp_filename, "w")
+        return self.file
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.file.close()
+        if exc_type is None:
+            os.replace(self.temp_filename, self.filename)
+        else:
+            os.remove(self.temp_filename)
 
 
 def sort_stats(stats):
     return [stats[key] for key in sorted(stats.keys())]
 
 
-def requests_csv(stats, csv_writer):
-    """Returns the contents of the 'requests' & 'distribution' tab as CSV."""
+def requests_csv(stats, csv_writer, row_cache=None):
+    """
+    Returns the contents of the 'requests' & 'distribution' tab as CSV.
+
+    If a *row_cache* dict is given, the rows of stats entries that haven't changed since the
+    last call with the same dict are reused, instead of recalculating their percentiles.
+    """
+    stats.flush_buffer()
     csv_writer.writerow(
         [
             "Type",
@@ -920,33 +1717,59 @@ def requests_csv(stats, csv_writer):
             "99.99%",
             "99.999%",
             "100%",
+            "Status Codes",
         ]
     )
 
+    # the requests/s columns are calculated like StatsEntry.total_rps, from the time of the
+    # last request of any entry, so they change even if the entry hasn't
+    last_request_timestamp = stats.last_request_timestamp
+    start_time = stats.start_time
+    duration = 0
+    if last_request_timestamp and start_time:
+        duration = last_request_timestamp - start_time
+    rows = {}
     for s in chain(sort_stats(stats.entries), [stats.total]):
-        if s.num_requests:
-            percentile_row = [
-                int(s.get_response_time_percentile(x) or 0)
-                for x in PERCENTILES_TO_REPORT
+        key = (s.name, s.method)
+        # the response time columns only change when response times are logged, which
+        # increments the entry's version (and reset() sets a new start time)
+        version = (s.num_requests, s.num_failures, s._version, s.start_time)
+        cached = row_cache.get(key) if row_cache is not None else None
+        if cached is not None and cached[0] is s and cached[1] == version:
+            stats_row, percentile_row = cached[2]
+        else:
+            if s.num_requests:
+                percentile_row = [
+                    format_response_time(p or 0)
+                    for p in s.get_response_time_percentiles()
+                ]
+            else:
+                percentile_row = ["N/A"] * len(PERCENTILES_TO_REPORT)
+            stats_row = [
+                s.method,
+                s.name,
+                s.num_requests,
+                s.num_failures,
+                s.median_response_time,
+                s.avg_response_time,
+                s.min_response_time or 0,
+                s.max_response_time,
+                s.avg_content_length,
             ]
+        rows[key] = (s, version, (stats_row, percentile_row))
+
+        if duration:
+            rates = [s.num_requests / duration, s.num_failures / duration]
         else:
-            percentile_row = ["N/A"] * len(PERCENTILES_TO_REPORT)
-
-        stats_row = [
-            s.method,
-            s.name,
-            s.num_requests,
-            s.num_failures,
-            s.median_response_time,
-            s.avg_response_time,
-            s.min_response_time or 0,
-            s.max_response_time,
-            s.avg_content_length,
-            s.total_rps,
-            s.total_fail_per_sec,
-        ]
+            rates = [0.0, 0.0]
+        csv_writer.writerow(
+            stats_row + rates + percentile_row + [format_status_codes(s._status_codes)]
+        )
 
-        csv_writer.writerow(stats_row + percentile_row)
+    if row_cache is not None:
+        # drop the rows of entries that no longer exist
+        row_cache.clear()
+        row_cache.update(rows)
 
 
 def stats_history_csv_header():
@@ -993,6 +1816,7 @@ def stats_history_csv(environment, all_entries=False):
     will be included.
     """
     stats = environment.stats
+    stats.flush_buffer()
     timestamp = int(time.time())
     stats_entries = []
     if all_entries:
@@ -1001,25 +1825,18 @@ def stats_history_csv(environment, all_entries=False):
     rows = []
     for s in chain(stats_entries, [stats.total]):
         if s.num_requests:
-            percentile_str = ",".join(
-                [
-                    str(int(s.get_current_response_time_percentile(x) or 0))
-                    for x in PERCENTILES_TO_REPORT
-                ]
-            )
+            percentiles = s.get_current_response_time_percentiles()
         else:
-            percentile_str = ",".join(['"N/A"'] * len(PERCENTILES_TO_REPORT))
-
+            percentiles = None
         rows.append(
-            '"%i","%i","%s","%s",%.2f,%.2f,%s,%i,%i,%i,%i,%i,%i,%i'
-            % (
+            stats_history_csv_row(
                 timestamp,
                 environment.runner.user_count,
-                s.method or "",
+                s.method,
                 s.name,
                 s.current_rps,
                 s.current_fail_per_sec,
-                percentile_str,
+                percentiles,
                 s.num_requests,
                 s.num_failures,
                 s.median_response_time,
@@ -1033,13 +1850,59 @@ def stats_history_csv(environment, all_entries=False):
     return "\n".join(rows)
 
 
-def failures_csv(stats, csv_writer):
-    """"Return the contents of the 'failures' tab as a CSV."""
-    csv_writer.writerow(
-        ["Method", "Name", "Error", "Occurrences",]
+def stats_history_csv_row(
+    timestamp,
+    user_count,
+    method,
+    name,
+    current_rps,
+    current_fail_per_sec,
+    percentiles,
+    num_requests,
+    num_failures,
+    median_response_time,
+    avg_response_time,
+    min_response_time,
+    max_response_time,
+    avg_content_length,
+):
+    """
+    Format a row of the stats history CSV. *percentiles* is a list with the current response
+    time of each of the PERCENTILES_TO_REPORT, or None if there aren't any.
+    """
+    if percentiles is not None:
+        percentile_str = ",".join([format_response_time(p or 0) for p in percentiles])
+    else:
+        percentile_str = ",".join(['"N/A"'] * len(PERCENTILES_TO_REPORT))
+    return '"%i","%i","%s","%s",%.2f,%.2f,%s,%i,%i,%s,%s,%s,%s,%i' % (
+        timestamp,
+        user_count,
+        method or "",
+        name,
+        current_rps,
+        current_fail_per_sec,
+        percentile_str,
+        num_requests,
+        num_failures,
+        format_response_time(median_response_time),
+        format_response_time(avg_response_time),
+        format_response_time(min_response_time),
+        format_response_time(max_response_time),
+        avg_content_length,
     )
 
-    for s in sort_stats(stats.errors):
-        csv_writer.writerow(
-            [s.method, s.name, s.error, s.occurrences,]
-        )
+
+FAILURES_CSV_HEADER = ["Method", "Name", "Error", "Occurrences"]
+
+
+def failures_csv_rows(stats):
+    stats.flush_buffer()
+    return [
+        [s.method, s.name, s.error, s.occurrences] for s in sort_stats(stats.errors)
+    ]
+
+
+def failures_csv(stats, csv_writer):
+    """"Return the contents of the 'failures' tab as a CSV."""
+    csv_writer.writerow(FAILURES_CSV_HEADER)
+    csv_writer.writerows(failures_csv_rows(stats))
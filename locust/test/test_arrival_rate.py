@@ -0,0 +1,267 @@
+import mock
+
+import gevent
+from gevent.monkey import get_original
+
+from locust import TaskSet, User, task, constant
+from locust.arrival_rate import (
+    ArrivalRateScheduler,
+    ArrivalRateStats,
+    print_arrival_rate_stats,
+)
+from locust.env import Environment
+from locust.exception import LocustError, StopUser
+from locust.test.testcases import LocustTestCase
+
+
+class TestArrivalRateStats(LocustTestCase):
+    def test_log(self):
+        stats = ArrivalRateStats()
+        stats.log(0.001)
+        stats.log(0.2)
+        stats.log(0.01, missed=True)
+        # the missed starts aren't counted as started
+        self.assertEqual([2, 1, 1, 0.2], stats.serialize())
+
+    def test_extend(self):
+        stats = ArrivalRateStats.unserialize([10, 1, 2, 0.1])
+        stats.extend(ArrivalRateStats.unserialize([5, 2, 0, 0.3]))
+        self.assertEqual([15, 3, 2, 0.3], stats.serialize())
+        stats.reset()
+        self.assertEqual([0, 0, 0, 0.0], stats.serialize())
+
+    def test_print_arrival_rate_stats(self):
+        print_arrival_rate_stats(
+            {"MyUser": ArrivalRateStats.unserialize([5, 1, 2, 0.1])}
+        )
+        info_logs = self.mocked_log.info
+        self.assertIn("Arrival rate task starts", info_logs)
+        self.assertTrue(any("MyUser" in line and "0.100" in line for line in info_logs))
+
+
+class TestArrivalRateScheduler(LocustTestCase):
+    def test_rate(self):
+        executions = []
+
+        class MyUser(User):
+            arrival_rate = 100
+
+            @task
+            def my_task(self):
+                executions.append(self)
+
+        stats = ArrivalRateStats()
+        scheduler = ArrivalRateScheduler(self.environment, MyUser, stats)
+        scheduler.start()
+        gevent.sleep(0.5)
+        scheduler.stop()
+        # the first task is started right away
+        self.assertAlmostEqual(51, stats.num_starts, delta=3)
+        # the last task may not have run before the scheduler was stopped
+        self.assertAlmostEqual(stats.num_starts, len(executions), delta=1)
+        self.assertEqual(0, stats.num_missed)
+
+    def test_users_are_reused(self):
+        executions = []
+
+        class MyUser(User):
+            arrival_rate = 100
+
+            @task
+            def my_task(self):
+                executions.append(self)
+
+        scheduler = ArrivalRateScheduler(self.environment, MyUser, ArrivalRateStats())
+        for _ in range(5):
+            scheduler._start_task(0)
+            scheduler.task_greenlets.join()
+        # each task finished before the next one was started, so the same user ran all of them
+        self.assertEqual(5, len(executions))
+        self.assertEqual(1, len(set(executions)))
+        self.assertEqual(1, len(scheduler.users))
+
+    def test_share(self):
+        class MyUser(User):
+            arrival_rate = 100
+
+            @task
+            def my_task(self):
+                pass
+
+        stats = ArrivalRateStats()
+        scheduler = ArrivalRateScheduler(self.environment, MyUser, stats, share=0.25)
+        scheduler.start()
+        gevent.sleep(0.5)
+        scheduler.stop()
+        self.assertAlmostEqual(13, stats.num_starts, delta=2)
+
+    def test_rate_function(self):
+        class MyUser(User):
+            arrival_rate = lambda elapsed: 0 if elapsed < 0.2 else 50
+
+            @task
+            def my_task(self):
+                pass
+
+        stats = ArrivalRateStats()
+        scheduler = ArrivalRateScheduler(self.environment, MyUser, stats)
+        with mock.patch("locust.arrival_rate.ARRIVAL_RATE_CHECK_INTERVAL", new=0.05):
+            scheduler.start()
+            gevent.sleep(0.6)
+            scheduler.stop()
+        self.assertAlmostEqual(19, stats.num_starts, delta=3)
+
+    def test_pool_grows_up_to_max_users(self):
+        on_start_calls = []
+        on_stop_calls = []
+
+        class MyUser(User):
+            arrival_rate = 100
+            arrival_rate_max_users = 10
+
+            def on_start(self):
+                on_start_calls.append(self)
+
+            def on_stop(self):
+                on_stop_calls.append(self)
+
+            @task
+            def my_task(self):
+                # slower than the arrival rate, so the tasks run concurrently
+                gevent.sleep(0.3)
+
+        stats = ArrivalRateStats()
+        scheduler = ArrivalRateScheduler(self.environment, MyUser, stats)
+        scheduler.start()
+        gevent.sleep(0.25)
+        self.assertEqual(10, len(scheduler.users))
+        self.assertEqual(10, len(on_start_calls))
+        # the starts that found all the users busy were missed instead of waiting for a user
+        self.assertEqual(10, stats.num_starts)
+        self.assertGreater(stats.num_missed, 10)
+        scheduler.stop(timeout=1)
+        self.assertEqual(10, len(on_stop_calls))
+        self.assertEqual(0, len(scheduler.task_greenlets))
+
+    def test_late_starts(self):
+        class MyUser(User):
+            arrival_rate = 100
+
+            @task
+            def my_task(self):
+                pass
+
+        stats = ArrivalRateStats()
+        scheduler = ArrivalRateScheduler(self.environment, MyUser, stats)
+        scheduler.start()
+        gevent.sleep(0.05)
+        # block the event loop, so that the scheduler falls behind
+        get_original("time", "sleep")(0.2)
+        gevent.sleep(0.05)
+        scheduler.stop()
+        self.assertGreater(stats.num_late, 10)
+        self.assertGreater(stats.max_delay, 0.15)
+
+    def test_stop_user(self):
+        class MyUser(User):
+            arrival_rate = 100
+
+            @task
+            def my_task(self):
+                raise StopUser()
+
+        stats = ArrivalRateStats()
+        scheduler = ArrivalRateScheduler(self.environment, MyUser, stats)
+        scheduler.start()
+        gevent.sleep(0.1)
+        scheduler.stop()
+        self.assertGreater(stats.num_starts, 5)
+        self.assertEqual(set(), scheduler.users)
+
+    def test_task_exception(self):
+        class MyUser(User):
+            arrival_rate = 100
+
+            @task
+            def my_task(self):
+                raise ValueError("oops")
+
+        errors = []
+        self.environment.events.user_error.add_listener(
+            lambda user_instance, exception, tb: errors.append(exception)
+        )
+        self.environment.catch_exceptions = True
+        stats = ArrivalRateStats()
+        scheduler = ArrivalRateScheduler(self.environment, MyUser, stats)
+        for _ in range(3):
+            scheduler._start_task(0)
+            scheduler.task_greenlets.join()
+        self.assertEqual(3, len(errors))
+        # the user is put back in the pool after the exception has been logged
+        self.assertEqual(1, len(scheduler.users))
+        scheduler.stop()
+
+        self.environment.catch_exceptions = False
+        scheduler = ArrivalRateScheduler(self.environment, MyUser, stats)
+        with mock.patch("sys.stderr"):
+            for _ in range(3):
+                scheduler._start_task(0)
+                scheduler.task_greenlets.join()
+        self.assertEqual(6, len(errors))
+        # the users whose task raised an exception aren't reused
+        self.assertEqual(set(), scheduler.users)
+
+    def test_taskset_tasks(self):
+        class MyTaskSet(TaskSet):
+            @task
+            def my_task(self):
+                pass
+
+        class MyUser(User):
+            arrival_rate = 100
+            tasks = [MyTaskSet]
+
+        # a nested TaskSet would keep the user busy until it's interrupted
+        self.assertRaises(
+            LocustError,
+            ArrivalRateScheduler,
+            self.environment,
+            MyUser,
+            ArrivalRateStats(),
+        )
+
+
+class TestArrivalRateRunner(LocustTestCase):
+    def test_local_runner(self):
+        class ClosedUser(User):
+            wait_time = constant(1)
+
+            @task
+            def my_task(self):
+                pass
+
+        class OpenUser(User):
+            arrival_rate = 100
+
+            @task
+            def my_task(self):
+                pass
+
+        environment = Environment(user_classes=[ClosedUser, OpenUser])
+        runner = environment.create_local_runner()
+        runner.start(user_count=3, hatch_rate=100, wait=False)
+        runner.hatching_greenlet.join()
+        # users are only hatched for the user classes without an arrival rate
+        self.assertEqual({ClosedUser: 3}, runner.user_classes_count)
+        self.assertEqual([OpenUser], list(runner.arrival_rate_schedulers))
+        gevent.sleep(0.3)
+        runner.stop()
+        self.assertEqual({}, runner.arrival_rate_schedulers)
+        stats = runner.arrival_rate_stats["OpenUser"]
+        self.assertAlmostEqual(31, stats.num_starts, delta=3)
+
+        # the stats are reset when a new test is started
+        runner.start(user_count=3, hatch_rate=100, wait=False)
+        runner.hatching_greenlet.join()
+        self.assertLess(runner.arrival_rate_stats["OpenUser"].num_starts, 5)
+        runner.quit()
@@ -46,6 +46,17 @@ class TestHttpSession(WebserverTestCase):
             except KeyError:
                 self.fail("Invalid URL %s was not propagated" % url)
 
+    def test_response_time_is_fractional(self):
+        response_times = []
+        self.environment.events.request_success.add_listener(
+            lambda response_time, **kwargs: response_times.append(response_time)
+        )
+        s = self.get_client()
+        s.get("/ultra_fast")
+        self.assertEqual(1, len(response_times))
+        self.assertIsInstance(response_times[0], float)
+        self.assertGreater(response_times[0], 0)
+
     def test_streaming_response(self):
         """
         Test a request to an endpoint that returns a streaming response
@@ -1,5 +1,6 @@
 import socket
 import gevent
+import mock
 from tempfile import NamedTemporaryFile
 
 from locust.user import task, TaskSet
@@ -35,6 +36,63 @@ class TestFastHttpSession(WebserverTestCase):
             )
         )
 
+    def test_connection_timings(self):
+        s = FastHttpSession(
+            self.environment,
+            "http://127.0.0.1:%i" % self.port,
+            connection_timings=True,
+        )
+        timings = []
+        self.environment.events.request_success.add_listener(
+            lambda connection_timings, **kwargs: timings.append(connection_timings)
+        )
+        s.get("/ultra_fast")
+        s.get("/slow")
+        self.assertEqual(["connect", "download", "ttfb"], sorted(timings[0]))
+        # the second request reuses the connection
+        self.assertEqual(["download", "ttfb"], sorted(timings[1]))
+        self.assertGreater(timings[1]["ttfb"], 400)
+
+        entry = self.runner.stats.get("/slow", "GET")
+        self.assertEqual(0, entry.num_new_connections)
+        self.assertEqual(1, entry.num_reused_connections)
+        self.assertGreater(entry.get_phase_time_percentile("ttfb", 0.5), 400)
+        self.assertEqual(None, entry.get_phase_time_percentile("connect", 0.5))
+        total = self.runner.stats.total
+        self.assertEqual(1, total.num_new_connections)
+        self.assertEqual(1, total.num_reused_connections)
+        self.assertEqual(1, total.phase_times["connect"].count)
+
+    def test_connection_timings_with_untimeable_pool(self):
+        s = FastHttpSession(
+            self.environment,
+            "http://127.0.0.1:%i" % self.port,
+            connection_timings=True,
+        )
+        # e.g. a geventhttpclient version with other connection pool internals
+        with mock.patch.object(
+            s.client, "_time_connection_pool", return_value=False
+        ) as time_connection_pool:
+            s.get("/ultra_fast")
+            s.get("/ultra_fast")
+        self.assertEqual(1, time_connection_pool.call_count)
+        entry = self.runner.stats.get("/ultra_fast", "GET")
+        self.assertEqual(2, entry.num_requests)
+        self.assertEqual(0, entry.num_new_connections + entry.num_reused_connections)
+        self.assertEqual({}, entry.phase_times)
+
+    def test_untimeable_pool_is_left_alone(self):
+        s = FastHttpSession(self.environment, "http://127.0.0.1:%i" % self.port)
+        pool = object()
+        self.assertFalse(s.client._time_connection_pool(pool))
+
+    def test_no_connection_timings_by_default(self):
+        s = FastHttpSession(self.environment, "http://127.0.0.1:%i" % self.port)
+        s.get("/ultra_fast")
+        entry = self.runner.stats.get("/ultra_fast", "GET")
+        self.assertEqual(0, entry.num_new_connections + entry.num_reused_connections)
+        self.assertEqual({}, entry.phase_times)
+
     def test_404(self):
         s = FastHttpSession(self.environment, "http://127.0.0.1:%i" % self.port)
         r = s.get("/does_not_exist")
@@ -50,6 +108,17 @@ class TestFastHttpSession(WebserverTestCase):
         self.assertEqual(1, self.runner.stats.get("/status/204", "GET").num_requests)
         self.assertEqual(0, self.runner.stats.get("/status/204", "GET").num_failures)
 
+    def test_response_time_is_fractional(self):
+        response_times = []
+        self.environment.events.request_success.add_listener(
+            lambda response_time, **kwargs: response_times.append(response_time)
+        )
+        s = FastHttpSession(self.environment, "http://127.0.0.1:%i" % self.port)
+        s.get("/ultra_fast")
+        self.assertEqual(1, len(response_times))
+        self.assertIsInstance(response_times[0], float)
+        self.assertGreater(response_times[0], 0)
+
     def test_streaming_response(self):
         """
         Test a request to an endpoint that returns a streaming response
@@ -270,6 +339,25 @@ class TestRequestStatsWithWebserver(WebserverTestCase):
         self.assertEqual(response.status_code, 0)
         self.assertEqual(1, self.runner.stats.get("/", "GET").num_failures)
         self.assertEqual(1, self.runner.stats.get("/", "GET").num_requests)
+        # requests that didn't get a response are counted per exception class
+        ((status, count),) = self.runner.stats.get("/", "GET").status_codes.items()
+        self.assertIsInstance(status, str)
+        self.assertEqual(1, count)
+
+    def test_request_stats_status_codes(self):
+        class MyUser(FastHttpUser):
+            host = "http://127.0.0.1:%i" % self.port
+
+        locust = MyUser(self.environment)
+        locust.client.get("/ultra_fast")
+        locust.client.get("/ultra_fast")
+        locust.client.get("/fail", name="/ultra_fast")
+        with locust.client.get("/fail", catch_response=True) as response:
+            response.success()
+        self.assertEqual(
+            {200: 2, 500: 1}, self.runner.stats.get("/ultra_fast", "GET").status_codes
+        )
+        self.assertEqual({500: 1}, self.runner.stats.get("/fail", "GET").status_codes)
 
 
 class TestFastHttpUserClass(WebserverTestCase):
@@ -473,7 +561,9 @@ class TestFastHttpCatchResponse(WebserverTestCase):
         self.num_failures = 0
         self.num_success = 0
 
-        def on_failure(request_type, name, response_time, response_length, exception):
+        def on_failure(
+            request_type, name, response_time, response_length, exception, **kwargs
+        ):
             self.num_failures += 1
             self.last_failure_exception = exception
 
@@ -603,3 +693,14 @@ class TestFastHttpSsl(LocustTestCase):
         r = s.get("/")
         self.assertEqual(200, r.status_code)
         self.assertIn("<title>Locust</title>", r.content.decode("utf-8"))
+
+    def test_tls_handshake_timing(self):
+        s = FastHttpSession(
+            self.environment,
+            "https://127.0.0.1:%i" % self.web_port,
+            insecure=True,
+            connection_timings=True,
+        )
+        s.get("/")
+        phase_times = self.runner.stats.get("/", "GET").phase_times
+        self.assertEqual(["connect", "download", "tls", "ttfb"], sorted(phase_times))
@@ -0,0 +1,264 @@
+import unittest
+from copy import copy
+
+from locust.histogram import (
+    DDSketchHistogram,
+    LogLinearHistogram,
+    RoundedHistogram,
+    calculate_percentiles,
+)
+from locust.rpc.protocol import Message
+from locust.stats import RequestStats, StatsEntry
+
+
+class TestCalculatePercentiles(unittest.TestCase):
+    def test_single_walk(self):
+        items = [(x, 1) for x in range(100)]
+        self.assertEqual(
+            [95, 50, 99, 0, 60],
+            calculate_percentiles(items, 100, (0.95, 0.5, 1.0, 0, 0.6)),
+        )
+
+    def test_no_samples(self):
+        self.assertEqual([0, 0], calculate_percentiles([], 0, (0.5, 1.0)))
+
+
+class TestRoundedHistogram(unittest.TestCase):
+    def test_record_rounds_response_times(self):
+        h = RoundedHistogram()
+        h.record(45)
+        h.record(147)
+        h.record(3432)
+        h.record(58760)
+        h.record(44.6)
+        self.assertEqual({45: 2, 150: 1, 3400: 1, 59000: 1}, h)
+        self.assertEqual(5, h.count)
+
+    def test_record_keeps_fraction_of_fast_response_times(self):
+        h = RoundedHistogram()
+        h.record(0.347)
+        h.record(0.3512)
+        h.record(4.63)
+        h.record(9.99)
+        self.assertEqual({0.35: 2, 4.6: 1, 10: 1}, h)
+        self.assertEqual(0.35, h.percentile(0.25))
+
+    def test_percentile(self):
+        h = RoundedHistogram()
+        for x in range(100):
+            h.record(x)
+        self.assertEqual(50, h.percentile(0.5))
+        self.assertEqual(95, h.percentile(0.95))
+        self.assertEqual(99, h.percentile(1.0))
+        self.assertEqual(0, RoundedHistogram().percentile(0.5))
+
+    def test_merge(self):
+        h1 = RoundedHistogram()
+        h1.record(10)
+        h2 = RoundedHistogram()
+        h2.record(10)
+        h2.record(150)
+        h1.merge(h2)
+        h1.merge({150: 2})
+        self.assertEqual({10: 2, 150: 3}, h1)
+
+
+class TestLogLinearHistogram(unittest.TestCase):
+    def test_exact_below_sub_bucket_count(self):
+        h = LogLinearHistogram(significant_digits=2, resolution=1)
+        for x in range(256):
+            h.record(x)
+        self.assertEqual(list(range(256)), list(h.keys()))
+        self.assertEqual(256, h.count)
+        self.assertEqual(256, len(h))
+
+    def test_relative_error(self):
+        for digits in (1, 2, 3):
+            h = LogLinearHistogram(significant_digits=digits)
+            for value in (0.0005, 0.3, 1.7, 45, 147, 3432, 58760, 3600000):
+                index = h.index_of(value)
+                reported = h.value_at(index)
+                self.assertEqual(index, h.index_of(reported))
+                self.assertLessEqual(
+                    abs(reported - value), value * 10 ** -digits + 0.001
+                )
+
+    def test_percentile(self):
+        h = LogLinearHistogram(resolution=1)
+        for x in range(100):
+            h.record(x)
+        self.assertEqual(50, h.percentile(0.5))
+        self.assertEqual(60, h.percentile(0.6))
+        self.assertEqual(95, h.percentile(0.95))
+        self.assertEqual(99, h.percentile(1.0))
+        self.assertEqual(0, LogLinearHistogram().percentile(0.5))
+
+    def test_percentile_of_large_values(self):
+        h = LogLinearHistogram(significant_digits=3)
+        for x in range(1, 1001):
+            h.record(x * 10.0)
+        self.assertAlmostEqual(5010, h.percentile(0.5), delta=5.01)
+        self.assertAlmostEqual(9910, h.percentile(0.99), delta=9.91)
+
+    def test_merge(self):
+        h1 = LogLinearHistogram()
+        h2 = LogLinearHistogram()
+        h1.record(12)
+        h2.record(12, count=2)
+        h2.record(123456)
+        h1.merge(h2)
+        self.assertEqual(4, h1.count)
+        self.assertEqual(3, h1[12])
+        self.assertEqual(1, h1[123456])
+        # merge histograms with different layouts, and plain dicts
+        h1.merge(RoundedHistogram({12: 1}))
+        h1.merge({12: 1})
+        h1.merge(LogLinearHistogram(significant_digits=3, resolution=0.1))
+        self.assertEqual(5, h1[12])
+        self.assertEqual(6, h1.count)
+
+    def test_copy(self):
+        h1 = LogLinearHistogram()
+        h1.record(1)
+        h2 = copy(h1)
+        h2.record(1)
+        self.assertEqual(1, h1[1])
+        self.assertEqual(2, h2[1])
+
+    def test_serialize(self):
+        h = LogLinearHistogram()
+        for x in (0.25, 12, 12, 999.5, 58760):
+            h.record(x)
+        data = Message.unserialize(
+            Message("dummy", h.serialize(), "none").serialize()
+        ).data
+        h2 = LogLinearHistogram()
+        h2.merge(data)
+        self.assertEqual(h.counts, h2.counts)
+
+    def test_stats_entry_with_log_linear_histogram(self):
+        stats = RequestStats(histogram_class=LogLinearHistogram)
+        for x in range(100):
+            stats.log_request("GET", "/", x, 0)
+        s = stats.get("/", "GET")
+        self.assertIsInstance(s.response_times, LogLinearHistogram)
+        self.assertAlmostEqual(49, s.median_response_time, delta=0.49)
+        self.assertAlmostEqual(95, s.get_response_time_percentile(0.95), delta=0.95)
+
+        master_stats = RequestStats(histogram_class=LogLinearHistogram)
+        master_entry = master_stats.get("/", "GET")
+        master_entry.extend(StatsEntry.unserialize(s.serialize()))
+        master_entry.extend(StatsEntry.unserialize(s.serialize()))
+        self.assertEqual(200, master_entry.response_times.count)
+        self.assertEqual(
+            s.get_response_time_percentile(0.95),
+            master_entry.get_response_time_percentile(0.95),
+        )
+
+
+class TestDDSketchHistogram(unittest.TestCase):
+    def test_relative_error(self):
+        for accuracy in (0.001, 0.01, 0.05):
+            h = DDSketchHistogram(relative_accuracy=accuracy)
+            for value in (0.0015, 0.3, 1.7, 45, 147, 3432, 58760, 3600000):
+                index = h.index_of(value)
+                reported = h.value_at(index)
+                self.assertEqual(index, h.index_of(reported))
+                self.assertLessEqual(abs(reported - value), value * accuracy)
+
+    def test_percentiles(self):
+        h = DDSketchHistogram(relative_accuracy=0.01)
+        for x in range(1, 10001):
+            h.record(x / 100.0)
+        self.assertEqual(10000, h.count)
+        for percent, expected in (
+            (0.5, 50.01),
+            (0.95, 95.01),
+            (0.999, 99.91),
+            (1.0, 100),
+        ):
+            self.assertAlmostEqual(
+                expected, h.percentile(percent), delta=expected * 0.01
+            )
+
+    def test_zero_and_small_values(self):
+        h = DDSketchHistogram(min_value=0.01)
+        h.record(0)
+        h.record(0.001)
+        h.record(5)
+        self.assertEqual([(0, 2)], h.items()[:1])
+        self.assertEqual(2, h[0])
+        self.assertEqual(3, h.count)
+        self.assertEqual(2, len(h))
+        self.assertEqual(0, h.percentile(0.5))
+
+    def test_max_buckets(self):
+        h = DDSketchHistogram(relative_accuracy=0.01, max_buckets=100)
+        for x in range(1, 100001):
+            h.record(x)
+        self.assertEqual(100, len(h.buckets))
+        self.assertEqual(100000, h.count)
+        # only the lowest percentiles lose accuracy
+        self.assertAlmostEqual(99000, h.percentile(0.99), delta=990)
+
+    def test_merge_and_subtract(self):
+        h1 = DDSketchHistogram()
+        h2 = DDSketchHistogram()
+        h1.record(12)
+        h2.record(12, count=2)
+        h2.record(0)
+        h2.record(123456)
+        h1.merge(h2)
+        self.assertEqual(5, h1.count)
+        self.assertEqual(3, h1[12])
+        self.assertEqual(1, h1[0])
+        h1.merge({12: 1})
+        h1.merge(LogLinearHistogram())
+        self.assertEqual(4, h1[12])
+        h1.subtract(h2)
+        self.assertEqual({12: 2}, dict((round(k), v) for k, v in h1.items()))
+        self.assertEqual(2, h1.count)
+
+    def test_copy(self):
+        h1 = DDSketchHistogram()
+        h1.record(1)
+        h2 = copy(h1)
+        h2.record(1)
+        self.assertEqual(1, h1[1])
+        self.assertEqual(2, h2[1])
+
+    def test_serialize(self):
+        h = DDSketchHistogram(relative_accuracy=0.02)
+        for x in (0, 0.25, 12, 12, 999.5, 58760):
+            h.record(x)
+        data = Message.unserialize(
+            Message("dummy", h.serialize(), "none").serialize()
+        ).data
+        h2 = DDSketchHistogram(relative_accuracy=0.02)
+        h2.merge(data)
+        self.assertEqual(h.buckets, h2.buckets)
+        self.assertEqual(h.zero_count, h2.zero_count)
+
+    def test_stats_entry_with_sketch(self):
+        stats = RequestStats(histogram_class=DDSketchHistogram)
+        s = stats.get("/", "GET")
+        # start keeping track of the current response times
+        s.get_current_response_time_percentile(0.5)
+        for x in range(100):
+            stats.log_request("GET", "/", x / 10.0, 0)
+        self.assertIsInstance(s.response_times, DDSketchHistogram)
+        self.assertAlmostEqual(4.9, s.median_response_time, delta=0.049)
+        self.assertAlmostEqual(9.5, s.get_response_time_percentile(0.95), delta=0.095)
+        self.assertAlmostEqual(
+            5.0, s.get_current_response_time_percentile(0.5), delta=0.05
+        )
+
+        master_stats = RequestStats(histogram_class=DDSketchHistogram)
+        master_entry = master_stats.get("/", "GET")
+        master_entry.extend(StatsEntry.unserialize(s.serialize()))
+        master_entry.extend(StatsEntry.unserialize(s.serialize()))
+        self.assertEqual(200, master_entry.response_times.count)
+        self.assertEqual(
+            s.get_response_time_percentile(0.95),
+            master_entry.get_response_time_percentile(0.95),
+        )
@@ -0,0 +1,132 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import locust.stats
+from locust.history import (
+    StatsHistoryStore,
+    read_stats_history,
+    write_stats_history_csv,
+)
+from locust.stats import stats_history_csv, stats_history_csv_header
+from locust.test.testcases import LocustTestCase
+
+
+@unittest.skipIf(numpy is None, "NumPy is needed to read the stats history store")
+class TestStatsHistoryStore(LocustTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.store_directory = os.path.join(self.directory, "test_stats_history")
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.directory)
+
+    def log_requests(self):
+        stats = self.environment.stats
+        stats.log_request("GET", "/", 10, 100)
+        stats.log_request("GET", "/", 0.5, 120)
+        stats.log_request("POST", "/login", 350, 0)
+        stats.log_error("POST", "/login", ValueError("fail"))
+
+    def test_append_and_read(self):
+        store = StatsHistoryStore(self.store_directory)
+        with mock.patch("time.time", return_value=1000.5):
+            store.append(self.environment, all_entries=True)
+        self.log_requests()
+        with mock.patch("time.time", return_value=1002.5):
+            store.append(self.environment, all_entries=True)
+        store.close()
+
+        columns, entries, percentiles = read_stats_history(self.store_directory)
+        self.assertEqual(locust.stats.PERCENTILES_TO_REPORT, percentiles)
+        self.assertEqual(
+            [(None, "Aggregated"), ("GET", "/"), ("POST", "/login")], entries
+        )
+        self.assertEqual([1000, 1002, 1002, 1002], columns["timestamp"].tolist())
+        self.assertEqual([0, 1, 2, 0], columns["entry_id"].tolist())
+        self.assertEqual([0, 2, 1, 3], columns["num_requests"].tolist())
+        self.assertEqual([0, 0, 1, 1], columns["num_failures"].tolist())
+        self.assertEqual(350, columns["max_response_time"][3])
+        self.assertEqual(0.5, columns["min_response_time"][1])
+        self.assertEqual(110, columns["avg_content_length"][1])
+        # entries without requests don't have any percentiles
+        self.assertTrue(numpy.isnan(columns["response_time_percentile_0.5"][0]))
+        self.assertEqual(350, columns["response_time_percentile_1"][3])
+
+    def test_rows_are_written_in_batches(self):
+        store = StatsHistoryStore(self.store_directory, flush_interval=3)
+        for i in range(2):
+            store.append(self.environment)
+        columns, _, _ = read_stats_history(self.store_directory)
+        self.assertEqual(0, len(columns["timestamp"]))
+        store.append(self.environment)
+        store.append(self.environment)
+        columns, _, _ = read_stats_history(self.store_directory)
+        self.assertEqual(3, len(columns["timestamp"]))
+        store.close()
+        columns, _, _ = read_stats_history(self.store_directory)
+        self.assertEqual(4, len(columns["timestamp"]))
+
+    def test_partially_written_batch(self):
+        store = StatsHistoryStore(self.store_directory)
+        store.append(self.environment)
+        store.close()
+        with open(os.path.join(self.store_directory, "timestamp.col"), "ab") as f:
+            f.write(b"\0" * 8)
+        columns, _, _ = read_stats_history(self.store_directory)
+        self.assertEqual(1, len(columns["timestamp"]))
+        self.assertEqual(1, len(columns["num_requests"]))
+
+    def test_convert_to_csv(self):
+        store = StatsHistoryStore(self.store_directory)
+        expected = [stats_history_csv_header()]
+        with mock.patch("time.time", return_value=1000.5):
+            store.append(self.environment, all_entries=True)
+            expected.append(stats_history_csv(self.environment, True) + "\n")
+        self.log_requests()
+        with mock.patch("time.time", return_value=1002.5):
+            store.append(self.environment, all_entries=True)
+            expected.append(stats_history_csv(self.environment, True) + "\n")
+        store.close()
+
+        output = io.StringIO()
+        write_stats_history_csv(self.store_directory, output, batch_size=2)
+        self.assertEqual("".join(expected), output.getvalue())
+
+    def test_write_csv_files_with_history_store(self):
+        store = StatsHistoryStore(self.store_directory)
+        base_filepath = os.path.join(self.directory, "test")
+        self.log_requests()
+        locust.stats.write_csv_files(
+            self.environment, base_filepath, full_history=True, history_store=store
+        )
+        store.close()
+        self.assertTrue(os.path.exists(base_filepath + "_stats.csv"))
+        self.assertFalse(os.path.exists(base_filepath + "_stats_history.csv"))
+        columns, _, _ = read_stats_history(self.store_directory)
+        self.assertEqual(3, len(columns["timestamp"]))
+
+    def test_convert_with_locust_report(self):
+        from locust import report
+
+        store = StatsHistoryStore(self.store_directory)
+        self.log_requests()
+        store.append(self.environment, all_entries=True)
+        store.close()
+        prefix = os.path.join(self.directory, "converted")
+        self.assertEqual(
+            0, report.main(["--convert-history", self.store_directory, "--csv", prefix])
+        )
+        with open(prefix + "_stats_history.csv") as f:
+            self.assertEqual(4, len(f.readlines()))
@@ -768,7 +768,9 @@ class TestCatchResponse(WebserverTestCase):
         self.num_failures = 0
         self.num_success = 0
 
-        def on_failure(request_type, name, response_time, response_length, exception):
+        def on_failure(
+            request_type, name, response_time, response_length, exception, **kwargs
+        ):
             self.num_failures += 1
             self.last_failure_exception = exception
 
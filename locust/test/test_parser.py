@@ -24,6 +24,46 @@ class TestParser(unittest.TestCase):
         opts = self.parser.parse_args(args)
         self.assertEqual(opts.reset_stats, True)
 
+    def test_normalize_names(self):
+        opts = self.parser.parse_args([])
+        self.assertEqual(opts.normalize_names, False)
+        self.assertEqual(opts.max_stats_entries, None)
+        opts = self.parser.parse_args(
+            ["--normalize-names", "--max-stats-entries", "500"]
+        )
+        self.assertEqual(opts.normalize_names, True)
+        self.assertEqual(opts.max_stats_entries, 500)
+
+    def test_max_errors(self):
+        opts = self.parser.parse_args([])
+        self.assertEqual(opts.max_errors, None)
+        opts = self.parser.parse_args(["--max-errors", "100"])
+        self.assertEqual(opts.max_errors, 100)
+
+    def test_stats_buffer_size(self):
+        opts = self.parser.parse_args([])
+        self.assertEqual(opts.stats_buffer_size, None)
+        opts = self.parser.parse_args(["--stats-buffer-size", "10000"])
+        self.assertEqual(opts.stats_buffer_size, 10000)
+
+    def test_aggregate_on_demand(self):
+        opts = self.parser.parse_args([])
+        self.assertEqual(opts.aggregate_on_demand, False)
+        opts = self.parser.parse_args(["--aggregate-on-demand"])
+        self.assertEqual(opts.aggregate_on_demand, True)
+
+    def test_record_samples(self):
+        opts = self.parser.parse_args([])
+        self.assertEqual(opts.record_samples, None)
+        opts = self.parser.parse_args(["--record-samples", "samples"])
+        self.assertEqual(opts.record_samples, "samples")
+
+    def test_binary_history(self):
+        opts = self.parser.parse_args([])
+        self.assertEqual(opts.binary_history, False)
+        opts = self.parser.parse_args(["--csv", "test", "--binary-history"])
+        self.assertEqual(opts.binary_history, True)
+
     def test_skip_log_setup(self):
         args = ["--skip-log-setup"]
         opts = self.parser.parse_args(args)
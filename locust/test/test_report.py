@@ -0,0 +1,231 @@
+import csv
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from locust.env import Environment
+from locust.event import Events
+from locust.samples import SampleRecorder
+from locust.stats import (
+    PERCENTILES_TO_REPORT,
+    RequestStats,
+    format_status_codes,
+    requests_csv,
+)
+
+if numpy is not None:
+    from locust import report
+
+
+def read_csv(filename):
+    with open(filename, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+@unittest.skipIf(numpy is None, "NumPy is needed for locust report")
+class TestSampleReport(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.environment = Environment(events=Events())
+        self.stats = RequestStats()
+        events = self.environment.events
+        events.request_success.add_listener(self.on_request_success)
+        events.request_failure.add_listener(self.on_request_failure)
+        self.recorder = SampleRecorder(self.environment, self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def on_request_success(
+        self, request_type, name, response_time, response_length, status=None, **kwargs
+    ):
+        self.stats.log_request(
+            request_type, name, response_time, response_length, status
+        )
+
+    def on_request_failure(
+        self,
+        request_type,
+        name,
+        response_time,
+        response_length,
+        exception,
+        status=None,
+        **kwargs
+    ):
+        self.stats.log_request(
+            request_type, name, response_time, response_length, status
+        )
+        self.stats.log_error(request_type, name, exception)
+
+    def fire_requests(self, count, seconds):
+        events = self.environment.events
+        for i in range(count):
+            with mock.patch("time.time", return_value=1000 + i * seconds / count):
+                if i % 10 == 9:
+                    events.request_failure.fire(
+                        request_type="POST",
+                        name="/fail",
+                        response_time=50 + i % 7,
+                        response_length=0,
+                        exception=ValueError("fail %i" % (i % 2)),
+                        status=503 if i % 3 else "ConnectionError",
+                    )
+                else:
+                    events.request_success.fire(
+                        request_type="GET",
+                        name="/item",
+                        response_time=(i * 7919) % 1000 + 0.25,
+                        response_length=100,
+                        status=200,
+                    )
+
+    def test_stats_match_request_stats(self):
+        self.fire_requests(2000, 20)
+        self.recorder.close()
+        prefix = os.path.join(self.directory, "report")
+        self.assertEqual(0, report.main([self.directory, "--csv", prefix]))
+
+        rows = {row["Name"]: row for row in read_csv(prefix + "_stats.csv")}
+        self.assertEqual(["/fail", "/item", "Aggregated"], list(rows))
+        for name, entry in [
+            ("/item", self.stats.get("/item", "GET")),
+            ("/fail", self.stats.get("/fail", "POST")),
+            ("Aggregated", self.stats.total),
+        ]:
+            row = rows[name]
+            self.assertEqual(entry.num_requests, int(row["Request Count"]))
+            self.assertEqual(entry.num_failures, int(row["Failure Count"]))
+            self.assertAlmostEqual(
+                entry.avg_response_time, float(row["Average Response Time"]), places=3
+            )
+            self.assertAlmostEqual(
+                entry.min_response_time, float(row["Min Response Time"])
+            )
+            self.assertAlmostEqual(
+                entry.max_response_time, float(row["Max Response Time"])
+            )
+            for percent in (0.5, 0.9, 0.99):
+                # the stats round response times to 2 significant digits, the report to 0.1%
+                self.assertAlmostEqual(
+                    entry.get_response_time_percentile(percent),
+                    float(row[report.percentile_column(percent)]),
+                    delta=entry.get_response_time_percentile(percent) * 0.01 + 1,
+                )
+            self.assertEqual(
+                format_status_codes(entry.status_codes), row["Status Codes"]
+            )
+        self.assertAlmostEqual(100, float(rows["Aggregated"]["Requests/s"]), delta=1)
+
+        history = read_csv(prefix + "_stats_history.csv")
+        aggregated = [row for row in history if row["Name"] == "Aggregated"]
+        self.assertEqual(["1000", "1010"], [r["Timestamp"] for r in aggregated])
+        self.assertEqual(
+            ["1000", "2000"], [r["Total Request Count"] for r in aggregated]
+        )
+
+        failures = read_csv(prefix + "_failures.csv")
+        self.assertEqual(
+            [("/fail", "ValueError('fail 1')", "200")],
+            [(r["Name"], r["Error"], r["Occurrences"]) for r in failures],
+        )
+        failures_history = read_csv(prefix + "_failures_history.csv")
+        self.assertEqual(["100", "100"], [r["Occurrences"] for r in failures_history])
+
+        summary = read_csv(prefix + "_summary.csv")
+        self.assertEqual("0.1000", summary[-1]["Failure Ratio"])
+
+    def test_requests_csv_columns(self):
+        # the report's stats CSV file has the same columns as the one written during a test
+        stats_csv = io.StringIO()
+        requests_csv(self.stats, csv.writer(stats_csv))
+        self.assertEqual(
+            next(csv.reader(io.StringIO(stats_csv.getvalue()))),
+            report.requests_csv_columns(PERCENTILES_TO_REPORT),
+        )
+
+    def test_window_and_percentiles(self):
+        self.fire_requests(1000, 60)
+        self.recorder.close()
+        prefix = os.path.join(self.directory, "report")
+        report.main(
+            [
+                self.directory,
+                "--csv",
+                prefix,
+                "--window",
+                "30",
+                "--percentiles",
+                "0.5,0.999",
+                "--start",
+                "29.99",
+            ]
+        )
+        rows = read_csv(prefix + "_stats.csv")
+        self.assertIn("99.9%", rows[0])
+        self.assertEqual("500", rows[-1]["Request Count"])
+        history = read_csv(prefix + "_stats_history.csv")
+        self.assertEqual(
+            ["1020", "1050"],
+            [r["Timestamp"] for r in history if r["Name"] == "Aggregated"],
+        )
+
+    def test_chunks(self):
+        self.fire_requests(1000, 20)
+        self.recorder.close()
+        results = []
+        for chunk_size in (None, 7):
+            sample_report = report.SampleReport(self.directory, chunk_size=chunk_size)
+            stats = sample_report.entry_stats()[-1]
+            results.append(
+                (
+                    stats["num_requests"].tolist(),
+                    stats["percentiles"].tolist(),
+                    stats["total_percentiles"].tolist(),
+                    sample_report.error_counts(),
+                )
+            )
+        self.assertEqual(results[0], results[1])
+
+    def test_no_samples(self):
+        self.recorder.close()
+        with mock.patch("sys.stderr", new=io.StringIO()) as stderr:
+            self.assertEqual(1, report.main([self.directory]))
+        self.assertIn("No recorded samples", stderr.getvalue())
+
+
+@unittest.skipIf(numpy is None, "NumPy is needed for locust report")
+class TestResampleStatsHistory(unittest.TestCase):
+    def test_resample(self):
+        columns = report.stats_history_csv_columns([0.5])
+        history = io.StringIO()
+        writer = csv.writer(history)
+        writer.writerow(columns)
+        for t in range(100, 130, 2):
+            row = dict.fromkeys(columns, "0")
+            row.update(
+                {
+                    "Timestamp": str(t),
+                    "Type": "GET",
+                    "Name": "/",
+                    "Total Request Count": str((t - 100) * 10),
+                    "Total Failure Count": str(t - 100),
+                }
+            )
+            writer.writerow([row[c] for c in columns])
+        history.seek(0)
+        output = io.StringIO()
+        report.resample_stats_history(history, csv.writer(output), 10)
+        output.seek(0)
+        rows = list(csv.DictReader(output))
+        self.assertEqual(["100", "110", "120"], [r["Timestamp"] for r in rows])
+        self.assertEqual(["80", "180", "280"], [r["Total Request Count"] for r in rows])
+        self.assertEqual(["10.00", "10.00", "10.00"], [r["Requests/s"] for r in rows])
@@ -1,4 +1,6 @@
 import mock
+import msgpack
+import time
 import unittest
 
 import gevent
@@ -12,6 +14,14 @@ from locust.user import User, TaskSet, task
 from locust.env import Environment
 from locust.exception import RPCError, StopUser
 from locust.rpc import Message
+from locust.histogram import DDSketchHistogram, LogLinearHistogram, RoundedHistogram
+from locust.rpc.stats_format import (
+    DDSKETCH_BUCKETS,
+    FLOAT_VALUES,
+    LOG_LINEAR_BUCKETS,
+    StatsReportDecoder,
+    StatsReportEncoder,
+)
 
 from locust.runners import (
     LocalRunner,
@@ -23,7 +33,7 @@ from locust.runners import (
     STATE_MISSING,
     STATE_STOPPED,
 )
-from locust.stats import RequestStats
+from locust.stats import RequestStats, setup_distributed_stats_event_listeners
 from locust.test.testcases import LocustTestCase
 
 
@@ -177,6 +187,179 @@ class TestLocustRunner(LocustTestCase):
         self.assertEqual(1, len(runner.weight_users(1)))
         self.assert_locust_class_distribution({L1: 1}, runner.weight_users(1))
 
+    def test_distribute_users(self):
+        class BaseUser(User):
+            pass
+
+        class L1(BaseUser):
+            weight = 1
+
+        class L2(BaseUser):
+            weight = 1
+
+        class L3(BaseUser):
+            weight = 3
+
+        classes = [L1, L2, L3]
+        self.assertEqual({L1: 0, L2: 0, L3: 0}, runners.distribute_users(classes, 0))
+        # ties go to the class that comes first
+        self.assertEqual({L1: 1, L2: 0, L3: 1}, runners.distribute_users(classes, 2))
+        self.assertEqual({L1: 2, L2: 1, L3: 4}, runners.distribute_users(classes, 7))
+        for user_count in range(50):
+            counts = runners.distribute_users(classes, user_count)
+            self.assertEqual(user_count, sum(counts.values()))
+            for user_class, count in counts.items():
+                self.assertLess(abs(count - user_count * user_class.weight / 5), 1)
+        self.assertEqual({}, runners.distribute_users([], 10))
+
+    def test_user_count_delta(self):
+        class BaseUser(User):
+            pass
+
+        class L1(BaseUser):
+            weight = 3
+
+        class L2(BaseUser):
+            weight = 1
+
+        self.assertEqual(
+            {L1: 1},
+            runners.user_count_delta(
+                runners.distribute_users([L1, L2], 4),
+                runners.distribute_users([L1, L2], 5),
+            ),
+        )
+        self.assertEqual(
+            {L1: -3, L2: -1},
+            runners.user_count_delta(
+                runners.distribute_users([L1, L2], 8),
+                runners.distribute_users([L1, L2], 4),
+            ),
+        )
+        self.assertEqual(
+            {L1: 2, L2: -1}, runners.user_count_delta({L2: 2}, {L1: 2, L2: 1})
+        )
+
+    def test_split_user_counts(self):
+        parts = runners.split_user_counts({"a": 7, "b": 3, "c": 0}, 4)
+        self.assertEqual([3, 3, 2, 2], [sum(part.values()) for part in parts])
+        self.assertEqual([2, 2, 2, 1], [part["a"] for part in parts])
+        self.assertEqual([1, 1, 0, 1], [part["b"] for part in parts])
+        self.assertEqual([{"a": 1}, {"a": 0}], runners.split_user_counts({"a": 1}, 2))
+
+    def test_weighted_order(self):
+        order = list(runners.weighted_order({"a": 300, "b": 100, "c": 0}))
+        self.assertEqual(400, len(order))
+        self.assertEqual(300, order.count("a"))
+        # the classes are interleaved, instead of being started one class at a time
+        self.assertLess(order.index("b"), 200)
+        self.assertGreater(order[:200].count("a"), 100)
+
+    def spawn_users_with_fake_clock(self, runner, spawn_count, hatch_rate):
+        """
+        Spawn users with a fake clock that only advances when the runner sleeps, and return
+        the (time, user count) when each of the sleeps started
+        """
+        now = [0.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append((now[0], runner.user_count))
+            now[0] += seconds
+
+        with mock.patch("locust.runners.monotonic", lambda: now[0]), mock.patch(
+            "gevent.sleep", sleep
+        ):
+            runner.spawn_users(spawn_count, hatch_rate=hatch_rate, wait=False)
+        self.assertEqual(spawn_count, runner.user_count)
+        return sleeps + [(now[0], runner.user_count)]
+
+    def test_hatch_rate(self):
+        class MyUser(User):
+            wait_time = constant(60)
+
+            @task
+            def my_task(self):
+                pass
+
+        runner = Environment(user_classes=[MyUser]).create_local_runner()
+        batches = self.spawn_users_with_fake_clock(runner, 21, hatch_rate=100)
+        # the first user is started right away, and the others one at a time, 1 / 100 seconds
+        # apart, so that the last one is started after 20 / 100 seconds
+        self.assertEqual(21, len(batches))
+        self.assertEqual(list(range(1, 22)), [count for _, count in batches])
+        self.assertAlmostEqual(0.2, batches[-1][0])
+        runner.quit()
+
+    def test_high_hatch_rate(self):
+        class MyUser(User):
+            wait_time = constant(60)
+
+            @task
+            def my_task(self):
+                pass
+
+        runner = Environment(user_classes=[MyUser]).create_local_runner()
+        # much faster than users can be started one at a time with a sleep in between, so the
+        # users that are due are started in batches, every HATCH_BATCH_INTERVAL seconds
+        batches = self.spawn_users_with_fake_clock(runner, 1001, hatch_rate=5000)
+        self.assertEqual(21, len(batches))
+        self.assertEqual(1, batches[0][1])
+        for (t1, count1), (t2, count2) in zip(batches, batches[1:]):
+            self.assertAlmostEqual(runners.HATCH_BATCH_INTERVAL, t2 - t1)
+            self.assertAlmostEqual(50, count2 - count1, delta=1)
+        self.assertAlmostEqual(0.2, batches[-1][0])
+        runner.quit()
+
+    def test_users_by_class(self):
+        class User1(User):
+            wait_time = constant(60)
+            weight = 3
+
+            @task
+            def my_task(self):
+                pass
+
+        class User2(User1):
+            weight = 1
+
+        runner = Environment(user_classes=[User1, User2]).create_local_runner()
+        runner.spawn_users(8, hatch_rate=1000, wait=False)
+        self.assertEqual(6, len(runner.users_by_class[User1]))
+        self.assertEqual(2, len(runner.users_by_class[User2]))
+        oldest = list(runner.users_by_class[User1])[:3]
+        runner.stop_users(4)
+        self.assertEqual(4, runner.user_count)
+        self.assertEqual(3, len(runner.users_by_class[User1]))
+        self.assertEqual(1, len(runner.users_by_class[User2]))
+        # the users that have been running the longest are stopped first
+        self.assertFalse(set(oldest) & set(runner.users_by_class[User1]))
+        runner.stop()
+        self.assertEqual(0, runner.user_count)
+        self.assertEqual(
+            [0, 0], [len(users) for users in runner.users_by_class.values()]
+        )
+        runner.quit()
+
+    def test_stop_users_in_parallel(self):
+        class MyUser(User):
+            wait_time = constant(0)
+
+            @task
+            def my_task(self):
+                gevent.sleep(0.3)
+
+        environment = Environment(user_classes=[MyUser], stop_timeout=1)
+        runner = environment.create_local_runner()
+        runner.spawn_users(100, hatch_rate=1000, wait=False)
+        gevent.sleep(0.1)
+        start_time = time.perf_counter()
+        runner.stop_users(50)
+        # the users that are finishing their tasks are waited for at the same time
+        self.assertLess(time.perf_counter() - start_time, 0.5)
+        self.assertEqual(50, runner.user_count)
+        runner.quit()
+
     def test_kill_locusts(self):
         triggered = [False]
 
@@ -309,6 +492,34 @@ class TestLocustRunner(LocustTestCase):
         self.assertEqual(5, len(runner.user_greenlets))
         runner.quit()
 
+    def test_change_user_classes_count(self):
+        class User1(User):
+            wait_time = constant(1)
+
+            @task
+            def my_task(self):
+                pass
+
+        class User2(User1):
+            pass
+
+        runner = Environment(user_classes=[User1, User2]).create_local_runner()
+        runner.start(user_count=4, hatch_rate=100, wait=False)
+        runner.hatching_greenlet.join()
+        self.assertEqual({User1: 2, User2: 2}, runner.user_classes_count)
+        runner.start(
+            user_count=4,
+            hatch_rate=100,
+            wait=False,
+            user_classes_count={User1: 1, User2: 3},
+        )
+        runner.hatching_greenlet.join()
+        self.assertEqual({User1: 1, User2: 3}, runner.user_classes_count)
+        runner.start(user_count=5, hatch_rate=100, wait=False)
+        runner.hatching_greenlet.join()
+        self.assertEqual({User1: 3, User2: 2}, runner.user_classes_count)
+        runner.quit()
+
     def test_reset_stats(self):
         class MyUser(User):
             wait_time = constant(0)
@@ -516,6 +727,78 @@ class TestMasterRunner(LocustTestCase):
             self.assertEqual(0, s2.median_response_time)
             self.assertEqual(0, s2.avg_response_time)
 
+    def test_compact_stats_report(self):
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
+            master = self.get_runner()
+            server.mocked_send(
+                Message("client_ready", {"stats_report_version": 1}, "fake_client")
+            )
+            server.mocked_send(Message("client_ready", None, "old_client"))
+            server.mocked_send(
+                Message("client_ready", {"stats_report_version": 2}, "other_client")
+            )
+            master.start(3, 3)
+            hatch_data = dict((client_id, msg.data) for client_id, msg in server.outbox)
+            self.assertEqual(1, hatch_data["fake_client"]["stats_report_version"])
+            self.assertNotIn("stats_report_version", hatch_data["old_client"])
+            # workers with another version of the format send regular reports
+            self.assertNotIn("stats_report_version", hatch_data["other_client"])
+
+            worker_stats = RequestStats()
+            worker_events = locust.event.Events()
+            setup_distributed_stats_event_listeners(worker_events, worker_stats)
+            for response_time in (100, 800, 700):
+                worker_stats.log_request("GET", "/", response_time, 10)
+            data = {"user_count": 1}
+            worker_events.report_to_master.fire(client_id="fake_client", data=data)
+            encoder = StatsReportEncoder()
+            server.mocked_send(Message("stats", encoder.encode(data), "fake_client"))
+            s = master.stats.get("/", "GET")
+            self.assertEqual(3, s.num_requests)
+            self.assertEqual(700, s.median_response_time)
+            self.assertEqual(1, master.clients["fake_client"].user_count)
+
+            # compact reports from workers that haven't negotiated the format are discarded
+            worker_stats.log_request("GET", "/", 100, 10)
+            data = {"user_count": 1}
+            worker_events.report_to_master.fire(client_id="old_client", data=data)
+            server.mocked_send(Message("stats", encoder.encode(data), "old_client"))
+            self.assertEqual(3, master.stats.total.num_requests)
+
+    def test_compact_stats_report_unknown_entry_ids(self):
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
+            master = self.get_runner()
+            server.mocked_send(
+                Message("client_ready", {"stats_report_version": 1}, "fake_client")
+            )
+            master.start(1, 1)
+            del server.outbox[:]
+
+            worker_stats = RequestStats()
+            worker_events = locust.event.Events()
+            setup_distributed_stats_event_listeners(worker_events, worker_stats)
+            encoder = StatsReportEncoder()
+            worker_stats.log_request("GET", "/lost", 100, 10)
+            data = {"user_count": 1}
+            worker_events.report_to_master.fire(client_id="fake_client", data=data)
+            # the report that defines the entry ID is lost
+            encoder.encode(data)
+            encoder.commit()
+
+            worker_stats.log_request("GET", "/lost", 100, 10)
+            worker_stats.log_request("GET", "/", 100, 10)
+            data = {"user_count": 1}
+            worker_events.report_to_master.fire(client_id="fake_client", data=data)
+            server.mocked_send(Message("stats", encoder.encode(data), "fake_client"))
+            # the known entry and the total are still used
+            self.assertEqual(1, master.stats.get("/", "GET").num_requests)
+            self.assertEqual(2, master.stats.total.num_requests)
+            self.assertEqual(0, master.stats.get("/lost", "GET").num_requests)
+            self.assertEqual(
+                [("fake_client", "resend_stats_definitions")],
+                [(client_id, msg.type) for client_id, msg in server.outbox],
+            )
+
     def test_master_marks_downed_workers_as_missing(self):
         with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
             master = self.get_runner()
@@ -744,6 +1027,7 @@ class TestMasterRunner(LocustTestCase):
                     3000, master.stats.total.get_current_response_time_percentile(0.95)
                 )
 
+    @mock.patch("locust.runners.REBALANCE_INTERVAL", new=0.1)
     def test_rebalance_locust_users_on_worker_connect(self):
         with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
             master = self.get_runner()
@@ -756,6 +1040,7 @@ class TestMasterRunner(LocustTestCase):
 
             master.start(100, 20)
             self.assertEqual(1, len(server.outbox))
+            server.mocked_send(Message("hatching", None, "zeh_fake_client1"))
             client_id, msg = server.outbox.pop()
             self.assertEqual(100, msg.data["num_users"])
             self.assertEqual(20, msg.data["hatch_rate"])
@@ -763,6 +1048,7 @@ class TestMasterRunner(LocustTestCase):
             # let another worker connect
             server.mocked_send(Message("client_ready", None, "zeh_fake_client2"))
             self.assertEqual(2, len(master.clients))
+            sleep(0.2)
             self.assertEqual(2, len(server.outbox))
             client_id, msg = server.outbox.pop()
             self.assertEqual(50, msg.data["num_users"])
@@ -771,6 +1057,110 @@ class TestMasterRunner(LocustTestCase):
             self.assertEqual(50, msg.data["num_users"])
             self.assertEqual(10, msg.data["hatch_rate"])
 
+    def test_start_only_sends_changed_hatch_jobs(self):
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
+            master = self.get_runner()
+            server.mocked_send(Message("client_ready", None, "fake_client1"))
+            server.mocked_send(Message("client_ready", None, "fake_client2"))
+            master.start(3, 3)
+            self.assertEqual(
+                [("fake_client1", 2), ("fake_client2", 1)],
+                [(c, msg.data["num_users"]) for c, msg in server.outbox],
+            )
+            del server.outbox[:]
+            master.start(3, 3)
+            self.assertEqual([], server.outbox)
+            master.start(4, 3)
+            self.assertEqual(
+                [("fake_client2", 2)],
+                [(c, msg.data["num_users"]) for c, msg in server.outbox],
+            )
+            # a new hatch rate is sent to all the workers, even if their users don't change
+            del server.outbox[:]
+            master.start(4, 8)
+            self.assertEqual(
+                [("fake_client1", 4.0), ("fake_client2", 4.0)],
+                [(c, msg.data["hatch_rate"]) for c, msg in server.outbox],
+            )
+
+    @mock.patch("locust.runners.REBALANCE_INTERVAL", new=0.1)
+    def test_rebalance_once_when_workers_join(self):
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
+            master = self.get_runner()
+            server.mocked_send(Message("client_ready", None, "fake_client0"))
+            master.start(8, 8)
+            server.mocked_send(Message("hatching", None, "fake_client0"))
+            del server.outbox[:]
+            for i in range(1, 4):
+                server.mocked_send(Message("client_ready", None, "fake_client%i" % i))
+            self.assertEqual([], server.outbox)
+            sleep(0.2)
+            self.assertEqual(
+                [
+                    ("fake_client0", 2),
+                    ("fake_client1", 2),
+                    ("fake_client2", 2),
+                    ("fake_client3", 2),
+                ],
+                [(c, msg.data["num_users"]) for c, msg in server.outbox],
+            )
+            # the hatch rate is split over the workers
+            self.assertEqual(2, server.outbox[0][1].data["hatch_rate"])
+
+    @mock.patch("locust.runners.HEARTBEAT_INTERVAL", new=0.1)
+    @mock.patch("locust.runners.REBALANCE_INTERVAL", new=0.1)
+    def test_rebalance_users_of_missing_worker(self):
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
+            master = self.get_runner()
+            server.mocked_send(Message("client_ready", None, "fake_client1"))
+            server.mocked_send(Message("client_ready", None, "fake_client2"))
+            master.start(10, 10)
+            server.mocked_send(Message("hatching", None, "fake_client1"))
+            server.mocked_send(Message("hatching", None, "fake_client2"))
+            del server.outbox[:]
+            heartbeat = {"state": STATE_RUNNING, "current_cpu_usage": 50}
+            for _ in range(6):
+                sleep(0.1)
+                server.mocked_send(Message("heartbeat", heartbeat, "fake_client1"))
+            self.assertEqual(STATE_MISSING, master.clients["fake_client2"].state)
+            self.assertEqual(
+                [("fake_client1", 10)],
+                [(c, msg.data["num_users"]) for c, msg in server.outbox],
+            )
+
+            # a worker that comes back gets its share of the users again
+            del server.outbox[:]
+            server.mocked_send(Message("heartbeat", heartbeat, "fake_client2"))
+            server.mocked_send(Message("heartbeat", heartbeat, "fake_client1"))
+            sleep(0.15)
+            self.assertEqual(
+                [("fake_client1", 5), ("fake_client2", 5)],
+                [(c, msg.data["num_users"]) for c, msg in server.outbox],
+            )
+
+    def test_arrival_rate_share(self):
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
+            master = self.get_runner()
+            server.mocked_send(Message("client_ready", None, "fake_client1"))
+            server.mocked_send(Message("client_ready", None, "fake_client2"))
+            master.start(2, 2)
+            self.assertEqual(
+                [0.5, 0.5], [msg.data["arrival_rate_share"] for _, msg in server.outbox]
+            )
+
+            for client_id in ("fake_client1", "fake_client2"):
+                data = {
+                    "user_count": 1,
+                    "arrival_rate_stats": {"MyUser": [10, 1, 2, 0.2]},
+                }
+                self.environment.events.report_to_master.fire(
+                    client_id=client_id, data=data
+                )
+                server.mocked_send(Message("stats", data, client_id))
+            self.assertEqual(
+                [20, 2, 4, 0.2], master.arrival_rate_stats["MyUser"].serialize()
+            )
+
     def test_sends_hatch_data_to_ready_running_hatching_workers(self):
         """Sends hatch job to running, ready, or hatching workers"""
         with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
@@ -915,6 +1305,31 @@ class TestMasterRunner(LocustTestCase):
                 "Total number of locusts that would have been spawned is not 7",
             )
 
+    def test_spawn_user_classes_count(self):
+        class User1(User):
+            weight = 3
+
+        class User2(User):
+            weight = 1
+
+        self.environment.user_classes = [User1, User2]
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
+            master = self.get_runner()
+            for i in range(3):
+                server.mocked_send(Message("client_ready", None, "fake_client%i" % i))
+
+            master.start(10, 10)
+            counts = [msg.data["user_classes_count"] for _, msg in server.outbox]
+            self.assertEqual(
+                [msg.data["num_users"] for _, msg in server.outbox],
+                [sum(c.values()) for c in counts],
+            )
+            # the global class mix is exactly the distribution of all the users
+            self.assertEqual(
+                {"User1": 8, "User2": 2},
+                {name: sum(c[name] for c in counts) for name in ("User1", "User2")},
+            )
+
     def test_spawn_fewer_locusts_than_workers(self):
         with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
             master = self.get_runner()
@@ -1108,6 +1523,235 @@ class TestWorkerRunner(LocustTestCase):
             # make sure the test_start was never fired on the worker
             self.assertFalse(test_start_run[0])
 
+    def test_worker_user_classes_count(self):
+        class MyUser(User):
+            wait_time = constant(1)
+
+            @task
+            def my_task(self):
+                pass
+
+        class MyOtherUser(MyUser):
+            pass
+
+        with mock.patch("locust.rpc.rpc.Client", mocked_rpc()) as client:
+            environment = Environment()
+            worker = self.get_runner(
+                environment=environment, user_classes=[MyUser, MyOtherUser]
+            )
+            client.mocked_send(
+                Message(
+                    "hatch",
+                    {
+                        "hatch_rate": 100,
+                        "num_users": 3,
+                        "host": "",
+                        "stop_timeout": None,
+                        "user_classes_count": {"MyUser": 0, "MyOtherUser": 3},
+                    },
+                    "dummy_client_id",
+                )
+            )
+            worker.hatching_greenlet.join()
+            self.assertEqual({MyOtherUser: 3}, worker.user_classes_count)
+            worker.quit()
+
+    def test_worker_arrival_rate(self):
+        class MyUser(User):
+            arrival_rate = 100
+
+            @task
+            def my_task(self):
+                pass
+
+        with mock.patch("locust.rpc.rpc.Client", mocked_rpc()) as client:
+            environment = Environment()
+            worker = self.get_runner(environment=environment, user_classes=[MyUser])
+            client.mocked_send(
+                Message(
+                    "hatch",
+                    {
+                        "hatch_rate": 1,
+                        "num_users": 0,
+                        "host": "",
+                        "stop_timeout": None,
+                        "arrival_rate_share": 0.5,
+                    },
+                    "dummy_client_id",
+                )
+            )
+            worker.hatching_greenlet.join()
+            self.assertEqual(0, worker.user_count)
+            self.assertEqual(0.5, worker.arrival_rate_schedulers[MyUser].share)
+            sleep(0.2)
+            data = {}
+            environment.events.report_to_master.fire(client_id="fake", data=data)
+            # half of 100 tasks per second for 0.2 seconds
+            self.assertAlmostEqual(11, data["arrival_rate_stats"]["MyUser"][0], delta=2)
+            self.assertEqual(0, worker.arrival_rate_stats["MyUser"].num_starts)
+            worker.quit()
+
+    def test_compact_stats_report(self):
+        with mock.patch("locust.rpc.rpc.Client", mocked_rpc()) as client:
+            environment = Environment()
+            worker = self.get_runner(environment=environment, user_classes=[])
+            self.assertEqual(
+                {"stats_report_version": 1}, client.outbox[0].data,
+            )
+            client.mocked_send(
+                Message(
+                    "hatch",
+                    {
+                        "hatch_rate": 1,
+                        "num_users": 0,
+                        "host": "",
+                        "stop_timeout": None,
+                        "stats_report_version": 1,
+                    },
+                    "dummy_client_id",
+                )
+            )
+            self.assertIsNotNone(worker.stats_report_encoder)
+            environment.stats.log_request("GET", "/", 10, 0)
+            worker._send_stats()
+            self.assertEqual("stats", client.outbox[-1].type)
+            self.assertIn("stats_report", client.outbox[-1].data)
+            self.assertNotIn("stats", client.outbox[-1].data)
+
+            client.mocked_send(Message("stop", None, "dummy_client_id"))
+            self.assertEqual("client_ready", client.outbox[-1].type)
+            self.assertIsNone(worker.stats_report_encoder)
+
+    def test_compact_stats_report_send_failure(self):
+        with mock.patch("locust.rpc.rpc.Client", mocked_rpc()) as client:
+            environment = Environment()
+            worker = self.get_runner(environment=environment, user_classes=[])
+            client.mocked_send(
+                Message(
+                    "hatch",
+                    {
+                        "hatch_rate": 1,
+                        "num_users": 0,
+                        "host": "",
+                        "stop_timeout": None,
+                        "stats_report_version": 1,
+                    },
+                    "dummy_client_id",
+                )
+            )
+            environment.stats.log_request("GET", "/", 10, 0)
+            with mock.patch.object(client, "send", side_effect=RPCError()):
+                self.assertRaises(RPCError, worker._send_stats)
+            # the entry is defined again, since the master never got the failed report
+            environment.stats.log_request("GET", "/", 10, 0)
+            worker._send_stats()
+            self.assertIn(b"GET", client.outbox[-1].data["stats_report"][2])
+            environment.stats.log_request("GET", "/", 10, 0)
+            worker._send_stats()
+            self.assertNotIn(b"GET", client.outbox[-1].data["stats_report"][2])
+
+            # the master asks for the definitions after losing a report
+            client.mocked_send(
+                Message("resend_stats_definitions", None, "dummy_client_id")
+            )
+            environment.stats.log_request("GET", "/", 10, 0)
+            worker._send_stats()
+            self.assertIn(b"GET", client.outbox[-1].data["stats_report"][2])
+
+    def test_worker_stats_settings(self):
+        with mock.patch("locust.rpc.rpc.Client", mocked_rpc()):
+            environment = Environment()
+            environment.stats = RequestStats(
+                histogram_class=LogLinearHistogram,
+                max_entries=10,
+                buffer_size=100,
+                aggregate_on_demand=True,
+                max_errors=5,
+            )
+            worker = environment.create_worker_runner("localhost", 5557)
+            # the worker gets new stats without the current response times, with the other
+            # settings carried over
+            self.assertFalse(environment.stats.use_response_times_cache)
+            self.assertEqual(LogLinearHistogram, environment.stats.histogram_class)
+            self.assertEqual(10, environment.stats.max_entries)
+            self.assertEqual(100, environment.stats.buffer.size)
+            self.assertTrue(environment.stats.aggregate_on_demand)
+            self.assertEqual(5, environment.stats.max_errors)
+            self.assertEqual(5, environment.stats.errors.max_errors)
+            worker.quit()
+
+    def send_compact_stats_report(self, histogram_class):
+        """
+        Report a few requests from a worker whose stats use *histogram_class*, and return the
+        encoded response times of the entry, and the stats of a master that received the report
+        """
+        with mock.patch("locust.rpc.rpc.Client", mocked_rpc()) as client:
+            environment = Environment()
+            environment.stats = RequestStats(histogram_class=histogram_class)
+            worker = self.get_runner(environment=environment, user_classes=[])
+            client.mocked_send(
+                Message(
+                    "hatch",
+                    {
+                        "hatch_rate": 1,
+                        "num_users": 0,
+                        "host": "",
+                        "stop_timeout": None,
+                        "stats_report_version": 1,
+                    },
+                    "dummy_client_id",
+                )
+            )
+            for response_time in (0.25, 4.6, 12, 12, 999.5):
+                environment.stats.log_request("GET", "/", response_time, 0)
+            worker._send_stats()
+            data = Message.unserialize(client.outbox[-1].serialize()).data
+            worker.quit()
+        _, _, payload = data["stats_report"]
+        definitions, entries, total, errors = msgpack.loads(payload, raw=False)
+        master_stats = RequestStats(histogram_class=histogram_class)
+        master_events = locust.event.Events()
+        setup_distributed_stats_event_listeners(master_events, master_stats)
+        master_events.worker_report.fire(
+            client_id="fake_client", data=StatsReportDecoder().decode(data),
+        )
+        return entries[0][10], master_stats
+
+    def test_compact_stats_report_float_values(self):
+        encoded, master_stats = self.send_compact_stats_report(RoundedHistogram)
+        # the keys are sent as delta encoded hundredths of milliseconds
+        self.assertEqual(
+            [[FLOAT_VALUES, 2], [25, 435, 740, 98800], [1, 1, 2, 1]], encoded
+        )
+        self.assertEqual(
+            {0.25: 1, 4.6: 1, 12: 2, 1000: 1},
+            master_stats.get("/", "GET").response_times,
+        )
+
+    def test_compact_stats_report_log_linear_histogram(self):
+        worker_histogram = LogLinearHistogram()
+        for response_time in (0.25, 4.6, 12, 12, 999.5):
+            worker_histogram.record(response_time)
+        encoded, master_stats = self.send_compact_stats_report(LogLinearHistogram)
+        # the bucket indices of the histogram are sent, rather than the response times
+        self.assertEqual([LOG_LINEAR_BUCKETS, 2, 0.001], encoded[0])
+        self.assertEqual(4, len(encoded[1]))
+        master_histogram = master_stats.get("/", "GET").response_times
+        self.assertIsInstance(master_histogram, LogLinearHistogram)
+        self.assertEqual(worker_histogram.counts, master_histogram.counts)
+
+    def test_compact_stats_report_ddsketch_histogram(self):
+        worker_histogram = DDSketchHistogram()
+        for response_time in (0.25, 4.6, 12, 12, 999.5):
+            worker_histogram.record(response_time)
+        encoded, master_stats = self.send_compact_stats_report(DDSketchHistogram)
+        # the sketch is sent as bucket indices, and isn't re-bucketed on the master
+        self.assertEqual([DDSKETCH_BUCKETS, 0.01, 0.001, 0], encoded[0])
+        self.assertEqual(4, len(encoded[1]))
+        master_histogram = master_stats.get("/", "GET").response_times
+        self.assertIsInstance(master_histogram, DDSketchHistogram)
+        self.assertEqual(worker_histogram.buckets, master_histogram.buckets)
+
     def test_worker_without_stop_timeout(self):
         class MyTestUser(User):
             _test_state = 0
@@ -0,0 +1,169 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from locust.env import Environment
+from locust.event import Events
+from locust.samples import (
+    NO_RESPONSE_TIME,
+    SampleRecorder,
+    read_samples,
+    read_segment,
+)
+
+
+@unittest.skipIf(numpy is None, "NumPy is needed to read the recorded samples")
+class TestSampleRecorder(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.environment = Environment(events=Events())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def fire_requests(self, events, count):
+        for i in range(count):
+            if i % 5 == 4:
+                events.request_failure.fire(
+                    request_type="POST",
+                    name="/fail",
+                    response_time=i + 0.25,
+                    response_length=0,
+                    exception=ValueError("fail"),
+                    status=500,
+                )
+            else:
+                events.request_success.fire(
+                    request_type="GET",
+                    name="/item/%i" % (i % 2),
+                    response_time=i + 0.5,
+                    response_length=100 + i,
+                    status=200,
+                )
+
+    def test_record_and_read(self):
+        recorder = SampleRecorder(self.environment, self.directory)
+        self.fire_requests(self.environment.events, 10)
+        self.environment.events.request_success.fire(
+            request_type="GET", name="/item/0", response_time=None, response_length=0
+        )
+        self.environment.events.request_failure.fire(
+            request_type="POST",
+            name="/fail",
+            response_time=1,
+            response_length=0,
+            exception=ConnectionError("refused"),
+        )
+        self.environment.events.quitting.fire(environment=self.environment)
+        self.assertEqual(12, recorder.num_records)
+
+        records, entries, errors, statuses = read_samples(self.directory)
+        self.assertEqual(12, len(records))
+        self.assertEqual(
+            [("GET", "/item/0"), ("GET", "/item/1"), ("POST", "/fail")], entries
+        )
+        self.assertEqual(["ValueError('fail')", "ConnectionError('refused')"], errors)
+        # failures without a status are counted per exception class, like in the stats
+        self.assertEqual([200, 500, "ConnectionError"], statuses)
+        # exact response times in microseconds
+        self.assertEqual(
+            [500, 1500, 2500, 3500, 4250, 5500, 6500, 7500, 8500, 9250],
+            list(records["response_time"][:10]),
+        )
+        self.assertEqual(NO_RESPONSE_TIME, records["response_time"][10])
+        self.assertEqual([0, 1, 0, 1, 2], list(records["entry_id"][:5]))
+        self.assertEqual([0, 0, 0, 0, 1], list(records["error_id"][:5]))
+        # the request without a response time was logged without a status
+        self.assertEqual([1, 1, 1, 1, 2], list(records["status_id"][:5]))
+        self.assertEqual(0, records["status_id"][10])
+        self.assertEqual(3, records["status_id"][11])
+        self.assertEqual([100, 101, 102, 103, 0], list(records["content_length"][:5]))
+        self.assertTrue(numpy.all(numpy.diff(records["timestamp"]) >= 0))
+
+        # requests after the recorder has been closed aren't recorded
+        self.fire_requests(self.environment.events, 1)
+        self.assertEqual(12, recorder.num_records)
+
+    def test_segments(self):
+        recorder = SampleRecorder(self.environment, self.directory, segment_records=10)
+        self.fire_requests(self.environment.events, 25)
+        recorder.close()
+        self.assertEqual(
+            ["local-000000.samples", "local-000001.samples", "local-000002.samples"],
+            sorted(f for f in os.listdir(self.directory) if f.endswith(".samples")),
+        )
+        records, _, _, _ = read_samples(self.directory)
+        self.assertEqual(25, len(records))
+        self.assertEqual(24250, records["response_time"][-1])
+
+    def test_max_segments(self):
+        recorder = SampleRecorder(
+            self.environment, self.directory, segment_records=10, max_segments=2
+        )
+        self.fire_requests(self.environment.events, 25)
+        recorder.close()
+        records, _, _, _ = read_samples(self.directory)
+        self.assertEqual(15, len(records))
+        self.assertEqual(10500, records["response_time"][0])
+
+    def test_read_segment_that_wasnt_closed(self):
+        recorder = SampleRecorder(self.environment, self.directory, segment_records=10)
+        self.fire_requests(self.environment.events, 3)
+        recorder.flush()
+        records = read_segment(os.path.join(self.directory, "local-000000.samples"))
+        self.assertEqual(3, len(records))
+        recorder.close()
+
+    def test_read_multiple_nodes(self):
+        worker_environment = Environment(events=Events())
+        recorder1 = SampleRecorder(self.environment, self.directory, node_id="worker1")
+        recorder2 = SampleRecorder(
+            worker_environment, self.directory, node_id="worker2"
+        )
+        worker_environment.events.request_failure.fire(
+            request_type="GET",
+            name="/other",
+            response_time=1,
+            response_length=0,
+            exception=ValueError("other"),
+        )
+        self.fire_requests(worker_environment.events, 5)
+        self.fire_requests(self.environment.events, 5)
+        recorder1.close()
+        recorder2.close()
+
+        records, entries, errors, _ = read_samples(self.directory)
+        self.assertEqual(11, len(records))
+        self.assertEqual(
+            [
+                ("GET", "/item/0"),
+                ("GET", "/item/1"),
+                ("POST", "/fail"),
+                ("GET", "/other"),
+            ],
+            entries,
+        )
+        self.assertEqual(["ValueError('fail')", "ValueError('other')"], errors)
+        # the records of worker2 refer to the unified IDs
+        self.assertEqual([3, 0, 1, 0, 1, 2], list(records["entry_id"][5:]))
+        self.assertEqual([2, 0, 0, 0, 0, 1], list(records["error_id"][5:]))
+
+        records, entries, _, _ = read_samples(self.directory, node_id="worker2")
+        self.assertEqual(6, len(records))
+        self.assertEqual(("GET", "/other"), entries[0])
+
+
+class TestReadSamplesWithoutNumPy(unittest.TestCase):
+    def test_missing_numpy(self):
+        with mock.patch.dict("sys.modules", {"numpy": None}):
+            with self.assertRaises(ImportError) as cm:
+                read_samples(tempfile.gettempdir())
+        self.assertIn("pip install locust[report]", str(cm.exception))
@@ -11,11 +11,19 @@ import locust
 from locust import HttpUser, TaskSet, task, User, constant
 from locust.env import Environment
 from locust.rpc.protocol import Message
+from locust.event import Events
 from locust.stats import (
-    CachedResponseTimes,
+    OTHER_ENTRY_NAME,
+    RequestNameNormalizer,
     RequestStats,
+    StatsBuffer,
     StatsEntry,
+    StatsCSVFileWriter,
+    StatsError,
+    StatsErrors,
     diff_response_time_dicts,
+    format_response_time,
+    setup_distributed_stats_event_listeners,
     stats_writer,
 )
 from locust.test.testcases import LocustTestCase
@@ -58,6 +66,34 @@ class TestRequestStats(unittest.TestCase):
         self.assertEqual(s.get_response_time_percentile(0.6), 60)
         self.assertEqual(s.get_response_time_percentile(0.95), 95)
 
+    def test_percentiles(self):
+        s = StatsEntry(self.stats, "percentile_test", "GET")
+        for x in range(100):
+            s.log(x, 0)
+
+        percents = (0.5, 0.95, 0.6, 1.0)
+        self.assertEqual(
+            tuple(s.response_times.percentile(p) for p in percents),
+            s.get_response_time_percentiles(percents),
+        )
+        self.assertEqual(
+            len(locust.stats.PERCENTILES_TO_REPORT),
+            len(s.get_response_time_percentiles()),
+        )
+
+    def test_percentiles_cache_invalidated(self):
+        s = StatsEntry(self.stats, "percentile_test", "GET")
+        s.log(10, 0)
+        self.assertEqual((10, 10), s.get_response_time_percentiles((0.5, 1.0)))
+        s.log(500, 0)
+        self.assertEqual((500, 500), s.get_response_time_percentiles((0.5, 1.0)))
+        other = StatsEntry(self.stats, "percentile_test", "GET")
+        other.log(900, 0)
+        s.extend(other)
+        self.assertEqual((500, 900), s.get_response_time_percentiles((0.5, 1.0)))
+        s.reset()
+        self.assertEqual((0, 0), s.get_response_time_percentiles((0.5, 1.0)))
+
     def test_median(self):
         self.assertEqual(self.s.median_response_time, 79)
 
@@ -105,6 +141,46 @@ class TestRequestStats(unittest.TestCase):
         self.stats.total.last_request_timestamp = int(time.time()) + 25
         self.assertEqual(self.s.current_fail_per_sec, 0)
 
+    def test_current_rps_after_extend(self):
+        now = time.time()
+        stats = RequestStats()
+        stats.total.start_time = now - 60
+        worker_entry = StatsEntry(None, "/", "GET")
+        with mock.patch("time.time") as mocked_time:
+            for second in range(30):
+                mocked_time.return_value = now - 30 + second
+                for _ in range(second):
+                    worker_entry.log(10, 0)
+                worker_entry.log_error(None)
+        entry = stats.get("/", "GET")
+        entry.extend(StatsEntry.unserialize(worker_entry.serialize()))
+        stats.total.last_request_timestamp = now
+        # the seconds [now - 12, now - 2) have 18 - 27 requests and 1 failure each
+        self.assertEqual(22.5, entry.current_rps)
+        self.assertEqual(1, entry.current_fail_per_sec)
+
+    def test_current_rps_without_rolling_counter(self):
+        now = time.time()
+        stats = RequestStats(use_response_times_cache=False)
+        stats.total.start_time = now - 60
+        entry = stats.get("/", "GET")
+        with mock.patch("time.time") as mocked_time:
+            for second in range(30):
+                mocked_time.return_value = now - 30 + second
+                for _ in range(second):
+                    entry.log(10, 0)
+                entry.log_error(None)
+        # entries on worker nodes don't keep a rolling counter or window that's never read,
+        # and only the first tier of the per second counts is used
+        self.assertIsNone(entry._current_reqs)
+        self.assertIsNone(entry._current_fails)
+        self.assertIsNone(entry.window)
+        self.assertEqual(sum(range(30)), sum(entry.num_reqs_per_sec.values()))
+        self.assertIsNone(entry.num_reqs_per_sec._older)
+        stats.total.last_request_timestamp = now
+        self.assertEqual(22.5, entry.current_rps)
+        self.assertEqual(1, entry.current_fail_per_sec)
+
     def test_num_reqs_fails(self):
         self.assertEqual(self.s.num_requests, 9)
         self.assertEqual(self.s.num_failures, 3)
@@ -270,6 +346,186 @@ class TestRequestStats(unittest.TestCase):
         self.stats.log_error("GET", "/", Exception("Error caused by %r" % Dummy()))
         self.assertEqual(1, len(self.stats.errors))
 
+    def test_error_key_cache(self):
+        self.stats = RequestStats()
+        self.stats.error_key_cache_size = 2
+
+        class CustomReprError(Exception):
+            def __repr__(self):
+                return "CustomReprError()"
+
+        class Dummy(object):
+            pass
+
+        errors = [
+            Exception("Exception!"),
+            ValueError("Exception!"),
+            "Failure",
+            CustomReprError(1),
+            Exception([1, 2]),
+            Exception(Dummy()),
+            Exception("Exception!"),
+        ]
+        for error in errors:
+            self.stats.log_error("GET", "/some-path", error)
+            self.assertIn(
+                StatsError.create_key("GET", "/some-path", error), self.stats.errors
+            )
+        self.assertEqual(6, len(self.stats.errors))
+        self.assertEqual(
+            2,
+            self.stats.errors[
+                StatsError.create_key("GET", "/some-path", errors[0])
+            ].occurrences,
+        )
+        self.assertEqual(
+            [
+                ("GET", "/some-path", Exception, (errors[5].args[0],)),
+                ("GET", "/some-path", Exception, ("Exception!",)),
+            ],
+            list(self.stats._error_keys),
+        )
+
+    def test_max_errors(self):
+        stats = RequestStats(max_errors=3)
+        for error, count in (("a", 5), ("b", 3), ("c", 1)):
+            for _ in range(count):
+                stats.log_error("GET", "/", Exception(error))
+        stats.log_error("GET", "/", Exception("d"))
+        self.assertEqual(3, len(stats.errors))
+        # the least frequent error was replaced, and its occurrences were taken over
+        self.assertEqual(
+            [
+                ("Exception('a')", 5, 0),
+                ("Exception('b')", 3, 0),
+                ("Exception('d')", 2, 1),
+            ],
+            [
+                (repr(e.error), e.occurrences, e.error_margin)
+                for e in stats.errors.top()
+            ],
+        )
+        # the counts still add up to the total number of errors
+        self.assertEqual(10, sum(e.occurrences for e in stats.errors.values()))
+        stats.reset_all()
+        self.assertEqual(3, stats.errors.max_errors)
+
+    def test_max_errors_keeps_heavy_hitters(self):
+        stats = RequestStats()
+        stats.max_errors = 10
+        counts = {}
+        for i in range(3000):
+            # a third of the errors are the same, the rest are all different
+            error = "frequent" if i % 3 == 0 else "rare %i" % i
+            counts[error] = counts.get(error, 0) + 1
+            stats.log_error("GET", "/", error)
+        self.assertEqual(10, len(stats.errors))
+        top = stats.errors.top(1)[0]
+        self.assertEqual("frequent", top.error)
+        for e in stats.errors.values():
+            self.assertLessEqual(e.occurrences - e.error_margin, counts[e.error])
+            self.assertGreaterEqual(e.occurrences, counts[e.error])
+        self.assertEqual(3000, sum(e.occurrences for e in stats.errors.values()))
+
+    def test_max_errors_set_after_errors_were_logged(self):
+        stats = RequestStats()
+        for i in range(5):
+            for _ in range(i + 1):
+                stats.log_error("GET", "/", "error %i" % i)
+        stats.max_errors = 5
+        stats.log_error("GET", "/", "new")
+        self.assertNotIn(
+            "error 0", [e.error for e in stats.errors.values()],
+        )
+        self.assertEqual(5, len(stats.errors))
+
+    def test_merge_errors_with_max_errors(self):
+        master_stats = RequestStats(max_errors=2)
+        master_events = Events()
+        setup_distributed_stats_event_listeners(master_events, master_stats)
+        for worker in range(2):
+            worker_stats = RequestStats(max_errors=2)
+            worker_events = Events()
+            setup_distributed_stats_event_listeners(worker_events, worker_stats)
+            for error, count in (("a", 4), ("b%i" % worker, 2), ("c%i" % worker, 1)):
+                for _ in range(count):
+                    worker_stats.log_error("GET", "/", error)
+            data = {}
+            worker_events.report_to_master.fire(client_id="worker", data=data)
+            self.assertEqual(0, len(worker_stats.errors))
+            master_events.worker_report.fire(
+                client_id="worker",
+                data=Message.unserialize(
+                    Message("stats", data, "worker").serialize()
+                ).data,
+            )
+        a = master_stats.errors.top(1)[0]
+        self.assertEqual(("'a'", 8, 0), (a.error, a.occurrences, a.error_margin))
+        self.assertEqual(2, len(master_stats.errors))
+        other = master_stats.errors.top()[1]
+        # c1 (1 occurrence, but counted as 3 on the worker) replaced c0 (counted as 3)
+        self.assertEqual(6, other.occurrences)
+        self.assertEqual(5, other.error_margin)
+
+    def test_status_codes(self):
+        self.assertEqual({}, self.s.status_codes)
+        self.stats.log_request("GET", "test_entry", 10, 0, 200)
+        self.stats.log_request("GET", "test_entry", 10, 0, 200)
+        self.stats.log_request("GET", "test_entry", 10, 0, 503)
+        self.stats.log_request("POST", "test_entry", None, 0, "ConnectionError")
+        self.assertEqual({200: 2, 503: 1}, self.s.status_codes)
+        self.assertEqual(
+            {200: 2, 503: 1, "ConnectionError": 1}, self.stats.total.status_codes
+        )
+        self.assertEqual(
+            "200:2 503:1 ConnectionError:1",
+            locust.stats.format_status_codes(self.stats.total.status_codes),
+        )
+
+        data = Message.unserialize(
+            Message("dummy", self.s.serialize(), "none").serialize()
+        ).data
+        merged = StatsEntry(self.stats, "test_entry", "GET")
+        merged.log(10, 0, 200)
+        merged.extend(StatsEntry.unserialize(data))
+        self.assertEqual({200: 3, 503: 1}, merged.status_codes)
+
+        self.s.reset()
+        self.assertEqual({}, self.s.status_codes)
+
+    def test_connection_timings(self):
+        self.stats.log_request(
+            "GET", "test_entry", 30, 0, connection_timings={"connect": 5, "ttfb": 20}
+        )
+        self.stats.log_request(
+            "GET", "test_entry", 30, 0, connection_timings={"ttfb": 25, "download": 3}
+        )
+        self.stats.log_request("GET", "test_entry", 30, 0)
+        self.assertEqual(1, self.s.num_new_connections)
+        self.assertEqual(1, self.s.num_reused_connections)
+        self.assertEqual(["connect", "download", "ttfb"], sorted(self.s.phase_times))
+        self.assertEqual(2, self.s.phase_times["ttfb"].count)
+        self.assertEqual(5, self.s.get_phase_time_percentile("connect", 0.5))
+        self.assertEqual(None, self.s.get_phase_time_percentile("tls", 0.5))
+        self.assertEqual(1, self.stats.total.num_new_connections)
+
+        data = Message.unserialize(
+            Message("dummy", self.s.serialize(), "none").serialize()
+        ).data
+        merged = StatsEntry(self.stats, "test_entry", "GET")
+        merged.log(10, 0, connection_timings={"tls": 2})
+        merged.extend(StatsEntry.unserialize(data))
+        self.assertEqual(1, merged.num_new_connections)
+        self.assertEqual(2, merged.num_reused_connections)
+        self.assertEqual(
+            ["connect", "download", "tls", "ttfb"], sorted(merged.phase_times)
+        )
+        self.assertEqual(25, merged.get_phase_time_percentile("ttfb", 1.0))
+
+        self.s.reset()
+        self.assertEqual(0, self.s.num_new_connections)
+        self.assertEqual({}, self.s.phase_times)
+
     def test_serialize_through_message(self):
         """
         Serialize a RequestStats instance, then serialize it through a Message, 
@@ -290,6 +546,253 @@ class TestRequestStats(unittest.TestCase):
         self.assertEqual(20, u1.median_response_time)
 
 
+class TestRequestNameNormalizer(unittest.TestCase):
+    def test_default_rules(self):
+        n = RequestNameNormalizer()
+        self.assertEqual("/orders/{id}", n.normalize("/orders/81723"))
+        self.assertEqual(
+            "/orders/{id}/items/{id}?page={id}&sort=asc",
+            n.normalize("/orders/81723/items/5?page=2&sort=asc"),
+        )
+        self.assertEqual(
+            "/users/{uuid}/avatar.png",
+            n.normalize("/users/550e8400-e29b-41d4-a716-446655440000/avatar.png"),
+        )
+        self.assertEqual("/blob/{hash}", n.normalize("/blob/9f86d081884c7d659a2feaa0"))
+        self.assertEqual("/blob/{hash}", n.normalize("/blob/8188407659234567f"))
+        # long numeric IDs (e.g. snowflake IDs) aren't hashes
+        self.assertEqual(
+            "/tweets/{id}?after={id}",
+            n.normalize("/tweets/1283764398517239809?after=1283764398517239000"),
+        )
+        self.assertEqual("/v1/users/me", n.normalize("/v1/users/me"))
+        self.assertEqual("/files/{id}.json", n.normalize("/files/123.json"))
+
+    def test_patterns(self):
+        n = RequestNameNormalizer(patterns=[(r"(?<=/users/)\w+", "{username}")])
+        self.assertEqual("/users/{username}/{id}", n.normalize("/users/alice/12"))
+        n = RequestNameNormalizer(
+            patterns=[(r"(?<=/users/)\w+", "{username}")], use_default_rules=False
+        )
+        self.assertEqual("/users/{username}/12", n.normalize("/users/alice/12"))
+
+    def test_cache(self):
+        n = RequestNameNormalizer(cache_size=2)
+        n.normalize("/a/1")
+        n.normalize("/a/1")
+        n.normalize("/a/2")
+        self.assertEqual({"/a/1": "/a/{id}", "/a/2": "/a/{id}"}, n._cache)
+        n.normalize("/a/3")
+        self.assertEqual({"/a/3": "/a/{id}"}, n._cache)
+
+    def test_request_stats_normalize_names(self):
+        stats = RequestStats(name_normalizer=RequestNameNormalizer())
+        for i in range(100):
+            stats.log_request("GET", "/orders/%i" % i, 10, 0)
+        stats.log_error("GET", "/orders/4", Exception("fail"))
+        self.assertEqual([("/orders/{id}", "GET")], list(stats.entries.keys()))
+        self.assertEqual(100, stats.get("/orders/{id}", "GET").num_requests)
+        self.assertEqual(1, stats.get("/orders/{id}", "GET").num_failures)
+        self.assertEqual("/orders/{id}", list(stats.errors.values())[0].name)
+
+    def test_max_entries(self):
+        stats = RequestStats(max_entries=3)
+        for i in range(10):
+            stats.log_request("GET", "/orders/%i" % i, 10, 0)
+        stats.log_request("GET", "/orders/1", 10, 0)
+        stats.log_error("GET", "/orders/9", Exception("fail"))
+        self.assertEqual(4, len(stats.entries))
+        self.assertEqual(2, stats.get("/orders/1", "GET").num_requests)
+        self.assertEqual(7, stats.get(OTHER_ENTRY_NAME, "GET").num_requests)
+        self.assertEqual(1, stats.get(OTHER_ENTRY_NAME, "GET").num_failures)
+        self.assertEqual(11, stats.total.num_requests)
+
+    def test_max_entries_on_master(self):
+        worker_stats = RequestStats()
+        for i in range(10):
+            worker_stats.log_request("GET", "/orders/%i" % i, 10, 0)
+        worker_events = Events()
+        setup_distributed_stats_event_listeners(worker_events, worker_stats)
+        data = {}
+        worker_events.report_to_master.fire(client_id="worker", data=data)
+
+        master_events = Events()
+        master_stats = RequestStats(max_entries=5)
+        setup_distributed_stats_event_listeners(master_events, master_stats)
+        master_events.worker_report.fire(client_id="worker", data=data)
+        self.assertEqual(6, len(master_stats.entries))
+        self.assertEqual(5, master_stats.get(OTHER_ENTRY_NAME, "GET").num_requests)
+        self.assertEqual(10, master_stats.total.num_requests)
+
+
+class TestStatsBuffer(unittest.TestCase):
+    def log_requests(self, stats):
+        for i in range(300):
+            with mock.patch("time.time", return_value=1000.0 + i * 0.05):
+                name = "/orders/%i" % (i % 7)
+                response_time = None if i % 50 == 0 else i % 120 + 0.5 * (i % 3)
+                timings = None
+                if i % 4 == 0:
+                    timings = {"ttfb": i % 30 + 0.5, "download": i % 5}
+                    if i % 8 == 0:
+                        timings["connect"] = i % 9 + 1
+                stats.log_request(
+                    "GET", name, response_time, i, 503 if i % 11 == 0 else 200, timings,
+                )
+                if i % 11 == 0:
+                    stats.log_error("GET", name, Exception("fail %i" % (i % 2)))
+                if i == 250:
+                    stats.log_request("POST", "/login", 10, 0)
+
+    def test_equivalent_to_direct_logging(self):
+        for options in ({}, {"max_entries": 4}):
+            with mock.patch("time.time", return_value=999.0):
+                direct = RequestStats(**options)
+                buffered = RequestStats(buffer_size=64, **options)
+                for stats in (direct, buffered):
+                    stats.get(
+                        "/orders/1", "GET"
+                    ).get_current_response_time_percentiles()
+            for stats in (direct, buffered):
+                self.log_requests(stats)
+            buffered.flush_buffer()
+            self.assertEqual(0, len(buffered.buffer))
+            self.assertEqual(list(direct.entries.keys()), list(buffered.entries.keys()))
+            for key, entry in direct.entries.items():
+                self.assertEqual(entry.serialize(), buffered.entries[key].serialize())
+            self.assertEqual(direct.total.serialize(), buffered.total.serialize())
+            self.assertEqual(direct.serialize_errors(), buffered.serialize_errors())
+            with mock.patch("time.time", return_value=1016.0):
+                self.assertEqual(
+                    direct.get(
+                        "/orders/1", "GET"
+                    ).get_current_response_time_percentiles(),
+                    buffered.get(
+                        "/orders/1", "GET"
+                    ).get_current_response_time_percentiles(),
+                )
+
+    def test_flush_when_full(self):
+        stats = RequestStats(buffer_size=10)
+        for i in range(9):
+            stats.log_request("GET", "/", 10, 0)
+        self.assertEqual(0, stats.num_requests)
+        self.assertEqual(9, len(stats.buffer))
+        stats.log_request("GET", "/", 10, 0)
+        self.assertEqual(10, stats.num_requests)
+        self.assertEqual(0, len(stats.buffer))
+
+    def test_flush_interval(self):
+        stats = RequestStats()
+        stats.buffer = StatsBuffer(stats, flush_interval=0.05)
+        stats.log_request("GET", "/", 10, 0)
+        stats.log_error("GET", "/", Exception("fail"))
+        self.assertEqual(0, stats.num_requests)
+        gevent.sleep(0.1)
+        self.assertEqual(1, stats.num_requests)
+        self.assertEqual(1, stats.num_failures)
+        self.assertEqual(1, len(stats.errors))
+
+    def test_report_to_master_flushes_buffer(self):
+        stats = RequestStats(buffer_size=100)
+        stats.log_request("GET", "/", 10, 0)
+        stats.log_error("GET", "/", Exception("fail"))
+        events = Events()
+        setup_distributed_stats_event_listeners(events, stats)
+        data = {}
+        events.report_to_master.fire(client_id="worker", data=data)
+        self.assertEqual(1, data["stats_total"]["num_requests"])
+        self.assertEqual(1, data["stats"][0]["num_failures"])
+        self.assertEqual(1, len(data["errors"]))
+
+    def test_reset_discards_buffered_records(self):
+        stats = RequestStats(buffer_size=100)
+        stats.log_request("GET", "/", 10, 0)
+        stats.reset_all()
+        stats.flush_buffer()
+        self.assertEqual(0, stats.num_requests)
+
+
+class TestAggregateOnDemand(unittest.TestCase):
+    def log_requests(self, stats):
+        for i in range(100):
+            with mock.patch("time.time", return_value=1000.0 + i * 0.1):
+                name = "/orders/%i" % (i % 3)
+                stats.log_request("GET", name, None if i == 50 else i, 10)
+                if i % 7 == 0:
+                    stats.log_error("GET", name, Exception("fail"))
+
+    def create_stats(self, **kwargs):
+        with mock.patch("time.time", return_value=999.0):
+            return RequestStats(**kwargs)
+
+    def test_equivalent_to_logged_total(self):
+        for buffer_size in (None, 16):
+            logged = self.create_stats()
+            aggregated = self.create_stats(
+                aggregate_on_demand=True, buffer_size=buffer_size
+            )
+            self.log_requests(logged)
+            self.log_requests(aggregated)
+            aggregated.flush_buffer()
+            self.assertEqual(logged.total.serialize(), aggregated.total.serialize())
+            self.assertEqual(100, aggregated.num_requests)
+            self.assertEqual(15, aggregated.num_failures)
+
+    def test_total_cached_until_stats_change(self):
+        stats = self.create_stats(aggregate_on_demand=True)
+        self.log_requests(stats)
+        total = stats.total
+        self.assertIs(total, stats.total)
+        stats.log_request("GET", "/", 10, 0)
+        self.assertIsNot(total, stats.total)
+        self.assertEqual(101, stats.total.num_requests)
+        stats.reset_all()
+        self.assertEqual(0, stats.total.num_requests)
+        stats.log_error("GET", "/", Exception("fail"))
+        self.assertEqual(1, stats.total.num_failures)
+        stats.clear_all()
+        self.assertEqual(0, stats.total.num_failures)
+
+    def test_current_response_time_percentiles(self):
+        stats = self.create_stats(aggregate_on_demand=True)
+        with mock.patch("time.time", return_value=1000.0):
+            self.assertEqual(
+                [0], stats.total.get_current_response_time_percentiles([0.5])
+            )
+            stats.log_request("GET", "/a", 10, 0)
+            self.assertEqual(
+                [10], stats.total.get_current_response_time_percentiles([0.5])
+            )
+        with mock.patch("time.time", return_value=1020.0):
+            stats.log_request("GET", "/b", 30, 0)
+            stats.log_request("GET", "/b", 30, 0)
+            self.assertEqual(
+                [30], stats.total.get_current_response_time_percentiles([0.5])
+            )
+            self.assertEqual(10, stats.total.get_response_time_percentile(0.1))
+
+    def test_distributed(self):
+        master_totals = []
+        for aggregate_on_demand in (False, True):
+            worker_stats = self.create_stats(aggregate_on_demand=aggregate_on_demand)
+            worker_events = Events()
+            setup_distributed_stats_event_listeners(worker_events, worker_stats)
+            master_stats = self.create_stats(aggregate_on_demand=aggregate_on_demand)
+            master_events = Events()
+            setup_distributed_stats_event_listeners(master_events, master_stats)
+            for _ in range(2):
+                self.log_requests(worker_stats)
+                data = {}
+                worker_events.report_to_master.fire(client_id="worker", data=data)
+                self.assertEqual(100, data["stats_total"]["num_requests"])
+                self.assertEqual(0, worker_stats.total.num_requests)
+                master_events.worker_report.fire(client_id="worker", data=data)
+            master_totals.append(master_stats.total.serialize())
+        self.assertEqual(200, master_totals[1]["num_requests"])
+        self.assertEqual(master_totals[0], master_totals[1])
+
+
 class TestStatsPrinting(LocustTestCase):
     def test_print_percentile_stats(self):
         stats = RequestStats()
@@ -303,6 +806,26 @@ class TestStatsPrinting(LocustTestCase):
         self.assertEqual(len(headlines), len(info[3].split()))
         self.assertEqual(len(headlines), len(info[5].split()))
 
+    def test_print_sub_millisecond_stats(self):
+        stats = RequestStats()
+        for i in range(100):
+            stats.log_request("GET", "test_entry", 0.2 + i / 1000, 2000)
+        entry = stats.get("test_entry", "GET")
+        # avg, min, max and median
+        columns = entry.to_string().split()
+        self.assertEqual(["0.25", "0.20", "0.30", "|", "0.25"], columns[4:9])
+        # 50% and 100%
+        columns = entry.percentile().split()
+        self.assertEqual("0.25", columns[3])
+        self.assertEqual("0.30", columns[-1])
+
+    def test_format_response_time(self):
+        self.assertEqual("0.35", format_response_time(0.347))
+        self.assertEqual("4.60", format_response_time(4.6))
+        self.assertEqual("4", format_response_time(4))
+        self.assertEqual("0", format_response_time(0))
+        self.assertEqual("147", format_response_time(147.8))
+
 
 class TestCsvStats(LocustTestCase):
     STATS_BASE_NAME = "test"
@@ -447,6 +970,112 @@ class TestCsvStats(LocustTestCase):
             self.assertEqual("%i" % (i + 1), row["Total Request Count"])
             self.assertGreaterEqual(int(row["Timestamp"]), start_time)
 
+    def test_csv_sub_millisecond_response_times(self):
+        for i in range(10):
+            self.environment.stats.log_request("GET", "/fast", 0.3 + i / 100, 10)
+        locust.stats.write_csv_files(
+            self.environment, self.STATS_BASE_NAME, full_history=True
+        )
+        with open(self.STATS_FILENAME) as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual("0.35", rows[0]["50%"])
+        self.assertEqual("0.39", rows[0]["100%"])
+        with open(self.STATS_HISTORY_FILENAME) as f:
+            rows = list(csv.reader(f))
+        # median, average, min and max response times
+        self.assertEqual(["0.34", "0.34", "0.30", "0.39"], rows[0][-5:-1])
+
+    def test_csv_writer_reuses_rows_of_unchanged_entries(self):
+        stats = self.environment.stats
+        stats.log_request("GET", "/a", 10, 10)
+        stats.log_request("GET", "/b", 20, 10)
+        writer = StatsCSVFileWriter(self.environment, self.STATS_BASE_NAME)
+        writer.write()
+        stats.log_request("GET", "/a", 30, 10)
+        stats.log_error("GET", "/b", Exception("fail"))
+        stats.log_request("GET", "/b", None, 10)
+        with mock.patch.object(
+            StatsEntry,
+            "get_response_time_percentiles",
+            autospec=True,
+            side_effect=StatsEntry.get_response_time_percentiles,
+        ) as get_percentiles:
+            writer.write()
+        self.assertEqual(
+            ["/a", "/b", "Aggregated"],
+            sorted(c[0][0].name for c in get_percentiles.call_args_list),
+        )
+        stats.log_request("GET", "/a", 40, 10)
+        with mock.patch.object(
+            StatsEntry,
+            "get_response_time_percentiles",
+            autospec=True,
+            side_effect=StatsEntry.get_response_time_percentiles,
+        ) as get_percentiles:
+            writer.write()
+        self.assertEqual(
+            ["/a", "Aggregated"],
+            sorted(c[0][0].name for c in get_percentiles.call_args_list),
+        )
+
+        # the file has the same content as when it's written from scratch
+        with open(self.STATS_FILENAME) as f:
+            content = f.read()
+        locust.stats.write_csv_files(self.environment, self.STATS_BASE_NAME)
+        with open(self.STATS_FILENAME) as f:
+            self.assertEqual(f.read(), content)
+
+    def test_csv_writer_only_rewrites_changed_files(self):
+        stats = self.environment.stats
+        stats.log_request("GET", "/a", 10, 10)
+        writer = StatsCSVFileWriter(self.environment, self.STATS_BASE_NAME)
+        writer.write()
+        # the files are replaced by new files when they're rewritten
+        stats_inode = os.stat(self.STATS_FILENAME).st_ino
+        failures_inode = os.stat(self.STATS_FAILURES_FILENAME).st_ino
+        writer.write()
+        self.assertEqual(stats_inode, os.stat(self.STATS_FILENAME).st_ino)
+        self.assertEqual(failures_inode, os.stat(self.STATS_FAILURES_FILENAME).st_ino)
+
+        stats.log_request("GET", "/a", 10, 10)
+        writer.write()
+        self.assertNotEqual(stats_inode, os.stat(self.STATS_FILENAME).st_ino)
+        self.assertEqual(failures_inode, os.stat(self.STATS_FAILURES_FILENAME).st_ino)
+
+        stats.log_error("GET", "/a", Exception("fail"))
+        writer.write()
+        self.assertNotEqual(
+            failures_inode, os.stat(self.STATS_FAILURES_FILENAME).st_ino
+        )
+        with open(self.STATS_FAILURES_FILENAME) as f:
+            self.assertEqual(2, len(list(csv.reader(f))))
+        self.assertFalse(os.path.exists(self.STATS_FILENAME + ".tmp"))
+
+    def test_csv_file_isnt_replaced_if_writing_fails(self):
+        self.environment.stats.log_request("GET", "/a", 10, 10)
+        locust.stats.write_csv_files(self.environment, self.STATS_BASE_NAME)
+        with open(self.STATS_FILENAME) as f:
+            content = f.read()
+        self.environment.stats.log_request("GET", "/a", 10, 10)
+        with mock.patch("locust.stats.requests_csv", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                locust.stats.write_csv_files(self.environment, self.STATS_BASE_NAME)
+        with open(self.STATS_FILENAME) as f:
+            self.assertEqual(content, f.read())
+        self.assertFalse(os.path.exists(self.STATS_FILENAME + ".tmp"))
+
+    def test_status_codes_column(self):
+        self.runner.stats.log_request("GET", "/", 10, 0, 200)
+        self.runner.stats.log_request("GET", "/", 10, 0, 503)
+        self.runner.stats.log_request("GET", "/", 10, 0, 200)
+        self.runner.stats.log_request("GET", "/other", 10, 0)
+        locust.stats.write_csv_files(self.environment, self.STATS_BASE_NAME)
+        with open(self.STATS_FILENAME) as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(
+            ["200:2 503:1", "", "200:2 503:1"], [r["Status Codes"] for r in rows]
+        )
+
     def test_requests_csv_quote_escaping(self):
         with mock.patch("locust.rpc.rpc.Server", mocked_rpc()) as server:
             environment = Environment()
@@ -485,57 +1114,69 @@ class TestStatsEntryResponseTimesCache(unittest.TestCase):
 
     def test_response_times_cached(self):
         s = StatsEntry(self.stats, "/", "GET", use_response_times_cache=True)
-        self.assertEqual(1, len(s.response_times_cache))
         s.log(11, 1337)
-        self.assertEqual(1, len(s.response_times_cache))
-        s.last_request_timestamp -= 1
+        # the window is created the first time the current percentiles are requested
+        self.assertEqual(None, s.window)
+        self.assertEqual(11, s.get_current_response_time_percentile(0.5))
         s.log(666, 1337)
-        self.assertEqual(2, len(s.response_times_cache))
-        self.assertEqual(
-            CachedResponseTimes(response_times={11: 1}, num_requests=1,),
-            s.response_times_cache[int(s.last_request_timestamp) - 1],
-        )
+        self.assertEqual({11: 1, 670: 1}, s.window.histogram)
+
+    def test_window_of_old_entry_starts_out_empty(self):
+        t = int(time.time())
+        with mock.patch("time.time", return_value=t - 60):
+            s = StatsEntry(self.stats, "/", "GET", use_response_times_cache=True)
+            s.log(5000, 0)
+        s.log(11, 1337)
+        # the response times can't be told apart, so none of them are used as current ones
+        self.assertEqual(0, s.get_current_response_time_percentile(0.5))
+        s.log(666, 1337)
+        self.assertEqual({670: 1}, s.window.histogram)
+        self.assertEqual(670, s.get_current_response_time_percentile(0.5))
 
     def test_response_times_not_cached_if_not_enabled(self):
         s = StatsEntry(self.stats, "/", "GET")
         s.log(11, 1337)
-        self.assertEqual(None, s.response_times_cache)
-        s.last_request_timestamp -= 1
-        s.log(666, 1337)
-        self.assertEqual(None, s.response_times_cache)
+        self.assertRaises(ValueError, s.get_current_response_time_percentile, 0.5)
+        self.assertEqual(None, s.window)
 
-    def test_latest_total_response_times_pruned(self):
-        """
-        Check that RequestStats.latest_total_response_times are pruned when execeeding 20 entries
-        """
+    def test_old_response_times_removed_from_window(self):
         s = StatsEntry(self.stats, "/", "GET", use_response_times_cache=True)
         t = int(time.time())
-        for i in reversed(range(2, 30)):
-            s.response_times_cache[t - i] = CachedResponseTimes(
-                response_times={}, num_requests=0
-            )
-        self.assertEqual(29, len(s.response_times_cache))
-        s.log(17, 1337)
-        s.last_request_timestamp -= 1
-        s.log(1, 1)
-        self.assertEqual(20, len(s.response_times_cache))
-        self.assertEqual(
-            CachedResponseTimes(response_times={17: 1}, num_requests=1),
-            s.response_times_cache.popitem(last=True)[1],
-        )
+        with mock.patch("time.time", return_value=t - 15):
+            self.assertEqual(0, s.get_current_response_time_percentile(1.0))
+            s.log(17, 1337)
+            self.assertEqual(17, s.get_current_response_time_percentile(1.0))
+        with mock.patch("time.time", return_value=t - 5):
+            s.log(2, 1)
+        self.assertEqual({2: 1}, s.window.histogram)
+        self.assertEqual(2, s.get_current_response_time_percentile(1.0))
+        with mock.patch("time.time", return_value=t + 10):
+            self.assertEqual(0, s.get_current_response_time_percentile(1.0))
+        self.assertEqual({}, s.window.histogram)
 
     def test_get_current_response_time_percentile(self):
         s = StatsEntry(self.stats, "/", "GET", use_response_times_cache=True)
         t = int(time.time())
-        s.response_times_cache[t - 10] = CachedResponseTimes(
-            response_times={i: 1 for i in range(100)}, num_requests=200
-        )
-        s.response_times_cache[t - 10].response_times[1] = 201
+        with mock.patch("time.time", return_value=t - 20):
+            self.assertEqual(0, s.get_current_response_time_percentile(0.95))
+            for i in range(100):
+                s.log(5000, 0)
+            self.assertEqual(5000, s.get_current_response_time_percentile(0.95))
+        with mock.patch("time.time", return_value=t - 5):
+            for i in range(100):
+                s.log(i, 0)
 
-        s.response_times = {i: 2 for i in range(100)}
-        s.response_times[1] = 202
-        s.num_requests = 300
+        self.assertEqual(95, s.get_current_response_time_percentile(0.95))
+        self.assertEqual(5000, s.get_response_time_percentile(0.95))
 
+    def test_current_response_time_percentile_from_worker_reports(self):
+        s = StatsEntry(self.stats, "/", "GET", use_response_times_cache=True)
+        self.assertEqual(0, s.get_current_response_time_percentile(0.95))
+        worker_stats = RequestStats(use_response_times_cache=False)
+        for i in range(100):
+            worker_stats.log_request("GET", "/", i, 0)
+        s.extend(StatsEntry.unserialize(worker_stats.get("/", "GET").serialize()))
+        self.assertEqual(100, s.window.histogram.count)
         self.assertEqual(95, s.get_current_response_time_percentile(0.95))
 
     def test_diff_response_times_dicts(self):
@@ -565,6 +1206,23 @@ class TestStatsEntry(unittest.TestCase):
         super(TestStatsEntry, self).setUp(*args, **kwargs)
         self.stats = RequestStats()
 
+    def test_lazy_allocation(self):
+        s = StatsEntry(self.stats, "/", "GET")
+        self.assertFalse(hasattr(s, "__dict__"))
+        self.assertEqual(None, s._response_times)
+        self.assertEqual(None, s._num_reqs_per_sec)
+        s.log(42, 0)
+        self.assertEqual({42: 1}, s.response_times)
+        self.assertEqual(None, s._num_fail_per_sec)
+        data = s.serialize()
+        self.assertEqual({}, data["num_fail_per_sec"])
+        s2 = StatsEntry.unserialize(data)
+        self.assertEqual(None, s2._num_fail_per_sec)
+        s.extend(s2)
+        self.assertEqual(2, s.num_requests)
+        self.assertEqual({42: 2}, s.response_times)
+        self.assertEqual(None, s._num_fail_per_sec)
+
     def test_fail_ratio_with_no_failures(self):
         REQUEST_COUNT = 10
         FAILURE_COUNT = 0
@@ -674,6 +1332,32 @@ class TestRequestStatsWithWebserver(WebserverTestCase):
         self.assertEqual(response.status_code, 0)
         self.assertEqual(1, self.runner.stats.get("/", "GET").num_failures)
         self.assertEqual(1, self.runner.stats.get("/", "GET").num_requests)
+        self.assertEqual(
+            {"ConnectionError": 1}, self.runner.stats.get("/", "GET").status_codes
+        )
+
+    def test_request_stats_status_codes(self):
+        self.locust.client.get("/ultra_fast")
+        self.locust.client.get("/ultra_fast")
+        self.locust.client.get("/fail", name="/ultra_fast")
+        with self.locust.client.get("/fail", catch_response=True) as response:
+            response.success()
+        self.assertEqual(
+            {200: 2, 500: 1}, self.runner.stats.get("/ultra_fast", "GET").status_codes
+        )
+        self.assertEqual({500: 1}, self.runner.stats.get("/fail", "GET").status_codes)
+
+    def test_failures_without_status_counted_per_exception_class(self):
+        self.environment.events.request_failure.fire(
+            request_type="rpc",
+            name="call",
+            response_time=1,
+            response_length=0,
+            exception=ValueError("fail"),
+        )
+        self.assertEqual(
+            {"ValueError": 1}, self.runner.stats.get("call", "rpc").status_codes
+        )
 
 
 class MyTaskSet(TaskSet):
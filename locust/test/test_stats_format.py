@@ -0,0 +1,244 @@
+import unittest
+
+from locust.event import Events
+from locust.histogram import DDSketchHistogram, LogLinearHistogram, RoundedHistogram
+from locust.rpc import Message
+from locust.rpc.stats_format import (
+    FLOAT_VALUES,
+    StatsReportDecoder,
+    StatsReportEncoder,
+    decode_histogram,
+    decode_time_series,
+    encode_histogram,
+    encode_time_series,
+)
+from locust.stats import (
+    RequestStats,
+    StatsEntry,
+    setup_distributed_stats_event_listeners,
+)
+
+
+def send(data):
+    return Message.unserialize(Message("stats", data, "worker").serialize()).data
+
+
+class TestStatsFormat(unittest.TestCase):
+    def setUp(self):
+        self.worker_stats = RequestStats(use_response_times_cache=False)
+        self.worker_events = Events()
+        setup_distributed_stats_event_listeners(self.worker_events, self.worker_stats)
+
+    def log_requests(self, num_names=3):
+        for i in range(100):
+            name = "/orders/%i" % (i % num_names)
+            self.worker_stats.log_request("GET", name, None if i == 7 else i * 13, 10)
+            if i % 10 == 0:
+                self.worker_stats.log_error("GET", name, Exception("fail"))
+
+    def report(self):
+        data = {"user_count": 5}
+        self.worker_events.report_to_master.fire(client_id="worker", data=data)
+        return data
+
+    def receive(self, reports):
+        master_stats = RequestStats()
+        master_events = Events()
+        setup_distributed_stats_event_listeners(master_events, master_stats)
+        for data in reports:
+            master_events.worker_report.fire(client_id="worker", data=data)
+        return master_stats
+
+    def test_error_margins(self):
+        data = {
+            "stats": [],
+            "stats_total": StatsEntry(None, "Aggregated", None).serialize(),
+            "errors": {
+                "0f": {
+                    "method": "GET",
+                    "name": "/",
+                    "error": "ValueError()",
+                    "occurrences": 10,
+                    "error_margin": 4,
+                }
+            },
+        }
+        decoded = StatsReportDecoder().decode(
+            send(StatsReportEncoder().encode(dict(data)))
+        )
+        self.assertEqual(10, decoded["errors"]["0f"]["occurrences"])
+        self.assertEqual(4, decoded["errors"]["0f"]["error_margin"])
+
+    def test_status_codes(self):
+        self.worker_stats.log_request("GET", "/", 10, 0, 200)
+        self.worker_stats.log_request("GET", "/", 10, 0, 503)
+        self.worker_stats.log_request("GET", "/", 10, 0, "ConnectionError")
+        self.worker_stats.log_request("GET", "/other", 10, 0)
+        data = self.report()
+        regular = self.receive([send(data)])
+        compact = self.receive(
+            [StatsReportDecoder().decode(send(StatsReportEncoder().encode(dict(data))))]
+        )
+        for stats in (regular, compact):
+            self.assertEqual(
+                {200: 1, 503: 1, "ConnectionError": 1},
+                stats.get("/", "GET").status_codes,
+            )
+            self.assertEqual({}, stats.get("/other", "GET").status_codes)
+            self.assertEqual(
+                {200: 1, 503: 1, "ConnectionError": 1}, stats.total.status_codes
+            )
+
+    def test_connection_timings(self):
+        self.worker_stats.log_request(
+            "GET", "/", 10, 0, connection_timings={"connect": 2, "tls": 4, "ttfb": 6}
+        )
+        self.worker_stats.log_request(
+            "GET", "/", 10, 0, connection_timings={"ttfb": 8, "download": 1.5}
+        )
+        self.worker_stats.log_request("GET", "/other", 10, 0)
+        data = self.report()
+        regular = self.receive([send(data)])
+        compact = self.receive(
+            [StatsReportDecoder().decode(send(StatsReportEncoder().encode(dict(data))))]
+        )
+        for stats in (regular, compact):
+            entry = stats.get("/", "GET")
+            self.assertEqual(1, entry.num_new_connections)
+            self.assertEqual(1, entry.num_reused_connections)
+            self.assertEqual(
+                {"connect": [2], "tls": [4], "ttfb": [6, 8], "download": [1.5]},
+                {
+                    phase: sorted(histogram.keys())
+                    for phase, histogram in entry.phase_times.items()
+                },
+            )
+            self.assertEqual({}, stats.get("/other", "GET").phase_times)
+            self.assertEqual(1, stats.total.num_reused_connections)
+
+    def test_same_stats_as_regular_reports(self):
+        encoder = StatsReportEncoder()
+        decoder = StatsReportDecoder()
+        regular_reports = []
+        compact_reports = []
+        for _ in range(2):
+            self.log_requests()
+            data = self.report()
+            regular_reports.append(send(data))
+            compact = encoder.encode(dict(data))
+            self.assertEqual(["stats_report", "user_count"], sorted(compact))
+            compact_reports.append(decoder.decode(send(compact)))
+            self.assertEqual(5, compact_reports[-1]["user_count"])
+
+        regular = self.receive(regular_reports)
+        compact = self.receive(compact_reports)
+        self.assertEqual(list(regular.entries), list(compact.entries))
+        for key, entry in regular.entries.items():
+            self.assertEqual(entry.serialize(), compact.entries[key].serialize())
+        self.assertEqual(regular.total.serialize(), compact.total.serialize())
+        self.assertEqual(regular.serialize_errors(), compact.serialize_errors())
+
+    def test_entry_ids_sent_once(self):
+        encoder = StatsReportEncoder()
+        decoder = StatsReportDecoder()
+        self.log_requests()
+        first = encoder.encode(self.report())
+        encoder.commit()
+        self.log_requests()
+        second = encoder.encode(self.report())
+        encoder.commit()
+        self.assertIn(b"/orders/1", first["stats_report"][2])
+        self.assertNotIn(b"/orders/1", second["stats_report"][2])
+        self.assertLess(len(second["stats_report"][2]), len(first["stats_report"][2]))
+        decoder.decode(first)
+        decoded = decoder.decode(second)
+        self.assertEqual(
+            ["/orders/0", "/orders/1", "/orders/2"],
+            [entry.name for entry in decoded["stats"]],
+        )
+        # a new decoder doesn't know the entry IDs, so it skips the entries
+        self.log_requests()
+        decoder = StatsReportDecoder()
+        decoded = decoder.decode(encoder.encode(self.report()))
+        self.assertEqual([], decoded["stats"])
+        self.assertEqual("Aggregated", decoded["stats_total"].name)
+        self.assertEqual({0, 1, 2}, decoder.unknown_ids)
+
+    def test_entry_ids_defined_again_after_failed_send(self):
+        encoder = StatsReportEncoder()
+        decoder = StatsReportDecoder()
+        self.log_requests()
+        # the first report is never sent
+        encoder.encode(self.report())
+        encoder.rollback()
+        self.log_requests()
+        decoded = decoder.decode(encoder.encode(self.report()))
+        encoder.commit()
+        self.assertEqual(
+            ["/orders/0", "/orders/1", "/orders/2"],
+            [entry.name for entry in decoded["stats"]],
+        )
+        self.assertEqual(set(), decoder.unknown_ids)
+
+    def test_resend_definitions(self):
+        encoder = StatsReportEncoder()
+        self.log_requests()
+        encoder.encode(self.report())
+        encoder.commit()
+        # the master lost the report that defined the entry IDs
+        decoder = StatsReportDecoder()
+        encoder.resend_definitions()
+        self.log_requests()
+        decoded = decoder.decode(encoder.encode(self.report()))
+        encoder.commit()
+        self.assertEqual(3, len(decoded["stats"]))
+        self.assertEqual(set(), decoder.unknown_ids)
+        self.log_requests()
+        data = encoder.encode(self.report())
+        self.assertNotIn(b"/orders/1", data["stats_report"][2])
+
+    def test_compression(self):
+        self.log_requests(num_names=100)
+        data = StatsReportEncoder().encode(self.report())
+        version, compressed, payload = data["stats_report"]
+        self.assertTrue(compressed)
+        self.assertEqual(100, len(StatsReportDecoder().decode(data)["stats"]))
+
+    def test_histograms(self):
+        rounded = RoundedHistogram()
+        for response_time in (0, 3, 44.6, 147, 3432, 58760):
+            rounded.record(response_time)
+        self.assertEqual(rounded, decode_histogram(encode_histogram(rounded)))
+        self.assertEqual(
+            {0.5: 2, 1.25: 1}, decode_histogram(encode_histogram({0.5: 2, 1.25: 1}))
+        )
+        # float keys are delta encoded as integers, with the decimals they need
+        self.assertEqual(
+            [[FLOAT_VALUES, 3], [500, 750, 1], [2, 1, 4]],
+            encode_histogram({0.5: 2, 1.25: 1, 1.251: 4}),
+        )
+        self.assertEqual(
+            {0.1: 1, 0.3: 1, 1.6e-05: 1},
+            decode_histogram(encode_histogram({0.1: 1, 0.3: 1, 0.0000155: 1})),
+        )
+
+        log_linear = LogLinearHistogram(significant_digits=3)
+        for response_time in (0.25, 12, 12, 999.5, 58760):
+            log_linear.record(response_time)
+        decoded = decode_histogram(send(encode_histogram(log_linear)))
+        self.assertEqual(log_linear.layout, decoded.layout)
+        self.assertEqual(log_linear.counts, decoded.counts)
+        self.assertEqual(5, decoded.count)
+
+        sketch = DDSketchHistogram(relative_accuracy=0.02)
+        for response_time in (0, 0.25, 12, 12, 999.5, 58760):
+            sketch.record(response_time)
+        decoded = decode_histogram(send(encode_histogram(sketch)))
+        self.assertEqual(sketch.layout, decoded.layout)
+        self.assertEqual(sketch.buckets, decoded.buckets)
+        self.assertEqual(6, decoded.count)
+
+    def test_time_series(self):
+        counts = {1000: 3, 1001: 1, 1060: 7}
+        self.assertEqual(counts, decode_time_series(encode_time_series(counts)))
+        self.assertEqual(None, encode_time_series({}))
@@ -0,0 +1,122 @@
+import unittest
+
+from locust.histogram import LogLinearHistogram, RoundedHistogram
+from locust.timeseries import RollingCounter, SlidingWindow, TieredTimeSeries
+
+
+class TestSlidingWindow(unittest.TestCase):
+    def test_rotate(self):
+        w = SlidingWindow(3, RoundedHistogram)
+        for t in range(100, 110):
+            w.log(t, t - 90)
+            self.assertEqual(set(range(max(10, t - 92), t - 89)), set(w.histogram))
+        # too old to be added
+        w.log(105, 1)
+        self.assertEqual({17: 1, 18: 1, 19: 1}, w.histogram)
+        # skip ahead past the whole window
+        w.advance(200)
+        self.assertEqual({}, w.histogram)
+        w.log(200, 1)
+        self.assertEqual({1: 1}, w.histogram)
+
+    def test_add(self):
+        w = SlidingWindow(10, LogLinearHistogram)
+        w.add(100, {10: 2, 20: 1})
+        w.add(101, {10: 1})
+        w.add(80, {10: 1})
+        self.assertEqual(4, w.histogram.count)
+        self.assertAlmostEqual(10, w.histogram.percentile(0.5), delta=0.1)
+        w.advance(110)
+        self.assertEqual(1, w.histogram.count)
+        w.advance(111)
+        self.assertEqual(0, w.histogram.count)
+
+
+class TestRollingCounter(unittest.TestCase):
+    def test_window_total(self):
+        c = RollingCounter(12, 2)
+        for t in range(100, 130):
+            c.add(t, t - 99)
+            # the seconds [t - 12, t - 2)
+            self.assertEqual(sum(range(max(1, t - 111), t - 101)), c.total)
+            self.assertEqual(c.total, c.window_total(t))
+        # counts for seconds in the window, the latest seconds and too old seconds
+        c.add(120, 1000)
+        c.add(128, 100)
+        c.add(100, 10000)
+        self.assertEqual(sum(range(18, 28)) + 1000, c.window_total(129))
+        self.assertEqual(sum(range(20, 30)) + 1000 + 100, c.window_total(131))
+        # skip ahead past the whole ring
+        self.assertEqual(0, c.window_total(200))
+        self.assertEqual(0, c.total)
+
+    def test_window_total_with_start(self):
+        c = RollingCounter(12, 2)
+        for t in range(100, 120):
+            c.add(t)
+        self.assertEqual(10, c.window_total(119))
+        self.assertEqual(5, c.window_total(119, 112))
+        # a window that the head has already moved past
+        self.assertEqual(9, c.window_total(118))
+
+    def test_merge(self):
+        c = RollingCounter(12, 2)
+        series = TieredTimeSeries()
+        for t in range(100, 120):
+            series.add(t, 2)
+        c.merge(series)
+        c.merge({110: 1})
+        self.assertEqual(21, c.window_total(119))
+
+
+class TestTieredTimeSeries(unittest.TestCase):
+    def test_add(self):
+        ts = TieredTimeSeries()
+        ts.add(100)
+        ts.add(100.7, 2)
+        ts.add(101)
+        self.assertEqual({100: 3, 101: 1}, dict(ts))
+        self.assertEqual(3, ts[100])
+        self.assertEqual(0, ts.get(102, 0))
+
+    def test_add_to_existing_bucket(self):
+        ts = TieredTimeSeries(((5, 10), (60, 10)))
+        ts.add(100)
+        ts.add(100.0)
+        ts.add(103, 2)
+        self.assertEqual({100: 4}, dict(ts))
+        self.assertEqual([int], [type(t) for t in ts])
+
+    def test_downsample(self):
+        ts = TieredTimeSeries(((1, 10), (5, 4), (20, 2)))
+        for t in range(1000, 1030):
+            ts.add(t)
+        self.assertEqual(30, sum(ts.values()))
+        self.assertLessEqual(len(ts), 16)
+        # the most recent seconds are kept with full resolution
+        self.assertEqual(list(range(1020, 1030)), list(ts)[-10:])
+        self.assertEqual([1] * 10, list(ts.values())[-10:])
+        # older ones have been moved to the coarser tiers
+        self.assertEqual(5, ts[1015])
+        # timestamps older than the per second tier end up in the coarser buckets
+        ts.add(1016)
+        self.assertEqual(6, ts[1015])
+        self.assertEqual(31, sum(ts.values()))
+
+    def test_memory_bounded(self):
+        ts = TieredTimeSeries(((1, 10), (10, 10), (60, 10)))
+        for t in range(72 * 3600):
+            ts.add(t)
+        self.assertEqual(72 * 3600, sum(ts.values()))
+        self.assertLessEqual(len(ts), 31)
+        self.assertGreater(ts.resolutions[-1], 60)
+
+    def test_merge_and_serialize(self):
+        ts1 = TieredTimeSeries()
+        ts2 = TieredTimeSeries()
+        ts1.add(100)
+        ts2.add(100)
+        ts2.add(102, 3)
+        ts1.merge(ts2)
+        ts1.merge({103: 1})
+        self.assertEqual({100: 2, 102: 3, 103: 1}, ts1.serialize())
@@ -1,4 +1,8 @@
 import unittest
+
+import mock
+
+from locust.util.dependencies import import_numpy
 from locust.util.timespan import parse_timespan
 from locust.util.rounding import proper_round
 
@@ -30,3 +34,14 @@ class TestRounding(unittest.TestCase):
         self.assertEqual(4, proper_round(3.5))
         self.assertEqual(5, proper_round(4.5))
         self.assertEqual(6, proper_round(5.5))
+
+
+class TestImportNumpy(unittest.TestCase):
+    def test_missing_numpy(self):
+        with mock.patch.dict("sys.modules", {"numpy": None}):
+            with self.assertRaises(ImportError) as cm:
+                import_numpy("testing")
+        self.assertEqual(
+            "NumPy is required for testing. Install it with: pip install locust[report]",
+            str(cm.exception),
+        )
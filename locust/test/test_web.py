@@ -13,6 +13,7 @@ import requests
 from pyquery import PyQuery as pq
 
 from locust import constant
+from locust.arrival_rate import ArrivalRateStats
 from locust.argument_parser import get_parser, parse_options
 from locust.user import User, task
 from locust.env import Environment
@@ -143,8 +144,8 @@ class TestWebUI(LocustTestCase):
         self.assertEqual(200, response.status_code)
 
         data = json.loads(response.text)
-        self.assertEqual(1, data["stats"][0]["min_response_time"])
-        self.assertEqual(1000, data["stats"][0]["max_response_time"])
+        self.assertEqual(1.4, data["stats"][0]["min_response_time"])
+        self.assertEqual(999.98, data["stats"][0]["max_response_time"])
 
     def test_request_stats_csv(self):
         self.stats.log_request("GET", "/test2", 120, 5612)
@@ -166,6 +167,55 @@ class TestWebUI(LocustTestCase):
         self.assertEqual(200, response.status_code)
         self.assertIn("Error1337", response.text)
 
+    def test_request_stats_status_codes(self):
+        self.stats.log_request("GET", "/", 120, 5612, 200)
+        self.stats.log_request("GET", "/", 120, 5612, "ConnectionError")
+        response = requests.get("http://127.0.0.1:%i/stats/requests" % self.web_port)
+        stats = json.loads(response.text)["stats"]
+        self.assertEqual({"200": 1, "ConnectionError": 1}, stats[0]["status_codes"])
+
+    def test_request_stats_connection_timings(self):
+        self.stats.log_request(
+            "GET", "/", 120, 5612, connection_timings={"connect": 10, "ttfb": 100}
+        )
+        self.stats.log_request("GET", "/", 120, 5612, connection_timings={"ttfb": 80})
+        response = requests.get("http://127.0.0.1:%i/stats/requests" % self.web_port)
+        stats = json.loads(response.text)["stats"]
+        self.assertEqual(1, stats[0]["num_new_connections"])
+        self.assertEqual(1, stats[0]["num_reused_connections"])
+        self.assertEqual(["connect", "ttfb"], sorted(stats[0]["phase_times"]))
+        self.assertEqual(10, stats[0]["phase_times"]["connect"]["median"])
+        self.assertEqual(100, stats[0]["phase_times"]["ttfb"]["ninetieth"])
+
+    def test_request_stats_arrival_rate_stats(self):
+        self.runner.arrival_rate_stats["MyUser"] = ArrivalRateStats.unserialize(
+            [100, 3, 2, 0.25]
+        )
+        response = requests.get("http://127.0.0.1:%i/stats/requests" % self.web_port)
+        self.assertEqual(
+            [
+                {
+                    "name": "MyUser",
+                    "num_starts": 100,
+                    "num_late": 3,
+                    "num_missed": 2,
+                    "max_delay": 0.25,
+                }
+            ],
+            json.loads(response.text)["arrival_rate_stats"],
+        )
+
+    def test_request_stats_most_frequent_errors_first(self):
+        for i in range(510):
+            for _ in range(i % 3 + 1):
+                self.stats.log_error("GET", "/", Exception("Error %i" % i))
+        response = requests.get("http://127.0.0.1:%i/stats/requests" % self.web_port)
+        errors = json.loads(response.text)["errors"]
+        self.assertEqual(500, len(errors))
+        self.assertEqual(
+            [3] * 170 + [2] * 170 + [1] * 160, [e["occurrences"] for e in errors]
+        )
+
     def test_reset_stats(self):
         try:
             raise Exception("A cool test exception")
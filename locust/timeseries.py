@@ -0,0 +1,318 @@
+from collections.abc import Mapping
+
+
+class SlidingWindow(object):
+    """
+    Ring buffer with one histogram slot per second, that holds the response times of the
+    last *window* seconds.
+
+    The sum of the slots is maintained in :attr:`histogram` as samples are added and slots fall
+    out of the window. This makes it cheap to get the *current* response time percentiles,
+    regardless of how many distinct response times have been recorded during the whole test.
+
+    The ring is rotated when a sample for a new second is added (or when :meth:`advance`
+    is called), and the work done per rotated second is constant.
+    """
+
+    __slots__ = ("window", "histogram_class", "histogram", "head", "_histograms")
+
+    def __init__(self, window, histogram_class):
+        """
+        :param window: Number of seconds that the window covers
+        :param histogram_class: Histogram class (or factory) used for the response times
+        """
+        self.window = window
+        self.histogram_class = histogram_class
+        self.histogram = histogram_class()
+        self.head = None
+        self._histograms = [None] * window
+
+    def advance(self, t):
+        """
+        Rotate the ring so that the second *t* is the latest slot. The response times of the
+        slots that fall out of the window are removed from the histogram.
+        """
+        head = self.head
+        if head is not None and t <= head:
+            return
+        if head is not None:
+            # the slots of the seconds in (head - window, t - window] fall out of the window. If
+            # we've moved ahead more than a whole window, looping over any window seconds will
+            # clear all of the slots.
+            for second in range(
+                max(head, t - self.window) - self.window + 1, t - self.window + 1
+            ):
+                index = second % self.window
+                histogram = self._histograms[index]
+                if histogram is not None:
+                    self.histogram.subtract(histogram)
+                    self._histograms[index] = None
+        self.head = t
+
+    def _slot(self, t):
+        if self.head is None or t > self.head:
+            self.advance(t)
+        elif t <= self.head - self.window:
+            # too old to be kept in the window
+            return None
+        index = t % self.window
+        histogram = self._histograms[index]
+        if histogram is None:
+            histogram = self._histograms[index] = self.histogram_class()
+        return histogram
+
+    def log(self, t, response_time):
+        """
+        Add a response time for a request that was made at second *t*
+        """
+        histogram = self._slot(t)
+        if histogram is not None:
+            histogram.record(response_time)
+            self.histogram.record(response_time)
+
+    def add(self, t, response_times):
+        """
+        Add a {response_time: count} dict (or histogram) of response times to the slot of
+        second *t*. Used when extending stats with the stats reported by worker nodes.
+        """
+        histogram = self._slot(t)
+        if histogram is not None:
+            histogram.merge(response_times)
+            self.histogram.merge(response_times)
+
+
+class RollingCounter(object):
+    """
+    Per second counter that keeps a running sum of the counts of the seconds in
+    [head - start_offset, head - end_offset), where *head* is the latest second that a count
+    has been added for (or that the counter has been advanced to).
+
+    The counts of the last start_offset seconds are kept in a ring buffer. The running sum is
+    updated when counts are added and when the ring is rotated at second boundaries, so it can
+    be read in O(1) time, instead of summing up the counts of the window whenever it's needed.
+    """
+
+    __slots__ = ("start_offset", "end_offset", "head", "total", "_counts")
+
+    def __init__(self, start_offset, end_offset):
+        """
+        :param start_offset: Number of seconds before the head that the window starts at
+        :param end_offset: Number of seconds before the head that the window ends at. The
+                           counts of the latest seconds are still coming in, so they're left out.
+        """
+        self.start_offset = start_offset
+        self.end_offset = end_offset
+        self.head = None
+        self.total = 0
+        # counts of the seconds [head - start_offset, head]
+        self._counts = [0] * (start_offset + 1)
+
+    def advance(self, t):
+        """
+        Rotate the ring so that the second *t* is the head
+        """
+        head = self.head
+        if head is not None and t <= head:
+            return
+        counts = self._counts
+        size = len(counts)
+        if head is None or t - head >= size:
+            # all of the seconds in the ring have fallen out of the window
+            for index in range(size):
+                counts[index] = 0
+            self.total = 0
+        else:
+            for second in range(head + 1, t + 1):
+                # the slot of the new second holds the second that falls out of the window,
+                # while the second that was end_offset seconds before the head moves into it
+                index = second % size
+                self.total += (
+                    counts[(second - self.end_offset - 1) % size] - counts[index]
+                )
+                counts[index] = 0
+        self.head = t
+
+    def add(self, t, count=1):
+        """
+        Add *count* to the second *t*
+        """
+        t = int(t)
+        if self.head is None or t > self.head:
+            self.advance(t)
+        elif t < self.head - self.start_offset:
+            # too old to be kept in the ring
+            return
+        self._counts[t % len(self._counts)] += count
+        if t < self.head - self.end_offset:
+            self.total += count
+
+    def merge(self, other):
+        """
+        Add all the counts from a {timestamp: count} dict (or TieredTimeSeries)
+        """
+        for t, count in other.items():
+            self.add(t, count)
+
+    def window_total(self, now, start=None):
+        """
+        Return the sum of the counts of the seconds in [now - start_offset, now - end_offset).
+        If *start* is later than the start of that range, the window starts at *start* instead.
+        """
+        self.advance(now)
+        first = now - self.start_offset
+        if now == self.head and (start is None or start <= first):
+            return self.total
+        # a shorter window, or a window that the head has already moved past. Seconds that
+        # have fallen out of the ring count as zero.
+        first = max(first, self.head - self.start_offset, start or first)
+        counts = self._counts
+        size = len(counts)
+        return sum(
+            [counts[second % size] for second in range(first, now - self.end_offset)]
+        )
+
+
+class TieredTimeSeries(Mapping):
+    """
+    Bounded memory {timestamp: count} store, with full resolution for the most recent
+    timestamps and coarser resolution for older ones.
+
+    The store consists of a number of tiers, each with a resolution (in seconds) and a max
+    number of buckets. When a tier is full, its oldest buckets are downsampled into the next
+    tier. When the last tier is full, its resolution is doubled, so the memory used stays
+    bounded however long the test runs.
+
+    It can be used as a read-only dict, where the keys are the start times of the buckets.
+    """
+
+    __slots__ = ("_tiers", "_recent", "_older", "_cutoffs", "_last_resolution")
+
+    def __init__(self, tiers=((1, 120), (10, 180), (60, 240))):
+        """
+        :param tiers: List of (resolution, max number of buckets) tuples, from the finest to the
+                      coarsest tier. Each resolution should be a multiple of the previous one.
+        """
+        self._tiers = tiers
+        # buckets of the first tier, and a list with the buckets of each of the coarser tiers,
+        # which is created when it's first needed
+        self._recent = {}
+        self._older = None
+        # timestamps older than the cutoff of a tier are stored in the next tier
+        self._cutoffs = None
+        # resolution of the last tier, once it's been doubled
+        self._last_resolution = None
+
+    @property
+    def resolutions(self):
+        """The current resolution of each tier"""
+        return tuple(self._resolution(i) for i in range(len(self._tiers)))
+
+    def _resolution(self, i):
+        if self._last_resolution is not None and i == len(self._tiers) - 1:
+            return self._last_resolution
+        return self._tiers[i][0]
+
+    def add(self, t, count=1):
+        """
+        Add *count* to the bucket for timestamp *t*
+        """
+        recent = self._recent
+        if t in recent:
+            # the common case, where the bucket of the current second is already in the
+            # first tier, is a plain dict increment. Buckets are only moved to coarser tiers
+            # when a new bucket makes a tier overflow.
+            recent[t] += count
+            return
+        t = int(t)
+        i = 0
+        if self._cutoffs is not None:
+            while i < len(self._cutoffs) and t < self._cutoffs[i]:
+                i += 1
+        self._add_to_tier(i, t, count)
+
+    def _tier_buckets(self, i):
+        if i == 0:
+            return self._recent
+        if self._older is None:
+            self._older = []
+        if i > len(self._older):
+            self._older.append({})
+        return self._older[i - 1]
+
+    def _all_buckets(self):
+        return [self._recent] + (self._older or [])
+
+    def _add_to_tier(self, i, t, count):
+        buckets = self._tier_buckets(i)
+        key = t - t % self._resolution(i)
+        buckets[key] = buckets.get(key, 0) + count
+        if len(buckets) > self._tiers[i][1]:
+            if i == len(self._tiers) - 1:
+                self._double_resolution()
+            else:
+                self._downsample(i)
+
+    def _downsample(self, i):
+        buckets = self._tier_buckets(i)
+        keys = sorted(buckets)
+        next_resolution = self._resolution(i + 1)
+        # align the cutoff with the buckets of the next tier, so that the time ranges
+        # covered by the tiers never overlap
+        cutoff = keys[len(keys) - self._tiers[i][1]]
+        cutoff += -cutoff % next_resolution
+        if self._cutoffs is None:
+            self._cutoffs = [cutoff]
+        elif i == len(self._cutoffs):
+            self._cutoffs.append(cutoff)
+        else:
+            self._cutoffs[i] = cutoff = max(cutoff, self._cutoffs[i])
+        for key in keys:
+            if key >= cutoff:
+                break
+            self._add_to_tier(i + 1, key, buckets.pop(key))
+
+    def _double_resolution(self):
+        last = len(self._tiers) - 1
+        resolution = self._resolution(last) * 2
+        self._last_resolution = resolution
+        buckets = self._tier_buckets(last)
+        counts = list(buckets.items())
+        buckets.clear()
+        for key, count in counts:
+            key -= key % resolution
+            buckets[key] = buckets.get(key, 0) + count
+
+    def merge(self, other):
+        """
+        Add all the counts from another TieredTimeSeries (or {timestamp: count} dict)
+        """
+        for t, count in other.items():
+            self.add(t, count)
+
+    def serialize(self):
+        """
+        Return the store as a {timestamp: count} dict, which is the format used when sending
+        stats from worker nodes to the master
+        """
+        return dict(self.items())
+
+    def __getitem__(self, t):
+        if t in self._recent:
+            return self._recent[t]
+        for buckets in self._older or []:
+            if t in buckets:
+                return buckets[t]
+        raise KeyError(t)
+
+    def __iter__(self):
+        for buckets in reversed(self._all_buckets()):
+            yield from sorted(buckets)
+
+    def __len__(self):
+        return sum(len(buckets) for buckets in self._all_buckets())
+
+    def __repr__(self):
+        return "<TieredTimeSeries resolutions=%r buckets=%d>" % (
+            self.resolutions,
+            len(self),
+        )
@@ -105,6 +105,27 @@ class User(object, metaclass=UserMeta):
     weight = 10
     """Probability of user class being chosen. The higher the weight, the greater the chance of it being chosen."""
 
+    arrival_rate = None
+    """
+    Number of tasks to start per second. If set, the users of this class aren't hatched, and don't
+    loop over their tasks. Instead, tasks are started at this rate (an "open" workload model),
+    whether or not the earlier tasks have finished, on a pool of users that grows when all of the
+    users are busy, up to :py:attr:`arrival_rate_max_users <locust.User.arrival_rate_max_users>`.
+    When distributed, the rate is split over the workers.
+
+    Can also be a function that takes the number of seconds since the test started, and returns
+    the rate at that time.
+
+    Example::
+
+        class MyUser(HttpUser):
+            # ramp up from 10 to 100 tasks per second over a minute
+            arrival_rate = lambda elapsed: 10 + min(elapsed, 60) * 1.5
+    """
+
+    arrival_rate_max_users = 1000
+    """Max number of users that run the tasks of a user class with an arrival_rate at the same time"""
+
     abstract = True
     """If abstract is True, the class is meant to be subclassed, and locust will not spawn users of this class during a test."""
 
@@ -176,7 +197,7 @@ class User(object, metaclass=UserMeta):
         self._greenlet = gevent_group.spawn(run_user, self)
         return self._greenlet
 
-    def stop(self, gevent_group, force=False):
+    def stop(self, gevent_group, force=False, block=True):
         """
         Stop the user greenlet that exists in the gevent_group.
         
@@ -185,6 +206,8 @@ class User(object, metaclass=UserMeta):
         :param force: If False (the default) the stopping is done gracefully by setting the state to LOCUST_STATE_STOPPING
                       which will make the User instance stop once any currently running task is complete and on_stop
                       methods are called. If force is True the greenlet will be killed immediately.
+        :param block: If False, the greenlet is killed asynchronously (when it's killed), so that many users can be 
+                      killed at once, and then waited for.
         :returns: True if the greenlet was killed immediately, otherwise False
         """
         if self._greenlet is greenlet.getcurrent():
@@ -192,7 +215,7 @@ class User(object, metaclass=UserMeta):
             gevent_group.killone(self._greenlet, block=False)
             return True
         elif force or self._state == LOCUST_STATE_WAITING:
-            gevent_group.killone(self._greenlet)
+            gevent_group.killone(self._greenlet, block=block)
             return True
         elif self._state == LOCUST_STATE_RUNNING:
             self._state = LOCUST_STATE_STOPPING
@@ -0,0 +1,14 @@
+def import_numpy(purpose):
+    """
+    Import NumPy, which is an optional dependency (the "report" extra) that's only needed
+    for locust report and for reading recorded samples and binary stats history stores.
+    Raises an ImportError that tells how to install it if it's missing.
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError(
+            "NumPy is required for %s. Install it with: pip install locust[report]"
+            % purpose
+        )
+    return numpy
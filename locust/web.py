@@ -227,6 +227,7 @@ class WebUI:
         @memoize(timeout=DEFAULT_CACHE_TIME, dynamic_timeout=True)
         def request_stats():
             stats = []
+            environment.runner.stats.flush_buffer()
 
             for s in chain(
                 sort_stats(self.environment.runner.stats.entries),
@@ -242,18 +243,33 @@ class WebUI:
                         "avg_response_time": s.avg_response_time,
                         "min_response_time": 0
                         if s.min_response_time is None
-                        else proper_round(s.min_response_time),
-                        "max_response_time": proper_round(s.max_response_time),
+                        else proper_round(s.min_response_time, 2),
+                        "max_response_time": proper_round(s.max_response_time, 2),
                         "current_rps": s.current_rps,
                         "current_fail_per_sec": s.current_fail_per_sec,
                         "median_response_time": s.median_response_time,
                         "ninetieth_response_time": s.get_response_time_percentile(0.9),
                         "avg_content_length": s.avg_content_length,
+                        # JSON object keys are strings
+                        "status_codes": {
+                            str(status): count
+                            for status, count in s.status_codes.items()
+                        },
+                        "num_new_connections": s.num_new_connections,
+                        "num_reused_connections": s.num_reused_connections,
+                        "phase_times": {
+                            phase: {
+                                "median": s.get_phase_time_percentile(phase, 0.5),
+                                "ninetieth": s.get_phase_time_percentile(phase, 0.9),
+                            }
+                            for phase in s.phase_times
+                        },
                     }
                 )
 
+            # the most frequent errors are shown, if there are too many of them
             errors = []
-            for e in environment.runner.errors.values():
+            for e in environment.runner.errors.top(500):
                 err_dict = e.to_dict()
                 err_dict["name"] = escape(err_dict["name"])
                 err_dict["error"] = escape(err_dict["error"])
@@ -268,16 +284,11 @@ class WebUI:
             if stats:
                 report["total_rps"] = stats[len(stats) - 1]["current_rps"]
                 report["fail_ratio"] = environment.runner.stats.total.fail_ratio
-                report[
-                    "current_response_time_percentile_95"
-                ] = environment.runner.stats.total.get_current_response_time_percentile(
-                    0.95
-                )
-                report[
-                    "current_response_time_percentile_50"
-                ] = environment.runner.stats.total.get_current_response_time_percentile(
-                    0.5
+                current_percentiles = environment.runner.stats.total.get_current_response_time_percentiles(
+                    (0.95, 0.5)
                 )
+                report["current_response_time_percentile_95"] = current_percentiles[0]
+                report["current_response_time_percentile_50"] = current_percentiles[1]
 
             is_distributed = isinstance(environment.runner, MasterRunner)
             if is_distributed:
@@ -294,6 +305,16 @@ class WebUI:
 
                 report["workers"] = workers
 
+            report["arrival_rate_stats"] = [
+                {
+                    "name": name,
+                    "num_starts": stats.num_starts,
+                    "num_late": stats.num_late,
+                    "num_missed": stats.num_missed,
+                    "max_delay": stats.max_delay,
+                }
+                for name, stats in sorted(environment.runner.arrival_rate_stats.items())
+            ]
             report["state"] = environment.runner.state
             report["user_count"] = environment.runner.user_count
 
@@ -30,6 +30,10 @@ setup(
         "psutil>=5.6.7",
         "Flask-BasicAuth>=0.2.0",
     ],
+    extras_require={
+        # locust report, and reading recorded samples and binary stats history stores
+        "report": ["numpy"],
+    },
     test_suite="locust.test",
     tests_require=["cryptography", "mock", "pyquery",],
 )